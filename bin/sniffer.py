@@ -7,24 +7,22 @@ except ImportError:
     sys.path.append(os.getcwd())
 
 from strohman.net import netpacket
+from strohman.net import reassembly
 BUFSIZE = 1401
 
 
 class Analizer:
     def __init__(self, name):
         self.monitor = name
-        self.multi_queue = dict()
+        self.multi_queue = reassembly.Reassembler()
 
     def analize(self, data):
         if data is None: return
         packets = list()
         packet = netpacket.BasePacket(data)
         if packet.is_part:
-            if packet.id in self.multi_queue:
-                if self.multi_queue[packet.id].append(packet):
-                    packet = self.multi_queue.pop(packet.id)
-                    packets.append(packet)
-            else: self.multi_queue[packet.id] = packet
+            header = self.multi_queue.add(netpacket.Header.unpack(data))
+            if header is not None: packets.append(netpacket.BasePacket(header))
         elif packet.is_multi:
             multi = list(netpacket.MultiPacket(data))
             packets.extend(multi)
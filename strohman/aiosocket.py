@@ -0,0 +1,74 @@
+import asyncio
+
+try: import uvloop
+except ImportError: uvloop = None
+
+
+class Event:
+    __slots__ = ('sched', 'action', 'argument', 'kwargs', 'handle')
+
+    def __init__(self, sched, action, argument, kwargs):
+        self.sched = sched
+        self.action = action
+        self.argument = argument
+        self.kwargs = kwargs
+        self.handle = None
+
+    def __call__(self):
+        self.sched.events.discard(self)
+        try: self.action(*self.argument, **self.kwargs)
+        finally: self.sched.check()
+
+    @property
+    def time(self): return self.handle.when()
+
+
+class aioschedcore:
+    """The interface of sched.scheduler on top of an asyncio event loop.
+
+    Events are timers of the loop, uvloop is used if it is installed.
+    Like asynschedcore, run() returns once neither events nor transports
+    are left. Events due at the same time run in the order they were
+    entered, priority is not used.
+    """
+
+    def __init__(self, loop=None):
+        if loop is None:
+            loop = asyncio.new_event_loop() if uvloop is None else \
+                uvloop.new_event_loop()
+        self.loop = loop
+        self.timefunc = loop.time
+        self.events = set()
+        self.transports = set()  # open transports keep run() going
+
+    @property
+    def queue(self): return sorted(self.events, key=lambda event: event.time)
+
+    def empty(self): return not self.events
+
+    def enter(self, delay, priority, action, argument=(), kwargs={}):
+        event = Event(self, action, argument, kwargs)
+        event.handle = self.loop.call_later(delay, event)
+        self.events.add(event)
+        return event
+
+    def enterabs(self, time, priority, action, argument=(), kwargs={}):
+        return self.enter(time - self.timefunc(), priority, action, argument,
+                          kwargs)
+
+    def cancel(self, event):
+        if event not in self.events: raise ValueError('event not scheduled')
+        self.events.remove(event)
+        event.handle.cancel()
+        self.check()
+
+    def check(self):
+        if not self.events and not self.transports and self.loop.is_running():
+            self.loop.stop()
+
+    def run(self):
+        """Runs as long as either an event is scheduled or there are
+        transports open. Called from a callback of the running loop it
+        returns at once, the loop already takes care of the rest."""
+        if self.loop.is_running(): return
+        if self.events or self.transports: self.loop.run_forever()
@@ -1,14 +1,17 @@
 from strohman.net import connection
 from strohman.net import netpacket
 from strohman.net import handlers
-from strohman import asynsocket
+from strohman import aiosocket
 
 
 class Interface:
+    # asynsocket.asynschedcore runs the connection on asyncore instead
+    scheduler = aiosocket.aioschedcore
+
     def __init__(self, ip, port):
         self.ip = ip
         self.port = port
-        self.sched = asynsocket.asynschedcore()
+        self.sched = self.scheduler()
         self.connection = None
         self.weather_handler = self.vitals_handler = None
         self.chat_handler = self.actor_handler = self.comand_handler = None
@@ -21,6 +24,10 @@ class Interface:
     def run(self):
        self.sched.run()
 
+    def overrides(self, event):
+        '''True if the class of self implements the event method name.'''
+        return getattr(type(self), event) is not getattr(Interface, event)
+
     ## net events
     def on_ping(self, handler, is_up, delay): handler.close()
     def on_connection_error(self): pass
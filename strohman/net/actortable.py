@@ -0,0 +1,429 @@
+'''Actors in numpy columns with a grid over their positions.
+
+Every actor is a row, the columns hold entity id, position, velocity, DR
+counter and the ids of name and sector, names and sectors are interned.
+Rows are kept dense: removing an actor moves the last row into its place.
+Positions are only comparable within a sector, the grid maps (sector, x
+cell, z cell) to the rows in that cell and is updated with every position
+change, so radius queries only look at the cells the circle touches.
+
+Between two DR updates an actor keeps moving: vel is relative to its
+heading, world_vel is not, and the heading turns by ang_vel. predict()
+extrapolates all actors from their last DR state and the time it was
+received in one go.
+
+With a History the table also keeps a trail of the last DR states of
+every actor, in fixed rings of one block allocated up front.
+'''
+import math
+import time
+import itertools
+import collections.abc
+
+import numpy
+
+from strohman.net import drbatch
+
+
+CELL = 32.0  # edge of a grid cell in world units
+UNCHANGED = drbatch.SECTOR_NAME  # sector_id of DR rows without a sector
+COLUMNS = ('ids', 'pos', 'vel', 'world_vel', 'ang_vel', 'heading', 'stamp',
+           'counter', 'name', 'sector', 'cell', 'slot')
+RECORD = numpy.dtype([('time', '<f8'), ('pos', '<f4', 3), ('y_rot', 'u1')])
+TAU = 2 * math.pi
+Y_ROT = TAU / 256  # radians per step of the y_rot byte
+HORIZON = 5.0  # seconds a DR state is extrapolated at most
+
+
+class ActorTable(collections.abc.MutableMapping):
+    '''
+    Mapping of entity ids to the dicts Actors used to keep, {'pos',
+    'drcounter', 'name', 'vel', 'world_vel', 'ang_vel', 'y_rot', 'sector'},
+    a dict is built on every access. Rows 0:len(self) of the COLUMNS are in
+    use, heading is y_rot in radians and stamp the timefunc() the row was
+    last updated at. A sector of '' keeps the one the actor had.
+    Every update is recorded in history, if there is one, slot is the ring
+    of the row there or -1. Actors removed since the last move() are kept
+    in removed, DR rows for them are stale and dropped.
+    '''
+    def __init__(self, size=64, cell=CELL, timefunc=time.monotonic,
+                 history=None):
+        self.cell_size = cell
+        self.timefunc = timefunc
+        self.history = history
+        self.length = 0
+        self.rows = dict()  # entity id -> row
+        self.removed = set()
+        self.cells = dict()  # (sector, x cell, z cell) -> rows
+        self.names = Interned()
+        self.sectors = Interned()
+        self.ids = numpy.zeros(size, '<u4')
+        self.pos = numpy.zeros((size, 3), '<f4')
+        self.vel = numpy.zeros((size, 3), '<f4')
+        self.world_vel = numpy.zeros((size, 3), '<f4')
+        self.ang_vel = numpy.zeros(size, '<f4')
+        self.heading = numpy.zeros(size, '<f4')
+        self.stamp = numpy.zeros(size, '<f8')
+        self.counter = numpy.zeros(size, '<i2')
+        self.name = numpy.zeros(size, '<i4')
+        self.sector = numpy.zeros(size, '<i4')
+        self.cell = numpy.zeros((size, 2), '<i4')
+        self.slot = numpy.zeros(size, '<i4')
+
+    def __len__(self): return self.length
+    def __contains__(self, entity_id): return entity_id in self.rows
+    def __iter__(self): return iter(self.ids[:self.length].tolist())
+
+    def __getitem__(self, entity_id):
+        row = self.rows[entity_id]
+        return {'pos': tuple(self.pos[row].tolist()),
+                'drcounter': int(self.counter[row]),
+                'name': self.names[self.name[row]],
+                'vel': tuple(self.vel[row].tolist()),
+                'world_vel': tuple(self.world_vel[row].tolist()),
+                'ang_vel': float(self.ang_vel[row]),
+                'y_rot': round(float(self.heading[row]) / Y_ROT) % 256,
+                'sector': self.sectors[self.sector[row]]}
+
+    def __setitem__(self, entity_id, actor):
+        row = self.rows.get(entity_id)
+        if row is None: row = self.append(entity_id)
+        self.removed.discard(entity_id)
+        key = self.key(row)
+        self.pos[row] = actor.get('pos', (0, 0, 0))
+        self.vel[row] = actor.get('vel', (0, 0, 0))
+        self.world_vel[row] = actor.get('world_vel', (0, 0, 0))
+        self.ang_vel[row] = actor.get('ang_vel', 0)
+        self.heading[row] = actor.get('y_rot', 0) * Y_ROT
+        self.stamp[row] = self.timefunc()
+        self.counter[row] = actor.get('drcounter', -1)
+        self.name[row] = self.names.intern(actor.get('name', ''))
+        if actor.get('sector'):
+            self.sector[row] = self.sectors.intern(actor['sector'])
+        self.locate(row, key)
+        if self.history is not None: self.remember(numpy.array([row]))
+
+    def __delitem__(self, entity_id):
+        row = self.rows.pop(entity_id)
+        self.removed.add(entity_id)
+        self.unlocate(row, self.key(row))
+        if self.slot[row] >= 0: self.history.release(int(self.slot[row]))
+        last = self.length - 1
+        if row != last:
+            key = self.key(last)
+            for column in self.columns(): column[row] = column[last]
+            self.rows[int(self.ids[row])] = row
+            rows = self.cells[key]
+            rows.remove(last)
+            rows.add(row)
+        self.length = last
+
+    def columns(self): return [getattr(self, name) for name in COLUMNS]
+
+    def append(self, entity_id):
+        row = self.length
+        if row == len(self.ids):
+            for name in COLUMNS:
+                column = getattr(self, name)
+                grown = numpy.zeros((2 * len(column),) + column.shape[1:],
+                                    column.dtype)
+                grown[:row] = column
+                setattr(self, name, grown)
+        self.length += 1
+        self.rows[entity_id] = row
+        for column in self.columns(): column[row] = 0  # name and sector ''
+        self.ids[row] = entity_id
+        self.counter[row] = self.slot[row] = -1
+        self.cells.setdefault(self.key(row), set()).add(row)
+        return row
+
+    ## grid
+
+    def key(self, row):
+        return (int(self.sector[row]),) + tuple(self.cell[row].tolist())
+
+    def locate(self, row, key):
+        '''Move row from the cell of key to the one of its position.'''
+        cell = numpy.floor(self.pos[row, ::2] / self.cell_size)
+        if (int(self.sector[row]),) + tuple(cell.astype(int).tolist()) != key:
+            self.unlocate(row, key)
+            self.cell[row] = cell
+            self.cells.setdefault(self.key(row), set()).add(row)
+
+    def unlocate(self, row, key):
+        rows = self.cells[key]
+        rows.discard(row)
+        if not rows: del self.cells[key]
+
+    def relocate(self, rows, sectors):
+        '''
+        Update the grid for the rows whose position or sector changed,
+        sectors are the ones they had before.
+        '''
+        cells = numpy.floor(self.pos[rows][:, ::2] /
+                            self.cell_size).astype('<i4')
+        moved = numpy.flatnonzero((cells != self.cell[rows]).any(axis=1) |
+                                  (self.sector[rows] != sectors))
+        for (i, row) in zip(moved.tolist(), rows[moved].tolist()):
+            self.unlocate(row, (int(sectors[i]),) +
+                          tuple(self.cell[row].tolist()))
+            self.cell[row] = cells[i]
+            self.cells.setdefault(self.key(row), set()).add(row)
+
+    ## batches
+
+    def move(self, batch, sectors):
+        '''
+        Apply the DR rows of drbatch.decode, the latest of every entity if
+        its counter is higher than the one stored. The sector_id column of
+        batch is overwritten with interned ids. Returns the entity ids moved
+        and those that were not known, these get a row of their own unless
+        they were removed since the last move.
+        '''
+        sector_id = batch['sector_id']
+        sector_id[:] = UNCHANGED
+        for (i, name) in sectors.items():
+            sector_id[i] = self.sectors.intern(name)
+        batch = drbatch.latest(batch)
+        entity_ids = batch['entity_id'].tolist()
+        if self.removed:
+            alive = numpy.fromiter((entity_id not in self.removed
+                                    for entity_id in entity_ids), bool,
+                                   len(entity_ids))
+            batch = batch[alive]
+            entity_ids = batch['entity_id'].tolist()
+            self.removed.clear()
+        unknown = [entity_id for entity_id in entity_ids
+                   if entity_id not in self.rows]
+        for entity_id in unknown: self.append(entity_id)
+        rows = numpy.fromiter(map(self.rows.__getitem__, entity_ids),
+                              numpy.intp, len(entity_ids))
+        newer = self.counter[rows] < batch['counter']
+        (rows, batch) = (rows[newer], batch[newer])
+        sectors = self.sector[rows]
+        self.pos[rows] = batch['pos']
+        self.vel[rows] = batch['vel']
+        self.world_vel[rows] = batch['world_vel']
+        self.ang_vel[rows] = batch['ang_vel']
+        self.heading[rows] = batch['y_rot'] * Y_ROT
+        self.stamp[rows] = self.timefunc()
+        self.counter[rows] = batch['counter']
+        changed = batch['sector_id'] != UNCHANGED
+        self.sector[rows[changed]] = batch['sector_id'][changed]
+        self.relocate(rows, sectors)
+        if self.history is not None: self.remember(rows)
+        return (batch['entity_id'].tolist(), unknown)
+
+    ## dead reckoning
+
+    def predict(self, at=None):
+        '''
+        Position and heading of every actor at time at, timefunc() by
+        default, as arrays in the order of the rows, see ids. States are
+        extrapolated by at most HORIZON seconds.
+        '''
+        if at is None: at = self.timefunc()
+        rows = slice(0, self.length)
+        dt = numpy.clip(at - self.stamp[rows], 0, HORIZON).astype('<f4')
+        return extrapolate(self.pos[rows], self.vel[rows],
+                           self.world_vel[rows], self.heading[rows],
+                           self.ang_vel[rows], dt)
+
+    ## history
+
+    def remember(self, rows):
+        '''Record the state of rows in history, rows new to it get a slot.'''
+        history = self.history
+        slots = self.slot[rows]
+        if history.free and (slots < 0).any():
+            for row in rows[slots < 0].tolist():
+                self.slot[row] = history.acquire()
+            slots = self.slot[rows]
+        kept = slots >= 0  # rows without a slot once history is full
+        if not kept.all(): (rows, slots) = (rows[kept], slots[kept])
+        y_rot = numpy.rint(self.heading[rows] / numpy.float32(Y_ROT)) % 256
+        history.record(slots, self.stamp[rows], self.pos[rows],
+                       y_rot.astype('u1'))
+
+    def trail(self, entity_id, seconds=None, at=None):
+        '''
+        The records (time, pos, y_rot) of entity_id of the seconds before
+        at, timefunc() by default, oldest first. All of them without
+        seconds, none without history.
+        '''
+        slot = -1 if entity_id not in self.rows else \
+            int(self.slot[self.rows[entity_id]])
+        if slot < 0: return numpy.zeros(0, RECORD)
+        if at is None: at = self.timefunc()
+        since = -math.inf if seconds is None else at - seconds
+        return self.history.window(slot, since, at)
+
+    ## queries
+
+    def in_sector(self, sector):
+        '''Entity ids of the actors in sector.'''
+        return self.ids[:self.length][self.sector_rows(sector)]
+
+    def sector_rows(self, sector):
+        if sector not in self.sectors: return numpy.zeros(0, numpy.intp)
+        return numpy.flatnonzero(self.sector[:self.length] ==
+                                 self.sectors.intern(sector))
+
+    def near(self, sector, pos, radius):
+        '''
+        Entity ids of the actors in sector within radius of pos and their
+        distances, nearest first.
+        '''
+        if sector not in self.sectors: return self.result(numpy.zeros(0, int))
+        sector_id = self.sectors.intern(sector)
+        (x, z) = (pos[0], pos[2])
+        (x0, x1) = (int((x - radius) // self.cell_size),
+                    int((x + radius) // self.cell_size))
+        (z0, z1) = (int((z - radius) // self.cell_size),
+                    int((z + radius) // self.cell_size))
+        if (x1 - x0 + 1) * (z1 - z0 + 1) > len(self.cells):
+            rows = self.sector_rows(sector)
+        else:
+            rows = self.gather((sector_id, cx, cz)
+                               for cx in range(x0, x1 + 1)
+                               for cz in range(z0, z1 + 1))
+        return self.result(rows, pos, radius)
+
+    def nearest(self, sector, pos, k):
+        '''
+        Entity ids of the k actors in sector nearest to pos and their
+        distances, nearest first. Fewer if there are not that many.
+        '''
+        if sector not in self.sectors or k <= 0:
+            return self.result(numpy.zeros(0, int))
+        k = min(k, len(self))
+        sector_id = self.sectors.intern(sector)
+        (cx, cz) = (int(pos[0] // self.cell_size), int(pos[2] // self.cell_size))
+        rows = list()
+        for ring in itertools.count():
+            if (2 * ring + 1) ** 2 > len(self.cells):  # sparse, take all
+                rows = self.sector_rows(sector)
+                break
+            for key in ring_cells(sector_id, cx, cz, ring):
+                rows.extend(self.cells.get(key, ()))
+            if len(rows) >= k:
+                # the k-th candidate bounds the distance, cells beyond the
+                # ring may still hold closer actors within it
+                rows = numpy.array(rows, numpy.intp)
+                distances = self.distances(rows, pos)
+                radius = numpy.partition(distances, k - 1)[k - 1]
+                (ids, distances) = self.near(sector, pos, float(radius))
+                return (ids[:k], distances[:k])
+        (ids, distances) = self.result(rows, pos)
+        return (ids[:k], distances[:k])
+
+    def gather(self, keys):
+        cells = self.cells
+        rows = [cells[key] for key in keys if key in cells]
+        return numpy.fromiter(itertools.chain.from_iterable(rows), numpy.intp,
+                              sum(map(len, rows)))
+
+    def distances(self, rows, pos):
+        return numpy.sqrt(((self.pos[rows] - numpy.asarray(pos, '<f4')) ** 2)
+                          .sum(axis=1))
+
+    def result(self, rows, pos=None, radius=None):
+        if not len(rows): return (self.ids[:0], numpy.zeros(0, '<f4'))
+        distances = self.distances(rows, pos)
+        if radius is not None:
+            inside = distances <= radius
+            (rows, distances) = (rows[inside], distances[inside])
+        order = numpy.argsort(distances, kind='stable')
+        return (self.ids[rows[order]], distances[order])
+
+
+def extrapolate(pos, vel, world_vel, heading, ang_vel, dt):
+    '''
+    Positions and headings after dt seconds, all arguments are arrays with
+    a row per actor. vel is turned by the heading about the y axis, while
+    the actor turns the turned velocity is integrated exactly.
+    '''
+    tau = numpy.float32(TAU)
+    turned = ang_vel * dt
+    # the integral of the heading's rotation over dt is the rotation by
+    # the mean heading, scaled by dt * sinc, which is dt when not turning
+    middle = heading + turned / 2
+    scale = dt * numpy.sinc(turned / tau)
+    (sin, cos) = (numpy.sin(middle) * scale, numpy.cos(middle) * scale)
+    (x, y, z) = (vel[:, 0], vel[:, 1], vel[:, 2])
+    moved = world_vel * dt[:, None]
+    moved[:, 0] += x * cos + z * sin
+    moved[:, 1] += y * dt
+    moved[:, 2] += z * cos - x * sin
+    heading = heading + turned
+    return (pos + moved, heading - tau * numpy.floor(heading / tau))
+
+
+class History:
+    '''
+    The last depth records of up to size actors, kept in one block of
+    RECORD allocated up front. Every slot is a ring, head is where its
+    next record goes and count how many it holds. ActorTable hands out
+    the slots and takes them back when an actor is removed.
+    '''
+    def __init__(self, size=1024, depth=256):
+        self.depth = depth
+        self.block = numpy.zeros((size, depth), RECORD)
+        self.head = numpy.zeros(size, numpy.intp)
+        self.count = numpy.zeros(size, numpy.intp)
+        self.free = list(range(size - 1, -1, -1))
+
+    def acquire(self): return self.free.pop() if self.free else -1
+
+    def release(self, slot):
+        self.head[slot] = self.count[slot] = 0
+        self.free.append(slot)
+
+    def record(self, slots, time, pos, y_rot):
+        '''Append a record to each of slots, which must be distinct.'''
+        head = self.head[slots]
+        block = self.block
+        block['time'][slots, head] = time
+        block['pos'][slots, head] = pos
+        block['y_rot'][slots, head] = y_rot
+        self.head[slots] = (head + 1) % self.depth
+        self.count[slots] = numpy.minimum(self.count[slots] + 1, self.depth)
+
+    def window(self, slot, since, until):
+        '''The records of slot from since to until, oldest first.'''
+        count = int(self.count[slot])
+        order = (self.head[slot] - count + numpy.arange(count)) % self.depth
+        records = self.block[slot, order]
+        times = records['time']
+        return records[numpy.searchsorted(times, since):
+                       numpy.searchsorted(times, until, 'right')]
+
+
+class Interned:
+    '''Strings by id and ids by string, id 0 is the empty string.'''
+    def __init__(self):
+        self.strings = ['']
+        self.ids = {'': 0}
+
+    def __contains__(self, string): return string in self.ids
+    def __getitem__(self, id): return self.strings[id]
+
+    def intern(self, string):
+        id = self.ids.get(string)
+        if id is None:
+            id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return id
+
+
+def ring_cells(sector, cx, cz, ring):
+    '''The keys of the cells at Chebyshev distance ring of (cx, cz).'''
+    if not ring:
+        yield (sector, cx, cz)
+        return
+    for x in range(cx - ring, cx + ring + 1):
+        yield (sector, x, cz - ring)
+        yield (sector, x, cz + ring)
+    for z in range(cz - ring + 1, cz + ring):
+        yield (sector, cx - ring, z)
+        yield (sector, cx + ring, z)
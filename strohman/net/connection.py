@@ -1,23 +1,42 @@
 import socket
 import errno
+import asyncio
 import logging
+import collections
 
-from strohman import asynsocket
+from strohman import aiosocket
+try: from strohman import asynsocket
+except ImportError: asynsocket = None  # asyncore is gone since python 3.12
 from strohman.net import handlers
 from strohman.net import netpacket
+from strohman.net import reliable
+from strohman.net import reassembly
 
 
 LOGGER = logging.getLogger(__name__)
 MAX_PACKET_SIZE = 1400
-HEARTBEAT_TIMEOUT = 30
-TOTAL_TIMEOUT = 40
+RECV_BUDGET = 64  # datagrams read per read event at most
+FRAGMENT_BUDGET = 8  # parts of large packets sent per write event at most
+ACK_DELAY = 0.005  # acks are held back this long to be sent together
+ACKS_PER_DATAGRAM = (MAX_PACKET_SIZE - netpacket.HEADER.size) // \
+    netpacket.HEADER.size
+HEARTBEAT_TIMEOUT = 30  # send a heartbeat after this long without traffic
+TOTAL_TIMEOUT = 40  # give up after this long without any datagram
+HEARTBEAT = netpacket.type_of(netpacket.HeartbeatPacket)
 
 
 class PacketHandler:
+    '''
+    The handlers registered per msg_type. The functions they registered
+    are compiled into a tuple per msg_type on register and unregister,
+    distributing a packet only walks that tuple.
+    '''
     def __init__(self):
         self.logger = LOGGER.getChild(self.__class__.__name__)
         self.handlers = dict()
-        self.fallback_handler = handlers.BaseHandler(None)
+        self.batch_handlers = dict()
+        self.dispatch = dict()  # msg_type -> functions of self.handlers
+        self.batch_dispatch = dict()  # msg_type -> those of batch_handlers
 
     def close(self):
         for handler in self.gen_handlers(): handler.close()
@@ -28,24 +47,53 @@ class PacketHandler:
         registered_handlers = set(())
         for handlers in self.handlers.values():
             registered_handlers.update(handlers)
+        for handlers in self.batch_handlers.values():
+            registered_handlers.update(handlers)
         return registered_handlers
 
+    def wants(self, msg_type): return msg_type in self.dispatch
+    def batches(self, msg_type): return msg_type in self.batch_dispatch
+
     def distribute(self, packet):
-        handlers = self.handlers.get(packet.msg_type,
-                                     set((self.fallback_handler,)))
-        for handler in handlers.copy(): handler.handle(packet)
+        functions = self.dispatch.get(packet.msg_type)
+        if functions is None:
+            self.logger.warning('Unhandled %s', packet)
+            return
+        for function in functions: function(packet)
 
-    def register(self, handler, packet):
-        msg_type = netpacket.message_type.index(packet)
-        if msg_type in self.handlers: self.handlers[msg_type].add(handler)
-        else: self.handlers[msg_type] = set((handler,))
+    def distribute_batch(self, msg_type, payloads):
+        for function in self.batch_dispatch.get(msg_type, ()):
+            function(payloads)
+
+    def register(self, handler, packet, batch=False):
+        '''
+        Add handler for packet, registering it again picks up the function
+        handler registered for packet in the meantime.
+        '''
+        msg_type = netpacket.type_of(packet)
+        registry = self.batch_handlers if batch else self.handlers
+        if msg_type in registry: registry[msg_type].add(handler)
+        else: registry[msg_type] = set((handler,))
+        self.compile(msg_type)
 
     def unregister(self, handler, packet):
-        msg_type = netpacket.message_type.index(packet)
-        if msg_type in self.handlers:
-            handlers = self.handlers.pop(msg_type)
-            if handler in handlers: handlers.remove(handler)
-            if handlers: self.handlers[msg_type] = handlers
+        msg_type = netpacket.type_of(packet)
+        for registry in (self.handlers, self.batch_handlers):
+            if msg_type in registry:
+                handlers = registry.pop(msg_type)
+                if handler in handlers: handlers.remove(handler)
+                if handlers: registry[msg_type] = handlers
+        self.compile(msg_type)
+
+    def compile(self, msg_type):
+        packet = netpacket.packet_class(msg_type)
+        for (registry, dispatch, attribute) in (
+                (self.handlers, self.dispatch, 'registered'),
+                (self.batch_handlers, self.batch_dispatch, 'batches')):
+            if msg_type in registry:
+                dispatch[msg_type] = tuple(getattr(handler, attribute)[packet]
+                                           for handler in registry[msg_type])
+            else: dispatch.pop(msg_type, None)
 
 
 class Connection:
@@ -53,16 +101,26 @@ class Connection:
         self.logger = LOGGER.getChild(self.__class__.__name__)
         self.interface = interface
         self.connected = True
-        self.asyn = self.packet_handler = self.heartbeat_gen = None
-        self.asyn = Asynsocket(self, ip, port)
+        self.asyn = self.packet_handler = self.watchdog_event = None
+        self.sched = interface.sched
+        # last datagram at all and last one that was not a heartbeat
+        self.heard = self.alive = self.probed = self.sched.timefunc()
+        self.decode_cache = None  # a decodecache.DecodeCache, opt-in
+        self.reliable = reliable.Retransmitter(interface.sched, self.resend,
+                                               self.handle_error)
+        if isinstance(interface.sched, aiosocket.aioschedcore):
+            self.asyn = Datagram(self, ip, port)
+        else: self.asyn = Asynsocket(self, ip, port)
         self.packet_handler = PacketHandler()
-        self.heartbeat_gen = self.heartbeat_generator(interface.sched)
+        self.watchdog()
 
     def close(self):
         if self.connected:
             self.connected = False
             self.logger.info('Closing connection.')
-            if not self.heartbeat_gen is None: self.heartbeat_gen.close()
+            if not self.watchdog_event is None:
+                self.sched.cancel(self.watchdog_event)
+            self.reliable.clear()
             if not self.packet_handler is None: self.packet_handler.close()
             if not self.asyn is None: self.asyn.close()
 
@@ -73,53 +131,71 @@ class Connection:
             self.interface.on_connection_error()
 
     def handle_packet(self, *packets):
-        next(self.heartbeat_gen)
+        cache = self.decode_cache
         for packet in packets:
+            if cache is None: packet.unpack_body(lazy=True)
+            else: cache.unpack(packet)
             self.packet_handler.distribute(packet)
+            packet.release()
+
+    def handle_batches(self, batches):
+        for (msg_type, payloads) in batches.items():
+            self.packet_handler.distribute_batch(msg_type, payloads)
 
     def push(self, packet):
         if self.connected:
             return self.asyn.push(packet)
         return False
 
-    def heartbeat_generator(self, scheduler):
-        def handle_hb():
-            self.logger.error('Timeout, sending Heartbeat')
-            self.push(netpacket.HeartbeatPacket())
+    def resend(self, datagram):
+        if self.connected: self.asyn.queue(datagram)
 
-        def handle_to():
+    def watchdog(self):
+        '''
+        Check heard and alive, which the transport sets per datagram, and
+        enter itself again for the next deadline.
+        After HEARTBEAT_TIMEOUT with nothing but heartbeats of the server a
+        heartbeat is sent, the server acks it unless it forgot about us
+        (the client restarted). If the ack does not come, connection.reliable
+        gives up. Without any datagram for TOTAL_TIMEOUT the connection fails.
+        '''
+        self.watchdog_event = None
+        now = self.sched.timefunc()
+        if now - self.heard >= TOTAL_TIMEOUT:
             self.logger.error('Timeout, starting error handling.')
             self.handle_error('timeout')
+            return
+        if now - max(self.alive, self.probed) >= HEARTBEAT_TIMEOUT:
+            self.logger.error('Timeout, sending Heartbeat')
+            heartbeat = netpacket.HeartbeatPacket.acquire()
+            self.push(heartbeat)
+            heartbeat.release()
+            self.probed = now
+        deadline = min(self.heard + TOTAL_TIMEOUT,
+                       max(self.alive, self.probed) + HEARTBEAT_TIMEOUT)
+        self.watchdog_event = self.sched.enter(max(deadline - now, 1), 1,
+                                               self.watchdog, tuple())
 
-        while True:
-            heartbeat_event = scheduler.enter(HEARTBEAT_TIMEOUT, 1,
-                                              handle_hb, tuple())
-            timeout_event = scheduler.enter(TOTAL_TIMEOUT, 2,
-                                            handle_to, tuple())
-            try: yield
-            finally:
-                if heartbeat_event in scheduler.queue:
-                    scheduler.cancel(heartbeat_event)
-                if timeout_event in scheduler.queue:
-                    scheduler.cancel(timeout_event)
 
+class Transport:
+    '''
+    Acks, reassembly, dispatch and the send queue of a connection, the
+    subclasses feed it with the datagrams of their event loop.
+    '''
+    fragment_budget = FRAGMENT_BUDGET
 
-class Asynsocket(asynsocket.dispatcher):
-    def __init__(self, connection, ip, port):
-        super().__init__()
+    def __init__(self, connection):
         self.logger = LOGGER.getChild(self.__class__.__name__)
         self.id_counter = 1
-        self.multi_queue = dict()
-        self.out_buffer = list()
+        self.multi_queue = reassembly.Reassembler()
+        self.batches = dict()  # msg_type -> bodies for batch handlers
+        self.out_buffer = collections.deque()
+        self.fragments = collections.deque()  # parts of packets too large
+        self.acks = bytearray()  # acks held back, see queue_ack()
+        self.ack_event = None
+        self.received = reliable.Window()  # ids of reliable packets received
+        self.stats = collections.Counter()  # events and datagrams per direction
         self.connection = connection
-        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try: self.connect((ip, port))
-        except IOError as e: self.handle_connection_error(e)
-
-    def readable(self): return True
-    def writable(self): return bool(self.out_buffer)
-    def handle_close(self): self.close()
-    def handle_error(self): self.logger.exception('Exc:')
 
     def handle_connection_error(self, error):
         self.logger.error('Catched error: {} (errno: {})'.format(error.strerror,
@@ -132,49 +208,259 @@ class Asynsocket(asynsocket.dispatcher):
 
         elif error.errno in (errno.EINVAL, # unable to send
                             ):
-            pass # XXX resend packet
+            pass # reliable packets are sent again by connection.reliable
 
-    def handle_read(self):
-        try: data = self.recv(MAX_PACKET_SIZE)
-        except IOError as e: self.handle_connection_error(e)
-        else:
-            packet = netpacket.BasePacket(data)
-            if packet.needs_ack: self.push(packet.ack()) # XXX heartbeat
-            if packet.is_part: self.handle_part(packet)
-            elif packet.is_multi: self.handle_multi(data)
-            else:
-                packet = netpacket.by_type(packet.msg_type, packet)
-                self.logger.debug('Got {0}'.format(packet))
-                self.connection.handle_packet(packet)
-
-    def handle_part(self, packet):
-        if packet.id in self.multi_queue:
-            if self.multi_queue[packet.id].append(packet):
-                packet = self.multi_queue.pop(packet.id)
-                self.logger.debug('Multipart ({0}) completed: {1}'.format(packet.id, packet))
-                self.connection.handle_packet(packet)
-        else:
-            self.logger.debug('Multipart {0} initiated.'.format(packet.id))
-            packet = netpacket.by_type(packet.msg_type, packet)
-            self.multi_queue[packet.id] = packet
+    def schedule_write(self):
+        '''Called when datagrams were queued.'''
+        pass
+
+    def flush_batches(self):
+        if self.batches:
+            (batches, self.batches) = (self.batches, dict())
+            self.connection.handle_batches(batches)
+
+    def handle_datagram(self, data):
+        '''
+        Ack and dispatch a datagram. Reliable packets the server sent again
+        because an ack got lost are acked again, but dropped.
+        '''
+        header = netpacket.Header.unpack(data)
+        connection = self.connection
+        connection.heard = connection.sched.timefunc()
+        if header.msg_type != HEARTBEAT or header.is_multi or header.is_part:
+            connection.alive = connection.heard
+        if header.needs_ack: self.queue_ack(header)
+        if header.is_part:
+            # parts of a message completed before are dropped
+            if not self.received.check(header.id, add=False):
+                self.handle_part(header)
+        elif header.is_multi: self.handle_multi(data)
+        elif not (header.needs_ack and self.received.check(header.id)):
+            self.dispatch(header)
+
+    def queue_ack(self, header):
+        '''
+        Hold the ack for header back for ACK_DELAY, so the acks of a burst
+        leave together in multi datagrams.
+        '''
+        header.ack_into(self.acks)
+        if len(self.acks) >= ACKS_PER_DATAGRAM * netpacket.HEADER.size:
+            if self.ack_event is not None:  # flushed now instead
+                self.connection.interface.sched.cancel(self.ack_event)
+            self.flush_acks()
+        elif self.ack_event is None:
+            self.ack_event = self.connection.interface.sched.enter(
+                ACK_DELAY, 1, self.flush_acks, tuple())
+
+    def drop_acks(self):
+        '''Forget the acks held back and cancel their flush, on close.'''
+        if self.ack_event is not None:
+            self.connection.interface.sched.cancel(self.ack_event)
+            self.ack_event = None
+        del self.acks[:]
+
+    def flush_acks(self):
+        size = netpacket.HEADER.size
+        self.out_buffer.extend(bytes(self.acks[pos:pos + size])
+                               for pos in range(0, len(self.acks), size))
+        self.stats['acks_out'] += len(self.acks) // size
+        del self.acks[:]
+        self.ack_event = None
+        self.schedule_write()
+
+    def dispatch(self, *headers):
+        '''
+        Pass the packets for the headers somebody handles to the connection,
+        the rest is dropped. Acks are passed to the retransmission queue
+        first. Bodies of types with batch handlers are queued in
+        self.batches, the queue is flushed before the next packet that is
+        not batched, so the handlers see everything in the order it arrived.
+        '''
+        packet_handler = self.connection.packet_handler
+        packets = list()
+        for header in headers:
+            if header.msg_type == 0:  # ack
+                self.connection.reliable.ack(header.id, header.offset)
+            if packet_handler.batches(header.msg_type):
+                self.batches.setdefault(header.msg_type, list()).append(
+                    header.payload)
+            if packet_handler.wants(header.msg_type):
+                if self.batches:
+                    if packets: self.connection.handle_packet(*packets)
+                    packets = list()
+                    self.flush_batches()
+                packets.append(netpacket.by_type(header.msg_type, header))
+                self.logger.debug('Got %s', packets[-1])
+        if packets: self.connection.handle_packet(*packets)
+
+    def handle_part(self, header):
+        header = self.multi_queue.add(header)
+        if header is not None:
+            self.received.add(header.id)
+            self.dispatch(header)
 
     def handle_multi(self, data):
-        multi = [netpacket.by_type(p.msg_type, p) for p in netpacket.MultiPacket(data)]
-        self.logger.debug('Multipacket containing {0} packets:'.format(len(multi)))
-        for (num, packet) in enumerate(multi):
-            self.logger.debug('{0}\t{1}'.format(num, packet))
-        self.connection.handle_packet(*multi)
+        headers = list()
+        for header in netpacket.split(data):
+            if header.needs_ack:
+                self.queue_ack(header)
+                if self.received.check(header.id): continue
+            headers.append(header)
+        self.logger.debug('Multipacket containing %s packets.', len(headers))
+        self.dispatch(*headers)
 
     def handle_write(self):
-        try:
-            self.send(self.out_buffer.pop(0))
-            return True
-        except IOError as e:
-            self.handle_connection_error(e)
-            return False
+        '''
+        Send the whole queue, up to where the socket would block. Packets
+        queued since the last write event are coalesced into datagrams of
+        MAX_PACKET_SIZE at most. Parts of large packets follow, at most
+        fragment_budget per event so they do not hold up small packets.
+        '''
+        self.stats['write_events'] += 1
+        for _ in range(min(self.fragment_budget, len(self.fragments))):
+            self.out_buffer.append(self.fragments.popleft())
+            self.connection.reliable.track(self.out_buffer[-1])
+        while self.out_buffer:
+            datagrams = self.coalesce()
+            data = datagrams[0] if len(datagrams) == 1 else \
+                netpacket.join(datagrams)
+            try: sent = self.send(data)
+            except IOError as e:
+                self.handle_connection_error(e)
+                return False
+            if not sent:  # would block, try again on the next event
+                self.out_buffer.extendleft(reversed(datagrams))
+                return False
+            self.stats['datagrams_out'] += 1
+            self.stats['packets_out'] += len(datagrams)
+        return True
+
+    def coalesce(self):
+        '''Take as many datagrams from the queue as fit into one.'''
+        datagrams = [self.out_buffer.popleft()]
+        size = netpacket.HEADER.size + len(datagrams[0])
+        while self.out_buffer and \
+                size + len(self.out_buffer[0]) <= MAX_PACKET_SIZE:
+            size += len(self.out_buffer[0])
+            datagrams.append(self.out_buffer.popleft())
+        return datagrams
 
     def push(self, packet):
         self.id_counter += 1
         packet.id = self.id_counter
-        self.out_buffer.append(packet.pack())
-        self.logger.debug('Send {0}'.format(packet))
+        data = packet.pack()
+        if len(data) > MAX_PACKET_SIZE:
+            parts = netpacket.fragment(data, MAX_PACKET_SIZE)
+            self.fragments.extend(parts)
+        else:
+            self.out_buffer.append(data)
+            self.connection.reliable.track(data)
+        self.logger.debug('Send %s', packet)
+        self.schedule_write()
+
+    def queue(self, datagram):
+        self.out_buffer.append(datagram)
+        self.schedule_write()
+
+
+class Asynsocket(Transport, getattr(asynsocket, 'dispatcher', object)):
+    recv_budget = RECV_BUDGET
+
+    def __init__(self, connection, ip, port):
+        asynsocket.dispatcher.__init__(self)
+        Transport.__init__(self, connection)
+        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try: self.connect((ip, port))
+        except IOError as e: self.handle_connection_error(e)
+
+    def readable(self): return True
+    def writable(self): return bool(self.out_buffer or self.fragments)
+    def handle_close(self): self.close()
+    def handle_error(self): self.logger.exception('Exc:')
+
+    def close(self):
+        self.drop_acks()
+        asynsocket.dispatcher.close(self)
+
+    def handle_read(self):
+        '''Read until the socket would block, at most recv_budget datagrams.'''
+        self.stats['read_events'] += 1
+        for _ in range(self.recv_budget):
+            if not self.connected: break
+            try: data = self.recv(MAX_PACKET_SIZE)
+            except BlockingIOError: break
+            except IOError as e:
+                self.handle_connection_error(e)
+                break
+            if not data: break
+            self.stats['datagrams_in'] += 1
+            self.handle_datagram(data)
+        self.flush_batches()
+
+
+class Datagram(Transport, asyncio.DatagramProtocol):
+    '''
+    Transport on an asyncio event loop, the loop of an aioschedcore.
+    Datagrams are dispatched as they arrive, batches and the send queue
+    are flushed once per loop iteration.
+    '''
+    def __init__(self, connection, ip, port):
+        super().__init__(connection)
+        self.sched = connection.interface.sched
+        self.transport = None
+        self.connected = self.paused = self.tick_pending = False
+        self.sched.transports.add(self)
+        self.connecting = self.sched.loop.create_task(self.connect(ip, port))
+
+    async def connect(self, ip, port):
+        try: await self.sched.loop.create_datagram_endpoint(
+            lambda: self, remote_addr=(ip, port), family=socket.AF_INET)
+        except OSError as e: self.handle_connection_error(e)
+
+    def close(self):
+        self.connected = False
+        self.drop_acks()
+        if self.transport is not None: self.transport.close()
+        else: self.connecting.cancel()
+        self.sched.transports.discard(self)
+        self.sched.check()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connected = True
+        self.schedule_write()
+
+    def connection_lost(self, exc):
+        if exc is not None: self.logger.error('Connection lost: %s', exc)
+        self.transport = None
+        if self.connected: self.close()
+
+    def error_received(self, exc): self.handle_connection_error(exc)
+
+    def pause_writing(self): self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.schedule_write()
+
+    def datagram_received(self, data, addr):
+        self.stats['datagrams_in'] += 1
+        self.handle_datagram(data)
+        if self.batches: self.schedule_write()
+
+    def schedule_write(self):
+        if not self.tick_pending:
+            self.tick_pending = True
+            self.sched.loop.call_soon(self.handle_tick)
+
+    def handle_tick(self):
+        self.tick_pending = False
+        self.flush_batches()
+        if self.connected and not self.paused and self.handle_write() and \
+                self.fragments:
+            self.schedule_write()
+
+    def send(self, data):
+        if self.paused: return 0
+        self.transport.sendto(data)
+        return len(data)
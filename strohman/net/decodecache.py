@@ -0,0 +1,90 @@
+'''Memoized decoding of bodies the server sends again and again.
+
+Weather ticks, the MOTD, PersistActor after every sector change and buddy
+list refreshes repeat byte for byte. DecodeCache keeps the decoded fields
+of such bodies by (msg_type, payload), a repeated body is then restored
+from the cache instead of running _unpack again.
+'''
+import types
+import collections
+
+from strohman.net import netpacket
+
+
+CAPS = {'WeatherPacket': 8, 'SystemPacket': 16, 'PersistActorPacket': 256,
+        'BuddyListPacket': 4}
+
+
+class DecodeCache:
+    '''
+    LRU cache of decoded bodies with an entry limit per message type, types
+    without a limit are not cached. caps maps packet classes, their names
+    or msg_types to limits, CAPS is used by default.
+    The decoded fields of a body are a read-only mapping shared by all
+    packets with that body, nested dicts and lists in it are read-only too.
+    '''
+    def __init__(self, caps=None):
+        self.caps = dict()
+        for (packet, cap) in (CAPS if caps is None else caps).items():
+            if isinstance(packet, str): packet = getattr(netpacket, packet)
+            if isinstance(packet, type): packet = netpacket.type_of(packet)
+            self.caps[packet] = cap
+        self.entries = collections.defaultdict(collections.OrderedDict)
+        self.hits = collections.Counter()  # by msg_type
+        self.misses = collections.Counter()
+        self.names = dict()  # packet class -> decoded attributes
+
+    def __len__(self): return sum(map(len, self.entries.values()))
+
+    def clear(self):
+        self.entries.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def unpack(self, packet):
+        '''
+        Decode the body of packet, from the cache if it was seen before.
+        Returns the decoded fields, None if the type is not cached.
+        '''
+        cap = self.caps.get(packet.msg_type)
+        if not cap or len(packet.data) != packet.size or \
+                packet.decoder is not None:
+            packet.unpack_body(lazy=True)
+            return None
+        entries = self.entries[packet.msg_type]
+        key = bytes(packet.data.view())
+        view = entries.get(key)
+        if view is None:
+            self.misses[packet.msg_type] += 1
+            packet.unpack_body()
+            view = entries[key] = self.snapshot(packet)
+            if len(entries) > cap: entries.popitem(last=False)
+        else:
+            self.hits[packet.msg_type] += 1
+            entries.move_to_end(key)
+            for (name, value) in view.items(): setattr(packet, name, value)
+            packet.data.pos = packet.data.end
+        return view
+
+    def snapshot(self, packet):
+        cls = packet.__class__
+        if cls not in self.names:
+            names = list()
+            for klass in cls.__mro__:
+                if klass is netpacket.BasePacket: break
+                names.extend(klass.__dict__.get('__slots__', ()))
+            self.names[cls] = names
+        fields = dict()
+        for name in self.names[cls]:
+            try: fields[name] = freeze(getattr(packet, name))
+            except AttributeError: pass
+        return types.MappingProxyType(fields)
+
+
+def freeze(value):
+    '''Read-only copy of a decoded value, lists become tuples.'''
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: freeze(item)
+                                       for (key, item) in value.items()})
+    if isinstance(value, (list, tuple)): return tuple(map(freeze, value))
+    return value
@@ -0,0 +1,88 @@
+'''Batch decoding of DeadReckoningPacket bodies with numpy.
+
+The bodies received in one go are grouped by their flags byte. All bodies
+of a group share one layout, so their fixed size parts are joined and read
+by a single numpy.frombuffer, every field becomes a strided column that is
+scattered into the rows of the result at once.
+'''
+import logging
+
+import numpy
+
+
+LOGGER = logging.getLogger(__name__)
+SECTOR_NAME = 0xffffffff  # sector_id of bodies followed by the sector name
+FLAGS = 5  # offset of the flags byte
+DTYPE = numpy.dtype([('entity_id', '<u4'), ('counter', 'u1'), ('flags', 'u1'),
+                     ('mode', 'u1'), ('ang_vel', '<f4'), ('vel', '<f4', 3),
+                     ('world_vel', '<f4', 3), ('pos', '<f4', 3),
+                     ('y_rot', 'u1'), ('sector_id', '<u4')])
+VECTORS = (('vel', (4, 8, 16)), ('world_vel', (32, 64, 128)))
+_layouts = dict()
+
+
+def layout(flags):
+    '''Packed dtype of the fixed size part of a body with these flags.'''
+    if flags not in _layouts:
+        fields = [('entity_id', '<u4'), ('counter', 'u1'), ('flags', 'u1')]
+        if flags & 1: fields.append(('mode', 'u1'))
+        if flags & 2: fields.append(('ang_vel', '<f4'))
+        for (name, bits) in VECTORS:
+            for (axis, bit) in enumerate(bits):
+                if flags & bit: fields.append(('{}{}'.format(name, axis), '<f4'))
+        fields += [('pos', '<f4', 3), ('y_rot', 'u1'), ('sector_id', '<u4')]
+        _layouts[flags] = numpy.dtype(fields)
+    return _layouts[flags]
+
+
+def decode(payloads):
+    '''
+    Decode DeadReckoningPacket bodies into an array of DTYPE, one row per
+    body in the order given. Fields missing from a body are 0 like the
+    defaults of the packet. Returns the array and a dict of the sector names
+    by row, only rows with sector_id SECTOR_NAME carry one.
+    Bodies too short for their layout are logged and left out.
+    '''
+    groups = dict()
+    rows = 0
+    for payload in payloads:
+        if len(payload) > FLAGS and \
+                len(payload) >= layout(payload[FLAGS]).itemsize:
+            (index, bodies) = groups.setdefault(payload[FLAGS], ([], []))
+            index.append(rows)
+            bodies.append(payload)
+            rows += 1
+        else: LOGGER.warning('Unable to unpack {}.'.format(bytes(payload)))
+
+    batch = numpy.zeros(rows, DTYPE)
+    sectors = dict()
+    for (flags, (index, bodies)) in groups.items():
+        dtype = layout(flags)
+        size = dtype.itemsize
+        columns = numpy.frombuffer(b''.join(body[:size] for body in bodies),
+                                   dtype)
+        index = numpy.array(index)
+        for name in dtype.names:
+            if name in DTYPE.names: batch[name][index] = columns[name]
+            else: batch[name[:-1]][index, int(name[-1])] = columns[name]
+        for i in numpy.flatnonzero(columns['sector_id'] == SECTOR_NAME):
+            sectors[int(index[i])] = _string(bodies[i], size)
+    return (batch, sectors)
+
+
+def latest(batch):
+    '''The row with the highest counter of every entity, sorted by entity.'''
+    if len(batch) < 2: return batch
+    batch = batch[numpy.lexsort((batch['counter'], batch['entity_id']))]
+    entity_ids = batch['entity_id']
+    return batch[numpy.append(entity_ids[1:] != entity_ids[:-1], True)]
+
+
+def _string(payload, pos):
+    payload = bytes(payload)
+    end = payload.find(b'\x00', pos)
+    if end < 0:
+        LOGGER.warning('Unable to unpack {}.'.format(payload))
+        return ''
+    try: return str(payload[pos:end], 'utf-8')
+    except UnicodeDecodeError: return 'UnicodeDecodeError'
@@ -4,16 +4,40 @@ import hashlib
 import logging
 
 from strohman.net import netpacket
+try: from strohman.net import drbatch
+except ImportError: drbatch = None  # numpy is missing
+try: from strohman.net import actortable
+except ImportError: actortable = None
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+class Limited:
+    '''Passes the first maximum packets to function, drops the rest.'''
+    __slots__ = ('owner', 'function', 'passed', 'maximum')
+
+    def __init__(self, owner, function, maximum):
+        self.owner = owner
+        self.function = function
+        self.passed = 0
+        self.maximum = maximum
+
+    def __call__(self, packet):
+        if self.passed >= self.maximum:
+            string = 'Called {} already {} times, dropping packet.'
+            self.owner.logger.warning(string.format(self.owner, self.passed))
+            return
+        self.passed += 1
+        self.function(packet)
+
+
 class BaseHandler:
     def __init__(self, interface):
         self.logger = LOGGER.getChild(self.__class__.__name__)
         self.interface = interface
         self.registered = dict()
+        self.batches = dict()
 
     def __str__(self): return self.__class__.__name__
 
@@ -23,36 +47,23 @@ class BaseHandler:
         times specifies how many packets are passed. 0 means infinite.
         If the number exceeds the packets are dropped.
         '''
-        if packet not in self.registered:
-            self.interface.connection.packet_handler.register(self, packet)
-        self.registered[packet] = (handler, 0, times)
+        self.registered[packet] = Limited(self, handler, times) if times \
+            else handler
+        self.interface.connection.packet_handler.register(self, packet)
+
+    def register_batch(self, packet, handler):
+        '''
+        Register a handler for the bodies of the packets received at once.
+        It is called with a list of them instead of once per packet.
+        '''
+        self.batches[packet] = handler
+        self.interface.connection.packet_handler.register(self, packet,
+                                                          batch=True)
 
     def close(self):
-        for packet in self.registered:
+        for packet in set(self.registered) | set(self.batches):
             self.interface.connection.packet_handler.unregister(self, packet)
 
-    def get_handler(self, packet):
-        for p in self.registered:
-            if isinstance(packet, p):
-                (handler, passed, maximum) = self.registered[p]
-                if maximum != 0 and passed > maximum:
-                    string = 'Called {} already {} times, dropping packet.'
-                    self.logger.warning(string.format(self, passed))
-                    return False
-                else:
-                    passed += 1
-                    self.registered[p] = (handler, passed, maximum)
-                    return handler
-
-    def handle(self, packet):
-        handler = self.get_handler(packet)
-        if callable(handler):
-            packet.unpack_body()
-            handler(packet)
-        elif handler is None:
-            self.logger.warning('{} handler got unhandled {}'.format(self,
-                                                                     packet))
-
 
 class Vitals(BaseHandler):
     def __init__(self, interface):
@@ -202,7 +213,74 @@ class Weather(BaseHandler):
             self.interface.on_weather_weatherup(self)
 
 
+class Subscription:
+    '''
+    Passes the chats of chat_types, all by default, to callback(handler,
+    packet). The filters given are compiled into one test: channels is a
+    set of channel ids and implies chat_types CHANNEL, senders a set of
+    names and prefix the start of the text.
+    '''
+    __slots__ = ('callback', 'chat_types', 'test')
+
+    def __init__(self, callback, chat_types=None, channels=None, senders=None,
+                 prefix=None):
+        self.callback = callback
+        if chat_types is None and channels is not None:
+            chat_types = (netpacket.ChatPacket.CHANNEL,)
+        self.chat_types = None if chat_types is None else frozenset(chat_types)
+        tests = list()  # in the order of the fields, decoding stops early
+        if senders is not None:
+            senders = frozenset(senders)
+            tests.append(lambda packet: packet.recipient in senders)
+        if prefix is not None:
+            tests.append(lambda packet: packet.text.startswith(prefix))
+        if channels is not None:
+            channels = frozenset(channels)
+            tests.append(lambda packet: packet.chat_type == packet.CHANNEL and
+                         packet.channel_id in channels)
+        if not tests: self.test = None
+        elif len(tests) == 1: self.test = tests[0]
+        else: self.test = lambda packet: all(test(packet) for test in tests)
+
+    def __call__(self, handler, packet):
+        if self.test is None or self.test(packet):
+            self.callback(handler, packet)
+
+
 class Chat(BaseHandler):
+    '''
+    Routes chats by chat_type to the subscriptions for it. The on_chat_
+    events of EVENTS the interface implements are subscribed from the start.
+    '''
+    EVENTS = {
+        netpacket.ChatPacket.SYSTEM: 'on_chat_system',
+        netpacket.ChatPacket.COMBAT: 'on_chat_combat',
+        netpacket.ChatPacket.SAY: 'on_chat_say',
+        netpacket.ChatPacket.TELL: 'on_chat_tell',
+        netpacket.ChatPacket.GROUP: 'on_chat_group',
+        netpacket.ChatPacket.GUILD: 'on_chat_guild',
+        netpacket.ChatPacket.ALLIANCE: 'on_chat_alliance',
+        netpacket.ChatPacket.AUCTION: 'on_chat_auction',
+        netpacket.ChatPacket.SHOUT: 'on_chat_shout',
+        netpacket.ChatPacket.CHANNEL: 'on_chat_channel',
+        netpacket.ChatPacket.TELLSELF: 'on_chat_tellself',
+        netpacket.ChatPacket.REPORT: 'on_chat_report',
+        netpacket.ChatPacket.ADVISOR: 'on_chat_advisor',
+        netpacket.ChatPacket.ADVICE: 'on_chat_advice',
+        netpacket.ChatPacket.ADVICE_LIST: 'on_chat_advice_list',
+        netpacket.ChatPacket.SERVER_TELL: 'on_chat_server_tell',
+        netpacket.ChatPacket.GM: 'on_chat_gm',
+        netpacket.ChatPacket.SERVER_INFO: 'on_chat_server_info',
+        netpacket.ChatPacket.NPC: 'on_chat_npc',
+        netpacket.ChatPacket.SYSTEM_BASE: 'on_chat_system_base',
+        netpacket.ChatPacket.PET_ACTION: 'on_chat_pet_action',
+        netpacket.ChatPacket.NPC_ME: 'on_chat_npc_me',
+        netpacket.ChatPacket.NPC_MY: 'on_chat_npc_my',
+        netpacket.ChatPacket.NPC_NARRATE: 'on_chat_npc_narrate',
+        netpacket.ChatPacket.AWAY: 'on_chat_away',
+        netpacket.ChatPacket.END: 'on_chat_end',
+    }
+
     def __init__(self, interface):
         super().__init__(interface)
         self.register(netpacket.ChatPacket, self.handle_chat)
@@ -210,6 +288,49 @@ class Chat(BaseHandler):
         self.flood_protect = None
         self.channel_names = dict()
         self.channel_numbers = dict()
+        self.subscriptions = list()
+        self.routes = dict()  # chat_type -> subscriptions, by subscribe
+        for (chat_type, event) in self.EVENTS.items():
+            if interface.overrides(event):
+                self.subscribe(self.event(getattr(interface, event)),
+                               (chat_type,))
+        self.compile()
+
+    def event(self, method):
+        '''A subscription callback calling the interface event method.'''
+        def callback(handler, packet):
+            if packet.chat_type == packet.CHANNEL:
+                method(handler, packet.recipient, packet.text,
+                       self.channel_numbers[packet.channel_id])
+            else: method(handler, packet.recipient, packet.text)
+        return callback
+
+    def subscribe(self, callback, chat_types=None, channels=None, senders=None,
+                  prefix=None):
+        '''
+        Call callback(handler, packet) for the chats passing the filters,
+        see Subscription. Returns the subscription for unsubscribe.
+        '''
+        subscription = Subscription(callback, chat_types, channels, senders,
+                                    prefix)
+        self.subscriptions.append(subscription)
+        self.compile()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+        self.compile()
+
+    def compile(self):
+        # types without an event, like NPCINTERNAL, once subscribed by name
+        chat_types = set(self.EVENTS).union(*(
+            subscription.chat_types for subscription in self.subscriptions
+            if subscription.chat_types is not None))
+        self.routes = {chat_type: tuple(subscription for subscription in
+                                        self.subscriptions
+                                        if subscription.chat_types is None or
+                                        chat_type in subscription.chat_types)
+                       for chat_type in chat_types}
 
     def join_channel(self, name):
         self.interface.connection.push(netpacket.ChannelJoinPacket(name=name))
@@ -239,65 +360,19 @@ class Chat(BaseHandler):
         self.logger.info('Joined channel {}.'.format(packet.name))
 
     def handle_chat(self, packet):
-        if self.interface.actor_handler.get_my_name().startswith(packet.recipient):
-            self.logger.warn('Discarding chat {}'.format(packet))
+        # read field by field, chats nobody subscribed are dropped undecoded
+        subscriptions = self.routes.get(packet.chat_type)
+        if subscriptions is None:
+            self.logger.warning('Unknown chat: %s', packet)
+            return
+        if not subscriptions: return
+        actors = self.interface.actor_handler
+        my_name = None if actors is None else actors.my_name
+        if my_name and packet.recipient and my_name.startswith(packet.recipient):
+            self.logger.debug('Discarding chat by %s', packet.recipient)
             return  # chat by me - discard
-        self.logger.info(str(packet))
-        if packet.chat_type == packet.SYSTEM:
-            self.interface.on_chat_system(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.COMBAT:
-            self.interface.on_chat_combat(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.SAY:
-            self.interface.on_chat_say(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.TELL:
-            self.interface.on_chat_tell(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.GROUP:
-            self.interface.on_chat_group(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.GUILD:
-            self.interface.on_chat_guild(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.ALLIANCE:
-            self.interface.on_chat_alliance(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.AUCTION:
-            self.interface.on_chat_auction(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.SHOUT:
-            self.interface.on_chat_shout(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.CHANNEL:
-            self.interface.on_chat_channel(self, packet.recipient, packet.text,
-                                        self.channel_numbers[packet.channel_id])
-        elif packet.chat_type == packet.TELLSELF:
-            self.interface.on_chat_tellself(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.REPORT:
-            self.interface.on_chat_report(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.ADVISOR:
-            self.interface.on_chat_advisor(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.ADVICE:
-            self.interface.on_chat_advice(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.ADVICE_LIST:
-            self.interface.on_chat_advice_list(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.SERVER_TELL:
-            self.interface.on_chat_sever_tell(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.GM:
-            self.interface.on_chat_gm(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.SERVER_INFO:
-            self.interface.on_chat_server_info(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.NPC:
-            self.interface.on_chat_npc(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.SYSTEM_BASE:
-            self.interface.on_chat_system_base(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.PET_ACTION:
-            self.interface.on_chat_pet_action(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.NPC_ME:
-            self.interface.on_chat_npc_me(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.NPC_MY:
-            self.interface.on_chat_npc_my(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.NPC_NARRATE:
-            self.interface.on_chat_(npc_narrateself, packet.recipient, packet.text)
-        elif packet.chat_type == packet.AWAY:
-            self.interface.on_chat_away(self, packet.recipient, packet.text)
-        elif packet.chat_type == packet.END:
-            self.interface.on_chat_end(self, packet.recipient, packet.text)
-        else:
-            self.logger.warn('Unknown chat: ' + str(packet))
+        self.logger.info('%s', packet)
+        for subscription in subscriptions: subscription(self, packet)
 
 
 class Command(BaseHandler):
@@ -311,24 +386,43 @@ class Command(BaseHandler):
 
 
 class Actors(BaseHandler):
+    # (actors, records per actor) of an actortable.History, off by default
+    history = None
+
     def __init__(self, interface):
         super().__init__(interface)
         self.register(netpacket.PersistActorPacket, self.handle_actor)
-        self.register(netpacket.DeadReckoningPacket, self.handle_dr)
+        if drbatch is None:
+            self.register(netpacket.DeadReckoningPacket, self.handle_dr)
+        else:
+            self.register_batch(netpacket.DeadReckoningPacket,
+                                self.handle_dr_batch)
         self.register(netpacket.RemoveObjectPacket, self.handle_rmobj)
         self.register(netpacket.StatDRUpdatePacket, self.handle_statdr)
         self.interface.connection.push(netpacket.PersistActorRequestPacket())
-        self.actors = dict()
-        self.my_id = None
+        # entity id -> {'pos', 'drcounter', 'name', 'vel', ...}, the
+        # ActorTable answers radius, nearest and sector queries on top and
+        # predicts where the actors are by now
+        if actortable is None: self.actors = dict()
+        else:
+            history = None if self.history is None else \
+                actortable.History(*self.history)
+            self.actors = actortable.ActorTable(
+                timefunc=interface.sched.timefunc, history=history)
+        self.my_id = self.my_name = None
 
-    def get_my_name(self):
-        if not self.my_id is None:
-            return self.actors[self.my_id]['name']
+    def get_my_name(self): return self.my_name
 
     def handle_actor(self, packet):
-        if packet.counter == 0: self.my_id = packet.entity_id
+        if packet.counter == 0:
+            (self.my_id, self.my_name) = (packet.entity_id, packet.name)
         self.actors[packet.entity_id] = {'pos': packet.pos, 'drcounter':
-                                         packet.counter, 'name': packet.name}
+                                         packet.counter, 'name': packet.name,
+                                         'vel': packet.vel,
+                                         'world_vel': packet.world_vel,
+                                         'ang_vel': packet.ang_vel,
+                                         'y_rot': packet.y_rot,
+                                         'sector': packet.sector}
         self.interface.on_actor_new(self, packet.entity_id)
 
     def handle_dr(self, packet):
@@ -341,6 +435,12 @@ class Actors(BaseHandler):
             actor['drcounter'] = packet.counter
             self.interface.on_actor_moved(self, packet.entity_id)
 
+    def handle_dr_batch(self, payloads):
+        (moved, unknown) = self.actors.move(*drbatch.decode(payloads))
+        for entity_id in unknown:
+            self.logger.error('DR for unregistered Actor: {}'.format(entity_id))
+        for entity_id in moved: self.interface.on_actor_moved(self, entity_id)
+
     def handle_rmobj(self, packet):
         if packet.entity_id in self.actors:
             actor = self.actors.pop(packet.entity_id)
@@ -1,81 +1,255 @@
 import struct
+import collections
+
+from strohman.net.schema import (U8, U16, U32, F32, Vector, String,
+                                 SentinelString, Group, Repeat, When,
+                                 Bits, Equals, In, Remaining)
+from strohman.net import schema
 
 
 NET_VERSION = 185
+HEADER = struct.Struct('<LLLHB')
+TYPE = struct.Struct('<BH')
+FRAME = struct.Struct(HEADER.format + TYPE.format[1:])
+ACK = bytes(HEADER.size)  # header of an ack, the fields below filled in
+ACK_FIELDS = struct.Struct(HEADER.format[:4])  # id, offset, size
+BYTE = struct.Struct('<B')
+SHORT = struct.Struct('<H')
+LONG = struct.Struct('<L')
+FLOAT = struct.Struct('<f')
+VECTOR = struct.Struct('<fff')
+MULTI = 2  # priority of multi datagrams
+POOL_SIZE = 256
+pools = dict()  # packet class -> free list, see enable_pools()
 
 
 class Data:
-    def __init__(self, data=None):
-        if isinstance(data, bytes) and data:
-            self.data = data[:3]
-            self.get_type()
-            self.data = data
+    '''Read cursor over a received datagram or write buffer of a packet.
+
+    The buffer is never sliced while decoding, every get_* unpacks at the
+    current offset and only the produced field values are copied.
+    Outgoing data is appended to a reusable bytearray that keeps HEADROOM
+    free bytes in front, so frame() can pack_into the header and the
+    type/size prefix in place.
+    '''
+    HEADROOM = HEADER.size + TYPE.size
+
+    def __init__(self, data=None, start=0, end=None):
+        self.type = self.size = 0
+        if isinstance(data, (bytes, bytearray)) and len(data) > start:
+            self.buffer = data
+            self.start = self.pos = start
+            self.end = len(data) if end is None else end
+            self.writable = False
+            if self.end - start >= 3:
+                (self.type, self.size) = TYPE.unpack_from(data, start)
         else:
-            self.type = self.size = 0
-            self.data = b''
-        self.debug_copy = self.data
+            self.buffer = bytearray(self.HEADROOM)
+            self.start = self.pos = self.end = self.HEADROOM
+            self.writable = True
 
     def __str__(self): return str(self.data)
-    def __len__(self): return len(self.data) + 3
-    def __bool__(self): return bool(self.data)
-    def __add__(self, packet): return self.data + packet.data
-    def __iadd__(self, packet):
-        self.data += packet.data
-        return self
+    def __len__(self): return self.end - self.pos + 3
+    def __bool__(self): return self.end > self.pos
+
+    @property
+    def data(self): return bytes(self.view())
+
+    @property
+    def debug_copy(self): return bytes(self.buffer[self.start:self.end])
 
-    def _get(self, pattern):
-        size = struct.calcsize(pattern)
-        try: (data,) = struct.unpack(pattern, self.data[:size])
-        except struct.error:
+    def view(self):
+        '''Zero-copy view of the bytes not consumed yet.'''
+        return memoryview(self.buffer)[self.pos:self.end]
+
+    def _get(self, unpacker):
+        pos = self.pos
+        if pos + unpacker.size > self.end:
             raise RuntimeError('Unable to unpack {}.'.format(self.debug_copy))
-        else:
-            self.data = self.data[size:]
-            return data
+        self.pos = pos + unpacker.size
+        return unpacker.unpack_from(self.buffer, pos)
+
+    def _writer(self):
+        '''Move the unread bytes into a fresh write buffer.'''
+        payload = self.view()
+        self.buffer = bytearray(self.HEADROOM) + payload
+        payload.release()
+        self.start = self.pos = self.HEADROOM
+        self.end = len(self.buffer)
+        self.writable = True
+
+    def purge(self):
+        if self.writable: del self.buffer[self.HEADROOM:]
+        else: self.buffer = bytearray(self.HEADROOM)
+        self.start = self.pos = self.end = self.HEADROOM
+        self.writable = True
 
-    def purge(self): self.data = b''
     def get_type(self):
         self.type = self.get_8()
         self.size = self.get_16()
 
     def get_data(self):
-        size = len(self.data)
-        return struct.pack('<BH', self.type, size) + self.data
-
-    def put_32(self, data): self.data += struct.pack('<L', data)
-    def get_32(self): return self._get('<L')
-
-    def put_16(self, data): self.data += struct.pack('<H', data)
-    def get_16(self): return self._get('<H')
-
-    def put_8(self, data): self.data += struct.pack('<B', data)
-    def get_8(self): return self._get('<B')
-
-    def put_f(self, data): self.data += struct.pack('<f', float(data))
-    def get_f(self): return self._get('<f')
+        size = self.end - self.pos
+        return TYPE.pack(self.type, size) + self.view()
+
+    def frame(self, id, offset, size, priority):
+        '''Write header and type/size prefix in front of the payload.
+
+        Returns the complete datagram, the only copy made while packing.
+        '''
+        if not self.writable or self.pos != self.HEADROOM: self._writer()
+        FRAME.pack_into(self.buffer, 0, id, offset, size, size, priority,
+                        self.type, self.end - self.pos)
+        return bytes(self.buffer)
+
+    def put_32(self, data):
+        if not self.writable: self._writer()
+        self.buffer += LONG.pack(data)
+        self.end += 4
+    def get_32(self): return self._get(LONG)[0]
+
+    def put_16(self, data):
+        if not self.writable: self._writer()
+        self.buffer += SHORT.pack(data)
+        self.end += 2
+    def get_16(self): return self._get(SHORT)[0]
+
+    def put_8(self, data):
+        if not self.writable: self._writer()
+        self.buffer += BYTE.pack(data)
+        self.end += 1
+    def get_8(self): return self._get(BYTE)[0]
+
+    def put_f(self, data):
+        if not self.writable: self._writer()
+        self.buffer += FLOAT.pack(data)
+        self.end += 4
+    def get_f(self): return self._get(FLOAT)[0]
 
     def put_vector(self, data):
-        for fl in data: self.put_f(fl)
-    def get_vector(self): return (self.get_f(), self.get_f(), self.get_f())
+        if not self.writable: self._writer()
+        self.buffer += VECTOR.pack(*data)
+        self.end += 12
+    def get_vector(self): return self._get(VECTOR)
+
+    def put_string(self, string):
+        if not self.writable: self._writer()
+        self.buffer += string.encode('utf-8')
+        self.buffer.append(0)
+        self.end = len(self.buffer)
 
-    def put_string(self, string): self.data += string.encode('utf-8') + b'\x00'
     def get_string(self):
-        (string, self.data) = self.data.split(b'\x00', 1)
-        try: return string.decode('utf-8')
+        end = self.buffer.find(b'\x00', self.pos, self.end)
+        if end < 0:
+            raise RuntimeError('Unable to unpack {}.'.format(self.debug_copy))
+        (start, self.pos) = (self.pos, end + 1)
+        try: return str(self.buffer[start:end], 'utf-8')
         except UnicodeDecodeError: return 'UnicodeDecodeError'
 
 
-class BasePacket:
+class Header(collections.namedtuple('Header', 'id offset size size_minor '
+                                    'priority msg_type buffer start end')):
+    '''
+    Header of one packet inside a received datagram. The packet spans
+    buffer[start:end], nothing is copied or decoded beyond the header.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def unpack(cls, datagram, start=0, end=None):
+        if end is None: end = len(datagram)
+        payload = start + HEADER.size
+        return cls._make(HEADER.unpack_from(datagram, start) +
+                         (datagram[payload] if payload < end else 0,
+                          datagram, start, end))
+
+    @property
+    def is_part(self): return self.size != self.size_minor and self.size_minor != 0
+    @property
+    def is_multi(self): return self.priority > 1
+    @property
+    def needs_ack(self): return self.priority > 0
+    @property
+    def payload(self): return self.buffer[self.start + FRAME.size:self.end]
+
+    def ack_into(self, buffer):
+        '''Append the ack of this packet to buffer, a bytearray.'''
+        pos = len(buffer)
+        buffer += ACK
+        ACK_FIELDS.pack_into(buffer, pos, self.id, self.offset, self.size)
+
+
+def split(datagram):
+    '''
+    Walk a datagram and yield the Header of every packet in it, the ones
+    packed into a multi datagram one by one.
+    '''
+    header = Header.unpack(datagram)
+    if not header.is_multi:
+        yield header
+        return
+    (pos, end) = (HEADER.size, len(datagram))
+    while pos + HEADER.size <= end:
+        header = Header.unpack(datagram, pos, min(
+            end, pos + HEADER.size + SHORT.unpack_from(datagram, pos + 12)[0]))
+        yield header
+        pos = header.end
+
+
+def fragment(datagram, size):
+    '''
+    Cut a datagram into parts of at most size bytes. Each part carries the
+    id, message size and priority of the whole packet and the offset and
+    size of its piece, like the parts BasePacket.append puts together.
+    '''
+    (id, _, total, _, priority) = HEADER.unpack_from(datagram)
+    message = memoryview(datagram)[HEADER.size:]
+    step = size - HEADER.size
+    for offset in range(0, total, step):
+        piece = message[offset:offset + step]
+        yield HEADER.pack(id, offset, total, len(piece), priority) + piece
+
+
+def join(datagrams):
+    '''
+    Pack datagrams into one multi datagram, the inverse of split. Every
+    packet keeps its own header, the server acks them one by one.
+    '''
+    size = sum(map(len, datagrams))
+    return HEADER.pack(0, 0, size, size, MULTI) + b''.join(datagrams)
+
+
+class BasePacket(metaclass=schema.Slotted):
+    __slots__ = ('id', 'offset', 'priority', 'size', 'size_minor', 'msg_type',
+                 'is_part', 'is_multi', 'needs_ack', 'decoder', 'data')
+    fields = None
+    defaults = dict()  # field name -> (slot, default), set by schema.build
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'fields' in cls.__dict__: schema.build(cls)
+
     def __init__(self, packet=None, **kwargs):
         self.id = self.offset = self.priority = 0
         self.size = self.size_minor = self.msg_type = 0
-        self.is_part = False
+        self.is_part = self.is_multi = False
         self.needs_ack = False
+        self.decoder = None
 
         self._init()
-        self.__dict__.update(kwargs)
-        if isinstance(packet, bytes):
-            self.data = Data(packet[15:])
-            self.unpack_header(packet[:15])
+        for (name, value) in kwargs.items(): setattr(self, name, value)
+        if isinstance(packet, (bytes, bytearray)):
+            self.data = Data(packet, 15)
+            self.unpack_header(packet)
+        elif isinstance(packet, Header):
+            (self.id, self.offset, self.size, self.size_minor,
+             self.priority, self.msg_type) = packet[:6]
+            self.is_part = packet.is_part
+            self.is_multi = packet.is_multi
+            self.needs_ack = packet.needs_ack
+            self.data = Data(packet.buffer, packet.start + HEADER.size,
+                             packet.end)
+            if self.data and not self.is_part: self.data.get_type()
         elif isinstance(packet, BasePacket):
             self.id = packet.id
             self.offset = packet.offset
@@ -88,6 +262,30 @@ class BasePacket:
             self.data = packet.data
         else: self.data = Data()
 
+    def __getattr__(self, name):
+        if name in self.defaults: return schema.resolve(self, name)
+        raise AttributeError('{!r} object has no attribute {!r}'.format(
+            self.__class__.__name__, name))
+
+    @classmethod
+    def acquire(cls, packet=None, **kwargs):
+        '''Like cls(packet, **kwargs), but recycled if the class is pooled.'''
+        pool = pools.get(cls)
+        if not pool: return cls(packet, **kwargs)
+        self = pool.pop()
+        self.__init__(packet, **kwargs)
+        return self
+
+    def release(self):
+        '''Return a pooled packet, it must not be used afterwards.'''
+        pool = pools.get(self.__class__)
+        if pool is not None and len(pool) < POOL_SIZE:
+            for name in self.defaults:  # empty slots, so they resolve again
+                try: delattr(self, name)
+                except AttributeError: pass
+            self.decoder = self.data = None
+            pool.append(self)
+
     def __eq__(self, packet):
         return self.msg_type == packet.msg_type and \
             any((self.id == packet.id,
@@ -104,15 +302,6 @@ class BasePacket:
         if self.data.data != b'': string += ' --'
         return string
 
-    def append(self, packet):
-        if self.id == packet.id and self.size == packet.size:
-            self.data += packet.data
-            self.size_minor += packet.size_minor
-            if self.size == self.size_minor:  # lets consider this as completed
-                self.is_part = False
-                self.data.get_type()
-                return True
-
     def ack(self):
         if self.size == 0: self.pack()  # to obtain correct self.size
         ack = AckPacket()
@@ -127,16 +316,14 @@ class BasePacket:
         self.priority = 1 if self.needs_ack else self.priority
         self._pack()
         self.size = len(self.data)
-        data = struct.pack('<LLLHB', self.id, self.offset,
-                self.size, self.size, self.priority)
-        return data + self.data.get_data()
+        return self.data.frame(self.id, self.offset, self.size, self.priority)
 
     def unpack_header(self, data):
         (self.id,
          self.offset,
          self.size,
          self.size_minor,
-         self.priority) = struct.unpack('<LLLHB', data)
+         self.priority) = HEADER.unpack_from(data)
         self.msg_type = self.data.type
         self.is_part = self.size != self.size_minor \
                 and self.size_minor != 0
@@ -145,9 +332,14 @@ class BasePacket:
         if self.data and not self.is_part:
             self.data.get_type()  # if not ack/part
 
-    def unpack_body(self):
-        if len(self.data) == self.size:
-            self._unpack()
+    def unpack_body(self, lazy=False):
+        '''
+        Decode the body. With lazy the fields of schema packets are decoded
+        on first access, reading a leading field leaves the rest untouched.
+        '''
+        if len(self.data) == self.size and self.decoder is None:
+            if lazy and self.fields: self.decoder = self._unpack_lazy()
+            else: self._unpack()
 
     def _init(self): pass
     def _unpack(self): pass
@@ -156,24 +348,20 @@ class BasePacket:
 
 
 def MultiPacket(data):
-    data = data[15:]
-    while data:
-        (size,) = struct.unpack('<xxxxxxxxLxxx', data[:15])
-        packet = data[:15 + size]
-        data = data[15 + size:]
-        yield BasePacket(packet)
+    for header in split(data): yield BasePacket(header)
 
 #########################################
 
 
 def by_type(msg_type, packet):
-    try: return message_type[msg_type](packet)
-    except IndexError: raise IndexError('No such Packet {}'.format(msg_type))
+    return packet_class(msg_type).acquire(packet)
 
 #########################################
 
 
 class AckPacket(BasePacket):
+    __slots__ = ('packet_ack', 'sum')
+
     def _init(self):
         self.msg_type = 0
         self.packet_ack = self.sum = 0
@@ -184,17 +372,17 @@ class AckPacket(BasePacket):
     def pack(self):
         self.data.purge()
         self.is_part = self.needs_ack = False
-        data = struct.pack('<LLLHB', self.packet_ack, self.offset,
-                self.sum, 0, 0)
-        return data
+        return HEADER.pack(self.packet_ack, self.offset, self.sum, 0, 0)
 
-    def unpack_body(self):
+    def unpack_body(self, lazy=False):
         self.is_part = self.needs_ack = False
         self.packet_ack = self.id
         self.sum = self.size
 
 
 class PingPacket(BasePacket):
+    __slots__ = ('payload', 'flags')
+
     def _init(self):
         self.msg_type = 1
         self.payload = 0
@@ -215,6 +403,9 @@ class PingPacket(BasePacket):
 
 
 class AuthenticatePacket(BasePacket):
+    __slots__ = ('version', 'username', 'password', 'os', 'gfxcard',
+                 'gfxversion')
+
     def _init(self):
         self.id = 2
         self.msg_type = 2
@@ -236,6 +427,8 @@ class AuthenticatePacket(BasePacket):
 
 
 class PreauthenticatePacket(BasePacket):
+    __slots__ = ('version',)
+
     def _init(self):
         self.id = 1
         self.msg_type = 3
@@ -251,6 +444,8 @@ class PreauthenticatePacket(BasePacket):
 
 
 class PreAuthapprovedPacket(BasePacket):
+    __slots__ = ('clientnum',)
+
     def _init(self):
         self.msg_type = 4
         self.clientnum = None
@@ -263,6 +458,8 @@ class PreAuthapprovedPacket(BasePacket):
 
 
 class AuthapprovedPacket(BasePacket):
+    __slots__ = ('clienttoken', 'playerid', 'num_chars', 'chars')
+
     def _init(self):
         self.msg_type = 5
         self.clienttoken = self.playerid = self.num_chars = 0
@@ -286,6 +483,8 @@ class AuthapprovedPacket(BasePacket):
 
 
 class AuthrejectedPacket(BasePacket):
+    __slots__ = ('reason',)
+
     def _init(self):
         self.msg_type = 6
         self.reason = ''
@@ -298,6 +497,8 @@ class AuthrejectedPacket(BasePacket):
 
 
 class DisconnectPacket(BasePacket):
+    __slots__ = ('reason',)
+
     def _init(self):
         self.msg_type = 7
         self.reason = ''
@@ -344,14 +545,12 @@ class ChatPacket(BasePacket):
     AWAY = 25
     END = 26
 
+    fields = (U8('chat_type', SAY), String('recipient'), String('text'),
+              U8('translate'), U32('actor'),
+              When(Equals('chat_type', CHANNEL), U16('channel_id')))
+
     def _init(self):
         self.msg_type = 8
-        self.chat_type = 2
-        self.recipient = ''
-        self.text = ''
-        self.translate = 0
-        self.actor = 0
-        self.channel_id = 0
 
     def _str(self):
         if self.SYSTEM == self.chat_type: chat_type = 'System'
@@ -389,27 +588,10 @@ class ChatPacket(BasePacket):
         return text.format(chat_type, recipient_str, self.text,
             translated, self.actor, self.channel_id)
 
-    def _pack(self):
-        self.data.purge()
-        self.data.put_8(self.chat_type)
-        self.data.put_string(self.recipient)
-        self.data.put_string(self.text)
-        self.data.put_8(self.translate)
-        self.data.put_32(self.actor)
-        if self.chat_type == self.CHANNEL:
-            self.data.put_16(self.channel_id)
-
-    def _unpack(self):
-        self.chat_type = self.data.get_8()
-        self.recipient = self.data.get_string()
-        self.text = self.data.get_string()
-        self.translate = self.data.get_8()
-        self.actor = self.data.get_32()
-        if self.chat_type == self.CHANNEL:
-            self.channel_id = self.data.get_16()
-
 
 class ChannelJoinPacket(BasePacket):
+    __slots__ = ('name',)
+
     def _init(self):
         self.msg_type = 9
         self.name = ''
@@ -422,6 +604,8 @@ class ChannelJoinPacket(BasePacket):
 
 
 class ChannelJoinedPacket(BasePacket):
+    __slots__ = ('name', 'channel_id')
+
     def _init(self):
         self.msg_type = 10
         self.name = ''
@@ -436,6 +620,8 @@ class ChannelJoinedPacket(BasePacket):
 
 
 class ChannelLeavePacket(BasePacket):
+    __slots__ = ('channel_id',)
+
     def _init(self):
         self.msg_type = 11
         self.channel_id = 0
@@ -446,11 +632,9 @@ class ChannelLeavePacket(BasePacket):
     def _pack(self):
         self.data.put_16(self.channel_id)
 
-class GuildCmdPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 12
-
 class UserCmdPacket(BasePacket):
+    __slots__ = ('command',)
+
     def _init(self):
         self.msg_type = 13
         self.command = ''
@@ -467,6 +651,8 @@ class UserCmdPacket(BasePacket):
 
 
 class SystemPacket(BasePacket):
+    __slots__ = ('msg',)
+
     def _init(self):
         self.msg_type = 14
         self.msg = ''
@@ -479,109 +665,41 @@ class SystemPacket(BasePacket):
         self.msg = self.data.get_string()
 
 
-class CharRejectPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 15
-
 class DeadReckoningPacket(BasePacket):
+    fields = (U32('entity_id'), U8('counter'), U8('flags'),
+              When(Bits('flags', 1), U8('mode')),
+              When(Bits('flags', 2), F32('ang_vel')),
+              Vector('vel', flags=('flags', 4, 8, 16)),
+              Vector('world_vel', flags=('flags', 32, 64, 128)),
+              Vector('pos'), U8('y_rot'), SentinelString('sector'))
+
     def _init(self):
         self.msg_type = 16
-        self.entity_id = 0
-        self.counter = 0
-        self.flags = 0
-        self.mode = 0
-        self.ang_vel = 0
-        self.vel = (0, 0, 0)
-        self.world_vel = (0, 0, 0)
-        self.pos = (0, 0, 0)
-        self.y_rot = 0
-        self.sector = ''
 
     def _str(self):
         everything = (self.entity_id, self.counter, self.flags, self.mode, self.ang_vel,
                 self.vel, self.world_vel, self.pos, self.y_rot, self.sector)
         return ': {}'.format(everything)
 
-    def _unpack(self):
-        self.entity_id = self.data.get_32()
-        self.counter = self.data.get_8()
-
-        self.flags = self.data.get_8()
-        if self.flags & 1: self.mode = self.data.get_8()
-        if self.flags & 2: self.ang_vel = self.data.get_f()
-
-        if self.flags & 4: self.vel = (self.data.get_f(), 0, 0)
-        if self.flags & 8: self.vel = (0, self.data.get_f(), 0)
-        if self.flags & 16: self.vel = (0, 0, self.data.get_f())
-
-        if self.flags & 32: self.world_vel = (self.data.get_f(), 0, 0)
-        if self.flags & 64: self.world_vel = (0, self.data.get_f(), 0)
-        if self.flags & 128: self.world_vel = (0, 0, self.data.get_f())
-
-        self.pos = self.data.get_vector()
-        self.y_rot = self.data.get_8()
-
-        if self.data.get_32() == 4294967295: self.sector = self.data.get_string()
-        else: self.sector = ''
-
-    def _pack(self):
-        self.data.put_32(self.entity_id)
-        self.data.put_8(self.counter)
-
-        self.data.put_8(self.flags)
-        if self.flags & 1: self.data.put_8(self.mode)
-        if self.flags & 2: self.data.put_f(self.ang_vel)
-
-        if self.flags & 4: self.data.put_f(self.vel[0])
-        if self.flags & 8: self.data.put_f(self.vel[1])
-        if self.flags & 16: self.data.put_f(self.vel[2])
-
-        if self.flags & 32: self.data.put_f(self.world_vel[0])
-        if self.flags & 64: self.data.put_f(self.world_vel[1])
-        if self.flags & 128: self.data.put_f(self.world_vel[2])
-
-        self.data.put_vector(self.pos)
-        self.data.put_8(self.y_rot)
-
-        self.data.put_32(4294967295)
-        self.data.put_string(self.sector)
-
-
-class ForcePositionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 17
-
-class CelPersistPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 18
-
-class ConfirmquestionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 19
-
-class UserActionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 20
-
-class AdminCmdPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 21
-
-class GuiInteractPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 22
 
 class GuiInventoryPacket(BasePacket):
+    fields = (U8('command', 1),
+              When(In('command', (0, 3)),
+                   U32('itemcount'),
+                   When(Equals('command', 3), U32('total_emptied')),
+                   F32('weight'), U32('version'),
+                   Repeat('items', 'itemcount',
+                          String('name'), U32('mesh_name'), U32('mat_name'),
+                          U32('container'), U32('slot'), U32('stackcount'),
+                          F32('weight'), F32('size'), String('icon'),
+                          U8('purify_status')),
+                   When(Equals('command', 3),
+                        Repeat('emptied_items', 'total_emptied',
+                               U32('container'), U32('slot'))),
+                   String('money', lambda money: [int(i) for i in money.split(',')])))
+
     def _init(self):
         self.msg_type = 23
-        self.command = 1
-        self.itemcount = 0
-        self.weight = 0
-        self.version = 0
-        self.money = ''
-        self.items = list()
-        self.total_emptied = 0
-        self.emptied_items = list()
 
     def _str(self):
         if self.command == 1:
@@ -602,54 +720,9 @@ class GuiInventoryPacket(BasePacket):
         self.data.purge()
         self.data.put_8(self.command)  # request, should be 1
 
-    def _unpack(self):
-        self.command = self.data.get_8()
-        if self.command in (0, 3):
-            self.itemcount = self.data.get_32()
-            if self.command == 3:
-                self.total_emptied = self.data.get_32()
-            else:
-                self.total_emptied = 0
-            self.weight = self.data.get_f()
-            self.version = self.data.get_32()
-            self.items = list()
-            for i in range(self.itemcount):
-                self.items.append({
-                        'name': self.data.get_string(),
-                        'mesh_name': self.data.get_32(),
-                        'mat_name': self.data.get_32(),
-                        'container': self.data.get_32(),
-                        'slot': self.data.get_32(),
-                        'stackcount': self.data.get_32(),
-                        'weight': self.data.get_f(),
-                        'size': self.data.get_f(),
-                        'icon': self.data.get_string(),
-                        'purify_status': self.data.get_8()})
-            if self.command == 3:
-                self.emptied_items = list()
-                for i in range(self.total_emptied):
-                    self.emptied_items.append({
-                        'container': self.data.get_32(),
-                        'slot': self.data.get_32()})
-            self.money = [int(i) for i in self.data.get_string().split(',')]
-
-class ViewItemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 24
-
-class ViewContainerPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 25
-
-class ViewSketchPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 26
-
-class ViewActionLocationPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 27
-
 class ReadBookPacket(BasePacket):
+    __slots__ = ('title', 'text')
+
     def _init(self):
         self.msg_type = 28
         self.title = ''
@@ -663,25 +736,21 @@ class ReadBookPacket(BasePacket):
         self.text = self.data.get_string().replace('\r', '')
 
 
-class WriteBookPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 29
-
-class UpdateItemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 30
-
-class ModePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 31
-
 class WeatherPacket(BasePacket):
+    fields = (U8('weather_type'),
+              When(Equals('weather_type', 1),
+                   Group('date', U8('minute'), U8('hour'), U8('day'),
+                         U8('month'), U32('year')),
+                   otherwise=(
+                       String('sector'),
+                       When(Bits('weather_type', 8 | 4),  # some downfall
+                            Group('downfall', U32('drops'), U32('fade'))),
+                       When(Bits('weather_type', 16),  # fog
+                            Group('fog', U32('density'), U32('fade'),
+                                  Vector('rgb', 'L'))))))
+
     def _init(self):
         self.msg_type = 32
-        self.date = dict()
-        self.sector = ''
-        self.downfall = dict()
-        self.fog = dict()
 
     def _str(self):
         if self.date:
@@ -699,100 +768,11 @@ class WeatherPacket(BasePacket):
             else: string += ' no fog.'
         return string
 
-    def _unpack(self):
-        weather_type = self.data.get_8()
-        if weather_type == 1:
-            self.date = {
-                         'minute': self.data.get_8(),
-                         'hour': self.data.get_8(),
-                         'day': self.data.get_8(),
-                         'month': self.data.get_8(),
-                         'year': self.data.get_32(),
-                        }
-        else:
-            self.sector = self.data.get_string()
-            if (weather_type & 8) or (weather_type & 4):  # some downfall
-                self.downfall = {
-                                 'drops': self.data.get_32(),
-                                 'fade': self.data.get_32()
-                                }
-            if weather_type & 16:  # fog
-                self.fog = {
-                            'density': self.data.get_32(),
-                            'fade': self.data.get_32(),
-                            'rgb': (self.data.get_32(),
-                                    self.data.get_32(),
-                                    self.data.get_32()
-                                   )
-                           }
-
-
-class NewsectorPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 33
-
-class GuiGuildPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 34
-
-class EquipmentPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 35
-
-class GuiExchangePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 36
-
-class ExchangeRequestPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 37
-
-class ExchangeAddItemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 38
-
-class ExchangeRemoveItemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 39
-
-class ExchangeAcceptPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 40
-
-class ExchangeStatusPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 41
-
-class ExchangeEndPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 42
-
-class ExchangeAutogivePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 43
-
-class ExchangeMoneyPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 44
-
-class GuiMerchantPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 45
-
-class GuiStoragePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 46
-
-class GroupCmdPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 47
-
-class GuiGroupPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 48
-
 
 class StatDRUpdatePacket(BasePacket):
+    __slots__ = ('entity_id', 'hp', 'hp_rate', 'mana', 'mana_rate', 'pstam',
+                 'pstam_rate', 'mstam', 'mstam_rate', 'exp', 'prog', 'counter')
+
     def _init(self):
         self.msg_type = 49
         self.entity_id = 0
@@ -829,87 +809,9 @@ class StatDRUpdatePacket(BasePacket):
         self.counter = self.data.get_8()
 
 
-class SpellBookPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 50
-
-class GlyphRequestPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 51
-
-class GlyphAssemblePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 52
-
-class PurifyGlyphPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 53
-
-class SpellCastPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 54
-
-class SpellCancelPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 55
-
-class EffectPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 56
-
-class EffectStopPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 57
-
-class NpcAuthEntPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 58
-
-class NpcListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 59
-
-class GuitargetupdatePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 60
-
-class MapListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 61
-
-class NpCommandListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 62
-
-class NpcReadyPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 63
-
-class AllEntityPosPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 64
-
-class PersistAllEntitiesPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 65
-
-class NewNpcPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 66
-
-class PetitionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 67
-
-class MsgstringsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 68
-
-class CharacterDataPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 69
-
 class AuthCharacterPacket(BasePacket):
+    __slots__ = ('char_name',)
+
     def _init(self):
         self.id = 5
         self.msg_type = 70
@@ -923,56 +825,9 @@ class AuthCharacterPacket(BasePacket):
         self.data.put_string(self.char_name)
 
 
-class AuthCharacterApprovedPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 71
-
-
-class CharCreateCpPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 72
-
-class CombatEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 73
-
-class LootPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 74
-
-class LootitemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 75
-
-class LootRemovePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 76
-
-class GuiSkillPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 77
-
-class OverrideActionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 78
-
-class QuestListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 79
-
-class QuestinfoPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 80
-
-class GmGuiPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 81
-
-class WorkCmdPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 82
-
 class BuddyListPacket(BasePacket):
+    __slots__ = ('online', 'offline')
+
     def _init(self):
         self.msg_type = 83
         self.online = list()
@@ -993,6 +848,8 @@ class BuddyListPacket(BasePacket):
 
 
 class BuddyStatusPacket(BasePacket):
+    __slots__ = ('name', 'online')
+
     def _init(self):
         self.msg_type = 84
         self.name = ''
@@ -1008,6 +865,8 @@ class BuddyStatusPacket(BasePacket):
         self.online = self.data.get_8()
 
 class MotdPacket(BasePacket):
+    __slots__ = ('motd1', 'motd2', 'guild', 'guild_motd')
+
     def _init(self):
         self.msg_type = 85
         self.motd1 = self.motd2 = self.guild = self.guild_motd = ''
@@ -1033,15 +892,11 @@ class MotdrequestPacket(BasePacket):
     def _pack(self):
         self.data.purge()
 
-class QuestionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 87
-
-class QuestionResponsePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 88
-
 class SlotMovementPacket(BasePacket):
+    __slots__ = ('from_container', 'from_slot', 'to_container', 'to_slot',
+                 'stack_count', 'pos_world', 'rot_y', 'guarded', 'inplace',
+                 'rot_x', 'rot_z')
+
     def _init(self):
         self.msg_type = 89
 
@@ -1097,39 +952,9 @@ class SlotMovementPacket(BasePacket):
         self.data.put_f(self.rot_x)
         self.data.put_f(self.rot_z)
 
-class QuestionCancelPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 90
-
-class GuildmotdSetPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 91
-
-class PlaysoundPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 92
-
-class CharacterDetailsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 93
-
-class CharDetailsRequestPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 94
-
-class CharDescUpdatePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 95
-
-class FactionInfoPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 96
-
-class QuestRewardPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 97
-
 class NameChangePacket(BasePacket):
+    __slots__ = ('entity_id', 'name')
+
     def _init(self):
         self.msg_type = 98
         self.entity_id = 0
@@ -1143,43 +968,9 @@ class NameChangePacket(BasePacket):
         self.name = self.data.get_string()
 
 
-class GuildChangePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 99
-
-class LockPickPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 100
-
-class GmSpawnItemsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 101
-
-class GmSpawnTypesPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 102
-
-class GmSpawnItemPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 103
-
-class AdvicePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 104
-
-class ActiveMagicPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 105
-
-class GroupChangePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 106
-
-class MapActionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 107
-
 class ClientStatusPacket(BasePacket):
+    __slots__ = ('ready',)
+
     def _init(self):
         self.msg_type = 108
         self.ready = 1
@@ -1191,18 +982,6 @@ class ClientStatusPacket(BasePacket):
         self.data.purge()
         self.data.put_8(self.ready)
 
-class TutorialPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 109
-
-class BankingPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 110
-
-class CmdDropPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 111
-
 class RequestMovementsPacket(BasePacket):
     def _init(self):
         self.msg_type = 112
@@ -1212,6 +991,8 @@ class RequestMovementsPacket(BasePacket):
 
 
 class MoveinfoPacket(BasePacket):
+    __slots__ = ('modes', 'moves', 'modes_list', 'moves_list')
+
     def _init(self):
         self.msg_type = 113
         self.modes = self.moves = 0
@@ -1243,42 +1024,6 @@ class MoveinfoPacket(BasePacket):
                 'base_rotate': self.data.get_vector()})
 
 
-class MovemodPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 114
-
-class MovelockPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 115
-
-class CharDeletePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 116
-
-class CharCreateParentsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 117
-
-class CharCreateChildhoodPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 118
-
-class CharCreateLifeEventsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 119
-
-class CharCreateUploadPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 120
-
-class CharCreateVerifyPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 121
-
-class CharCreateNamePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 122
-
 class PersistWorldRequestPacket(BasePacket):
     def _init(self):
         self.msg_type = 123
@@ -1288,6 +1033,8 @@ class PersistWorldRequestPacket(BasePacket):
 
 
 class PersistWorldPacket(BasePacket):
+    __slots__ = ('pos', 'sector')
+
     def _init(self):
         self.msg_type = 124
         self.pos = (0, 0, 0)
@@ -1312,54 +1059,24 @@ class PersistActorRequestPacket(BasePacket):
 
 
 class PersistActorPacket(BasePacket):
+    fields = DeadReckoningPacket.fields + (
+        U32('type'), U32('masquerade_type'), U8('control'),
+        String('name'), String('guild'),
+        U32('factname'), U32('matname'), U32('race'),
+        U32('mount_factname'), U32('mounter_anim'),
+        U16('gender'), String('helm_group'), String('bracer_group'),
+        String('belt_group'), String('cloak_group'),
+        Vector('top'), Vector('bottom'), Vector('offset_2'),
+        String('tex_parts'), String('equipment'),
+        When(Remaining(29),  # left out by older servers
+             U8('server_mode'), U32('player_id'), U32('group_id'),
+             U32('owner_id'), U32('instance'),
+             F32('scale'), F32('mount_scale'),
+             U32('actor_flags')))
+
     def _init(self):
         self.msg_type = 126
 
-        self.entity_id = 0
-        self.counter = 0
-        self.mode = 0
-        self.ang_vel = 0
-        self.vel = (0, 0, 0)
-        self.world_vel = (0, 0, 0)
-        self.pos = (0, 0, 0)
-        self.y_rot = 0
-        self.sector = ''
-
-        self.type = 0
-        self.masquerade_type = 0
-        self.control = 0
-        self.name = ''
-        self.guild = ''
-
-        self.factname = 0
-        self.matname = 0
-        self.race = 0
-        self.mount_factname = 0
-        self.mounter_anim = 0
-
-        self.gender = 0
-        self.helm_group = ''
-        self.bracer_group = ''
-        self.belt_group = ''
-        self.cloak_group = ''
-
-        self.top = (0, 0, 0)
-        self.bottom = (0, 0, 0)
-        self.offset_2 = (0, 0, 0)
-
-        self.tex_parts = ''
-        self.equipment = ''
-
-        self.server_mode = 0
-        self.player_id = 0
-        self.group_id = 0
-        self.owner_id = 0
-        self.instance = 0
-
-        self.scale = 0
-        self.mount_scale = 0
-        self.flags = 0
-
     def _str(self):
         everything = (self.entity_id, self.counter, self.pos, self.type,
             self.masquerade_type, self.control, self.name, self.guild,
@@ -1368,69 +1085,14 @@ class PersistActorPacket(BasePacket):
             self.bracer_group, self.belt_group, self.cloak_group, self.top,
             self.bottom, self.offset_2, self.tex_parts, self.equipment,
             self.server_mode, self.player_id, self.group_id, self.owner_id,
-            self.instance, self.scale, self.mount_scale, self.flags)
+            self.instance, self.scale, self.mount_scale, self.actor_flags)
         return ': {}'.format(everything)
 
-    def _unpack(self):
-        self.entity_id = self.data.get_32()
-        self.counter = self.data.get_8()
-
-        self.flags = self.data.get_8()
-        if self.flags & 1: self.mode = self.data.get_8()
-        if self.flags & 2: self.ang_vel = self.data.get_f()
-
-        if self.flags & 4: self.vel = (self.data.get_f(), 0, 0)
-        if self.flags & 8: self.vel = (0, self.data.get_f(), 0)
-        if self.flags & 16: self.vel = (0, 0, self.data.get_f())
-
-        if self.flags & 32: self.world_vel = (self.data.get_f(), 0, 0)
-        if self.flags & 64: self.world_vel = (0, self.data.get_f(), 0)
-        if self.flags & 128: self.world_vel = (0, 0, self.data.get_f())
-
-        self.pos = self.data.get_vector()
-        self.y_rot = self.data.get_8()
-
-        if self.data.get_32() == 4294967295: self.sector = self.data.get_string()
-        else: self.sector = ''
-
-        self.type = self.data.get_32()
-        self.masquerade_type = self.data.get_32()
-        self.control = self.data.get_8()
-        self.name = self.data.get_string()
-        self.guild = self.data.get_string()
-
-        self.factname = self.data.get_32()
-        self.matname = self.data.get_32()
-        self.race = self.data.get_32()
-        self.mount_factname = self.data.get_32()
-        self.mounter_anim = self.data.get_32()
-
-        self.gender = self.data.get_16()
-        self.helm_group = self.data.get_string()
-        self.bracer_group = self.data.get_string()
-        self.belt_group = self.data.get_string()
-        self.cloak_group = self.data.get_string()
-
-        self.top = self.data.get_vector()
-        self.bottom = self.data.get_vector()
-        self.offset_2 = self.data.get_vector()
-
-        self.tex_parts = self.data.get_string()
-        self.equipment = self.data.get_string()
-
-        self.server_mode = self.data.get_8()
-        self.player_id = self.data.get_32()
-        self.group_id = self.data.get_32()
-        self.owner_id = self.data.get_32()
-        self.instance = self.data.get_32()
-
-        self.scale = self.data.get_f()
-        self.mount_scale = self.data.get_f()
-
-        self.flags = self.data.get_32()
-
 
 class PersistItemPacket(BasePacket):
+    __slots__ = ('eid', 'type', 'name', 'facname', 'matname', 'sector', 'pos',
+                 'rot_x', 'rot_y', 'rot_z', 'flags')
+
     def _init(self):
         self.msg_type = 127
 
@@ -1477,6 +1139,8 @@ class PersistItemPacket(BasePacket):
             self.flags = self.data.get_32()
 
 class PersistActionLocationPacket(BasePacket):
+    __slots__ = ('obj_eid', 'obj_type', 'obj_name', 'obj_sector', 'obj_mesh')
+
     def _init(self):
         self.msg_type = 128
 
@@ -1498,11 +1162,9 @@ class PersistActionLocationPacket(BasePacket):
         self.obj_mesh = self.data.get_string()
 
 
-class PersistAllPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 129
-
 class RemoveObjectPacket(BasePacket):
+    __slots__ = ('entity_id',)
+
     def _init(self):
         self.msg_type = 130
         self.entity_id = 0
@@ -1514,79 +1176,9 @@ class RemoveObjectPacket(BasePacket):
         self.entity_id = self.data.get_32()
 
 
-class ChangeTraitPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 131
-
-class DamageEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 132
-
-class DeathEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 133
-
-class TargetEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 134
-
-class ZPointEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 135
-
-class BuyEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 136
-
-class SellEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 137
-
-class PickupEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 138
-
-class DropEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 139
-
-class LootEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 140
-
-class ConnectEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 141
-
-class MovementEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 142
-
-class GenericEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 143
-
-class SoundEventPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 144
-
-class CharCreateTraitsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 145
-
-class StatsPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 146
-
-class PetCommandPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 147
-
-class PetSkillPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 148
-
 class CraftInfoPacket(BasePacket):
+    __slots__ = ('text',)
+
     def _init(self):
         self.msg_type = 149
         self.text = ''
@@ -1594,10 +1186,6 @@ class CraftInfoPacket(BasePacket):
     def _str(self): return ' ' + self.text
     def _unpack(self): self.text = self.data.get_string()
 
-class PetitionRequestPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 150
-
 class HeartbeatPacket(BasePacket):
     def _init(self):
         self.msg_type = 151
@@ -1607,253 +1195,238 @@ class HeartbeatPacket(BasePacket):
     def _pack(self): self.data.purge()
 
 
-class NpcCommandPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 152
-
-class MinigameStartStopPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 153
-
-class MinigameBoardPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 154
-
-class MinigameUpdatePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 155
-
-class EntrancePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 156
-
-class GmEventListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 157
-
-class GmEventInfoPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 158
-
-class SequencePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 159
-
-class NpcRaceListPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 160
-
-class IntroductionPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 161
-
-class CachefilePacket(BasePacket):
-    def _init(self):
-        self.msg_type = 162
-
-class DialogMenuPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 163
-
-class SimpleStringPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 164
-
-class OrderEdTestPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 165
-
-class GenericCmdPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 166
-
-class CraftCancelPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 167
-
-class MusicalSheetPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 168
-
-class PlaySongPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 169
-
-class StopSongPacket(BasePacket):
-    def _init(self):
-        self.msg_type = 170
-
-
-message_type = [
-    AckPacket,                      # 0
-    PingPacket,                     # 1
-    AuthenticatePacket,             # 2
-    PreauthenticatePacket,          # 3
-    PreAuthapprovedPacket,          # 4
-    AuthapprovedPacket,             # 5
-    AuthrejectedPacket,             # 6 not used
-    DisconnectPacket,               # 7
-    ChatPacket,                     # 8
-    ChannelJoinPacket,              # 9
-    ChannelJoinedPacket,            # 10
-    ChannelLeavePacket,             # 11
-    GuildCmdPacket,                 # 12
-    UserCmdPacket,                  # 13
-    SystemPacket,                   # 14
-    CharRejectPacket,               # 15
-    DeadReckoningPacket,            # 16
-    ForcePositionPacket,            # 17
-    CelPersistPacket,               # 18
-    ConfirmquestionPacket,          # 19
-    UserActionPacket,               # 20
-    AdminCmdPacket,                 # 21
-    GuiInteractPacket,              # 22
-    GuiInventoryPacket,             # 23
-    ViewItemPacket,                 # 24
-    ViewContainerPacket,            # 25
-    ViewSketchPacket,               # 26
-    ViewActionLocationPacket,       # 27
-    ReadBookPacket,                 # 28
-    WriteBookPacket,                # 29
-    UpdateItemPacket,               # 30
-    ModePacket,                     # 31
-    WeatherPacket,                  # 32 partly
-    NewsectorPacket,                # 33
-    GuiGuildPacket,                 # 34
-    EquipmentPacket,                # 35
-    GuiExchangePacket,              # 36
-    ExchangeRequestPacket,          # 37
-    ExchangeAddItemPacket,          # 38
-    ExchangeRemoveItemPacket,       # 39
-    ExchangeAcceptPacket,           # 40
-    ExchangeStatusPacket,           # 41
-    ExchangeEndPacket,              # 42
-    ExchangeAutogivePacket,         # 43
-    ExchangeMoneyPacket,            # 44
-    GuiMerchantPacket,              # 45
-    GuiStoragePacket,               # 46
-    GroupCmdPacket,                 # 47
-    GuiGroupPacket,                 # 48
-    StatDRUpdatePacket,             # 49
-    SpellBookPacket,                # 50
-    GlyphRequestPacket,             # 51
-    GlyphAssemblePacket,            # 52
-    PurifyGlyphPacket,              # 53
-    SpellCastPacket,                # 54
-    SpellCancelPacket,              # 55
-    EffectPacket,                   # 56
-    EffectStopPacket,               # 57
-    NpcAuthEntPacket,               # 58
-    NpcListPacket,                  # 59
-    GuitargetupdatePacket,          # 60
-    MapListPacket,                  # 61
-    NpCommandListPacket,            # 62
-    NpcReadyPacket,                 # 63
-    AllEntityPosPacket,             # 64
-    PersistAllEntitiesPacket,       # 65
-    NewNpcPacket,                   # 66
-    PetitionPacket,                 # 67
-    MsgstringsPacket,               # 68
-    CharacterDataPacket,            # 69
-    AuthCharacterPacket,            # 70
-    AuthCharacterApprovedPacket,    # 71
-    CharCreateCpPacket,             # 72
-    CombatEventPacket,              # 73
-    LootPacket,                     # 74
-    LootitemPacket,                 # 75
-    LootRemovePacket,               # 76
-    GuiSkillPacket,                 # 77
-    OverrideActionPacket,           # 78
-    QuestListPacket,                # 79
-    QuestinfoPacket,                # 80
-    GmGuiPacket,                    # 81
-    WorkCmdPacket,                  # 82
-    BuddyListPacket,                # 83
-    BuddyStatusPacket,              # 84
-    MotdPacket,                     # 85
-    MotdrequestPacket,              # 86
-    QuestionPacket,                 # 87
-    QuestionResponsePacket,         # 88
-    SlotMovementPacket,             # 89
-    QuestionCancelPacket,           # 90
-    GuildmotdSetPacket,             # 91
-    PlaysoundPacket,                # 92
-    CharacterDetailsPacket,         # 93
-    CharDetailsRequestPacket,       # 94
-    CharDescUpdatePacket,           # 95
-    FactionInfoPacket,              # 96
-    QuestRewardPacket,              # 97
-    NameChangePacket,               # 98
-    GuildChangePacket,              # 99
-    LockPickPacket,                 # 100
-    GmSpawnItemsPacket,             # 101
-    GmSpawnTypesPacket,             # 102
-    GmSpawnItemPacket,              # 103
-    AdvicePacket,                   # 104
-    ActiveMagicPacket,              # 105
-    GroupChangePacket,              # 106
-    MapActionPacket,                # 107
-    ClientStatusPacket,             # 108
-    TutorialPacket,                 # 109
-    BankingPacket,                  # 110
-    CmdDropPacket,                  # 111
-    RequestMovementsPacket,         # 112
-    MoveinfoPacket,                 # 113
-    MovemodPacket,                  # 114
-    MovelockPacket,                 # 115
-    CharDeletePacket,               # 116
-    CharCreateParentsPacket,        # 117
-    CharCreateChildhoodPacket,      # 118
-    CharCreateLifeEventsPacket,     # 119
-    CharCreateUploadPacket,         # 120
-    CharCreateVerifyPacket,         # 121
-    CharCreateNamePacket,           # 122
-    PersistWorldRequestPacket,      # 123
-    PersistWorldPacket,             # 124
-    PersistActorRequestPacket,      # 125
-    PersistActorPacket,             # 126 partly
-    PersistItemPacket,              # 127
-    PersistActionLocationPacket,    # 128
-    PersistAllPacket,               # 129
-    RemoveObjectPacket,             # 130
-    ChangeTraitPacket,              # 131
-    DamageEventPacket,              # 132
-    DeathEventPacket,               # 133
-    TargetEventPacket,              # 134
-    ZPointEventPacket,              # 135
-    BuyEventPacket,                 # 136
-    SellEventPacket,                # 137
-    PickupEventPacket,              # 138
-    DropEventPacket,                # 139
-    LootEventPacket,                # 140
-    ConnectEventPacket,             # 141
-    MovementEventPacket,            # 142
-    GenericEventPacket,             # 143
-    SoundEventPacket,               # 144
-    CharCreateTraitsPacket,         # 145
-    StatsPacket,                    # 146
-    PetCommandPacket,               # 147
-    PetSkillPacket,                 # 148
-    CraftInfoPacket,                # 149
-    PetitionRequestPacket,          # 150
-    HeartbeatPacket,                # 151
-    NpcCommandPacket,               # 152
-    MinigameStartStopPacket,        # 153
-    MinigameBoardPacket,            # 154
-    MinigameUpdatePacket,           # 155
-    EntrancePacket,                 # 156
-    GmEventListPacket,              # 157
-    GmEventInfoPacket,              # 158
-    SequencePacket,                 # 159
-    NpcRaceListPacket,              # 160
-    IntroductionPacket,             # 161
-    CachefilePacket,                # 162
-    DialogMenuPacket,               # 163
-    SimpleStringPacket,             # 164
-    OrderEdTestPacket,              # 165
-    GenericCmdPacket,               # 166
-    CraftCancelPacket,              # 167
-    MusicalSheetPacket,             # 168
-    PlaySongPacket,                 # 169
-    StopSongPacket,                 # 170
-]
+class RawPacket(BasePacket):
+    '''Stands in for message types this module does not know.'''
+    def _str(self): return ' type {}: {}'.format(self.msg_type, self.data.data)
+
+
+TYPES = (  # class names by msg_type
+    'AckPacket',                      # 0
+    'PingPacket',                     # 1
+    'AuthenticatePacket',             # 2
+    'PreauthenticatePacket',          # 3
+    'PreAuthapprovedPacket',          # 4
+    'AuthapprovedPacket',             # 5
+    'AuthrejectedPacket',             # 6
+    'DisconnectPacket',               # 7
+    'ChatPacket',                     # 8
+    'ChannelJoinPacket',              # 9
+    'ChannelJoinedPacket',            # 10
+    'ChannelLeavePacket',             # 11
+    'GuildCmdPacket',                 # 12
+    'UserCmdPacket',                  # 13
+    'SystemPacket',                   # 14
+    'CharRejectPacket',               # 15
+    'DeadReckoningPacket',            # 16
+    'ForcePositionPacket',            # 17
+    'CelPersistPacket',               # 18
+    'ConfirmquestionPacket',          # 19
+    'UserActionPacket',               # 20
+    'AdminCmdPacket',                 # 21
+    'GuiInteractPacket',              # 22
+    'GuiInventoryPacket',             # 23
+    'ViewItemPacket',                 # 24
+    'ViewContainerPacket',            # 25
+    'ViewSketchPacket',               # 26
+    'ViewActionLocationPacket',       # 27
+    'ReadBookPacket',                 # 28
+    'WriteBookPacket',                # 29
+    'UpdateItemPacket',               # 30
+    'ModePacket',                     # 31
+    'WeatherPacket',                  # 32
+    'NewsectorPacket',                # 33
+    'GuiGuildPacket',                 # 34
+    'EquipmentPacket',                # 35
+    'GuiExchangePacket',              # 36
+    'ExchangeRequestPacket',          # 37
+    'ExchangeAddItemPacket',          # 38
+    'ExchangeRemoveItemPacket',       # 39
+    'ExchangeAcceptPacket',           # 40
+    'ExchangeStatusPacket',           # 41
+    'ExchangeEndPacket',              # 42
+    'ExchangeAutogivePacket',         # 43
+    'ExchangeMoneyPacket',            # 44
+    'GuiMerchantPacket',              # 45
+    'GuiStoragePacket',               # 46
+    'GroupCmdPacket',                 # 47
+    'GuiGroupPacket',                 # 48
+    'StatDRUpdatePacket',             # 49
+    'SpellBookPacket',                # 50
+    'GlyphRequestPacket',             # 51
+    'GlyphAssemblePacket',            # 52
+    'PurifyGlyphPacket',              # 53
+    'SpellCastPacket',                # 54
+    'SpellCancelPacket',              # 55
+    'EffectPacket',                   # 56
+    'EffectStopPacket',               # 57
+    'NpcAuthEntPacket',               # 58
+    'NpcListPacket',                  # 59
+    'GuitargetupdatePacket',          # 60
+    'MapListPacket',                  # 61
+    'NpCommandListPacket',            # 62
+    'NpcReadyPacket',                 # 63
+    'AllEntityPosPacket',             # 64
+    'PersistAllEntitiesPacket',       # 65
+    'NewNpcPacket',                   # 66
+    'PetitionPacket',                 # 67
+    'MsgstringsPacket',               # 68
+    'CharacterDataPacket',            # 69
+    'AuthCharacterPacket',            # 70
+    'AuthCharacterApprovedPacket',    # 71
+    'CharCreateCpPacket',             # 72
+    'CombatEventPacket',              # 73
+    'LootPacket',                     # 74
+    'LootitemPacket',                 # 75
+    'LootRemovePacket',               # 76
+    'GuiSkillPacket',                 # 77
+    'OverrideActionPacket',           # 78
+    'QuestListPacket',                # 79
+    'QuestinfoPacket',                # 80
+    'GmGuiPacket',                    # 81
+    'WorkCmdPacket',                  # 82
+    'BuddyListPacket',                # 83
+    'BuddyStatusPacket',              # 84
+    'MotdPacket',                     # 85
+    'MotdrequestPacket',              # 86
+    'QuestionPacket',                 # 87
+    'QuestionResponsePacket',         # 88
+    'SlotMovementPacket',             # 89
+    'QuestionCancelPacket',           # 90
+    'GuildmotdSetPacket',             # 91
+    'PlaysoundPacket',                # 92
+    'CharacterDetailsPacket',         # 93
+    'CharDetailsRequestPacket',       # 94
+    'CharDescUpdatePacket',           # 95
+    'FactionInfoPacket',              # 96
+    'QuestRewardPacket',              # 97
+    'NameChangePacket',               # 98
+    'GuildChangePacket',              # 99
+    'LockPickPacket',                 # 100
+    'GmSpawnItemsPacket',             # 101
+    'GmSpawnTypesPacket',             # 102
+    'GmSpawnItemPacket',              # 103
+    'AdvicePacket',                   # 104
+    'ActiveMagicPacket',              # 105
+    'GroupChangePacket',              # 106
+    'MapActionPacket',                # 107
+    'ClientStatusPacket',             # 108
+    'TutorialPacket',                 # 109
+    'BankingPacket',                  # 110
+    'CmdDropPacket',                  # 111
+    'RequestMovementsPacket',         # 112
+    'MoveinfoPacket',                 # 113
+    'MovemodPacket',                  # 114
+    'MovelockPacket',                 # 115
+    'CharDeletePacket',               # 116
+    'CharCreateParentsPacket',        # 117
+    'CharCreateChildhoodPacket',      # 118
+    'CharCreateLifeEventsPacket',     # 119
+    'CharCreateUploadPacket',         # 120
+    'CharCreateVerifyPacket',         # 121
+    'CharCreateNamePacket',           # 122
+    'PersistWorldRequestPacket',      # 123
+    'PersistWorldPacket',             # 124
+    'PersistActorRequestPacket',      # 125
+    'PersistActorPacket',             # 126
+    'PersistItemPacket',              # 127
+    'PersistActionLocationPacket',    # 128
+    'PersistAllPacket',               # 129
+    'RemoveObjectPacket',             # 130
+    'ChangeTraitPacket',              # 131
+    'DamageEventPacket',              # 132
+    'DeathEventPacket',               # 133
+    'TargetEventPacket',              # 134
+    'ZPointEventPacket',              # 135
+    'BuyEventPacket',                 # 136
+    'SellEventPacket',                # 137
+    'PickupEventPacket',              # 138
+    'DropEventPacket',                # 139
+    'LootEventPacket',                # 140
+    'ConnectEventPacket',             # 141
+    'MovementEventPacket',            # 142
+    'GenericEventPacket',             # 143
+    'SoundEventPacket',               # 144
+    'CharCreateTraitsPacket',         # 145
+    'StatsPacket',                    # 146
+    'PetCommandPacket',               # 147
+    'PetSkillPacket',                 # 148
+    'CraftInfoPacket',                # 149
+    'PetitionRequestPacket',          # 150
+    'HeartbeatPacket',                # 151
+    'NpcCommandPacket',               # 152
+    'MinigameStartStopPacket',        # 153
+    'MinigameBoardPacket',            # 154
+    'MinigameUpdatePacket',           # 155
+    'EntrancePacket',                 # 156
+    'GmEventListPacket',              # 157
+    'GmEventInfoPacket',              # 158
+    'SequencePacket',                 # 159
+    'NpcRaceListPacket',              # 160
+    'IntroductionPacket',             # 161
+    'CachefilePacket',                # 162
+    'DialogMenuPacket',               # 163
+    'SimpleStringPacket',             # 164
+    'OrderEdTestPacket',              # 165
+    'GenericCmdPacket',               # 166
+    'CraftCancelPacket',              # 167
+    'MusicalSheetPacket',             # 168
+    'PlaySongPacket',                 # 169
+    'StopSongPacket',                 # 170
+)
+_classes = dict()  # msg_type -> class, filled on first use
+_types = dict()  # class -> msg_type
+
+
+def packet_class(msg_type):
+    '''The class of msg_type, RawPacket for unknown ones.'''
+    try: return _classes[msg_type]
+    except KeyError: pass
+    if 0 <= msg_type < len(TYPES): cls = _resolve(TYPES[msg_type])
+    else: cls = RawPacket
+    _classes[msg_type] = cls
+    return cls
+
+
+def type_of(cls):
+    '''The msg_type of a packet class.'''
+    try: return _types[cls]
+    except KeyError: pass
+    try: msg_type = TYPES.index(cls.__name__)
+    except ValueError: raise ValueError('No such Packet {}'.format(cls))
+    if packet_class(msg_type) is not cls:
+        raise ValueError('No such Packet {}'.format(cls))
+    _types[cls] = msg_type
+    return msg_type
+
+
+def _resolve(name):
+    '''
+    The packet class called name. Types without a body of their own only
+    set msg_type, their classes are created on first use.
+    '''
+    namespace = globals()
+    if name not in namespace:
+        msg_type = TYPES.index(name)
+        def _init(self): self.msg_type = msg_type
+        namespace[name] = type(BasePacket)(name, (BasePacket,), {
+            '__module__': __name__, '__qualname__': name, '_init': _init})
+    return namespace[name]
+
+
+def __getattr__(name):
+    if name in TYPES: return _resolve(name)
+    if name == 'message_type': return [_resolve(each) for each in TYPES]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,
+                                                                    name))
+
+
+def enable_pools(*classes):
+    '''
+    Recycle instances of the given packet classes, by default of the ones
+    received or sent most often. Only enable this if no handler keeps a
+    reference to the packets, they are reused once handled.
+    '''
+    for cls in classes or map(_resolve, ('AckPacket', 'HeartbeatPacket',
+                                         'DeadReckoningPacket',
+                                         'StatDRUpdatePacket')):
+        pools.setdefault(cls, list())
@@ -0,0 +1,118 @@
+'''Reassembly of packets the server sent in parts.
+
+Every part carries the id and size of the whole message and the offset of
+its piece. The message is put together in a buffer of the announced size,
+pieces are written at their offset in whatever order they arrive and the
+ranges covered so far are kept as a sorted list of intervals.
+'''
+import bisect
+import logging
+import collections
+import time
+
+from strohman.net import netpacket
+
+
+LOGGER = logging.getLogger(__name__)
+MAX_AGE = 30  # seconds an incomplete message is kept
+MAX_BYTES = 1 << 20  # bytes of all incomplete messages together
+
+
+class Message:
+    __slots__ = ('buffer', 'covered', 'missing', 'started')
+
+    def __init__(self, header, started):
+        self.buffer = bytearray(netpacket.HEADER.size + header.size)
+        netpacket.HEADER.pack_into(self.buffer, 0, header.id, 0, header.size,
+                                   header.size, header.priority)
+        self.covered = list()  # [start, end, start, end, ...], disjoint
+        self.missing = header.size
+        self.started = started
+
+    def __len__(self): return len(self.buffer)
+
+    def add(self, start, end):
+        '''Mark start:end as received, returns the number of new bytes.'''
+        covered = self.covered
+        left = bisect.bisect_left(covered, start)
+        right = bisect.bisect_right(covered, end)
+        # interval bounds sit at even indices, an odd index is inside one
+        new_start = covered[left - 1] if left % 2 else start
+        new_end = covered[right] if right % 2 else end
+        old = sum(covered[i + 1] - covered[i] for i in
+                  range(left - left % 2, right + right % 2, 2))
+        covered[left - left % 2:right + right % 2] = (new_start, new_end)
+        new = new_end - new_start - old
+        self.missing -= new
+        return new
+
+
+class Reassembler:
+    '''
+    Incomplete messages by id, oldest first. Messages older than max_age
+    seconds are evicted, as are the oldest ones while all together take
+    more than max_bytes.
+    '''
+    def __init__(self, max_age=MAX_AGE, max_bytes=MAX_BYTES,
+                 timefunc=time.monotonic):
+        self.logger = LOGGER.getChild(self.__class__.__name__)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.timefunc = timefunc
+        self.messages = collections.OrderedDict()
+        self.bytes = 0
+        self.stats = collections.Counter()
+
+    def __len__(self): return len(self.messages)
+    def __contains__(self, id): return id in self.messages
+
+    def add(self, header):
+        '''
+        Store the part described by header. Returns the Header of the whole
+        message once the last piece is in, None until then.
+        '''
+        now = self.timefunc()
+        self.evict(now)
+        (start, end) = (header.offset, header.offset + header.end -
+                        header.start - netpacket.HEADER.size)
+        message = self.messages.get(header.id)
+        if message is None:
+            if end > header.size or \
+                    netpacket.HEADER.size + header.size > self.max_bytes:
+                self.stats['invalid'] += 1
+                return None
+            message = Message(header, now)
+            self.evict(now, len(message))  # make room, never for itself
+            self.messages[header.id] = message
+            self.bytes += len(message)
+            self.stats['started'] += 1
+            self.logger.debug('Multipart %s initiated.', header.id)
+        elif end > len(message) - netpacket.HEADER.size:
+            self.stats['invalid'] += 1
+            return None
+        pos = netpacket.HEADER.size
+        message.buffer[pos + start:pos + end] = \
+            memoryview(header.buffer)[header.start + pos:header.end]
+        if not message.add(start, end): self.stats['duplicates'] += 1
+        if message.missing: return None
+
+        del self.messages[header.id]
+        self.bytes -= len(message)
+        self.stats['completed'] += 1
+        self.logger.debug('Multipart %s completed.', header.id)
+        return netpacket.Header.unpack(message.buffer)
+
+    def evict(self, now, room=0):
+        '''Drop messages that are too old or too many for room more bytes.'''
+        messages = self.messages
+        while messages:
+            (id, message) = next(iter(messages.items()))
+            if now - message.started > self.max_age:
+                self.stats['evicted_age'] += 1
+            elif self.bytes + room > self.max_bytes:
+                self.stats['evicted_bytes'] += 1
+            else: break
+            del messages[id]
+            self.bytes -= len(message)
+            self.logger.debug('Multipart %s dropped, %s bytes missing.', id,
+                              message.missing)
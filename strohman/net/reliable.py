@@ -0,0 +1,136 @@
+'''Retransmission of the packets the server has to acknowledge.
+
+Every datagram sent with priority 1 is kept until the ack with its id and
+offset arrives. The timeout follows the smoothed round trip time and its
+variance like TCP does (RFC 6298), it doubles with every retransmission
+of the same datagram. Round trip times of retransmitted datagrams are
+ambiguous and not sampled.
+
+The other way round the server sends a packet again if our ack got lost,
+Window remembers the ids received to drop these duplicates.
+'''
+import logging
+import collections
+
+from strohman.net import netpacket
+
+
+LOGGER = logging.getLogger(__name__)
+INITIAL_RTO = 1.0
+MIN_RTO = 0.2
+MAX_RTO = 10.0
+MAX_RETRIES = 5  # retransmissions before the connection is given up
+ALPHA = 1 / 8  # gain of the smoothed round trip time
+BETA = 1 / 4  # gain of the round trip time variance
+WINDOW = 1024  # ids remembered below the highest one received
+
+
+class Retransmitter:
+    '''
+    Pending datagrams by (id, offset), parts of a fragmented packet are
+    acknowledged one by one. send queues a datagram again, give_up is
+    called with the reason once a datagram ran out of retries.
+    '''
+    def __init__(self, scheduler, send, give_up):
+        self.logger = LOGGER.getChild(self.__class__.__name__)
+        self.scheduler = scheduler
+        self.send = send
+        self.give_up = give_up
+        self.pending = dict()  # (id, offset) -> [datagram, sent, retries, event]
+        self.srtt = self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.stats = collections.Counter()
+
+    def __len__(self): return len(self.pending)
+
+    def track(self, datagram):
+        '''Keep datagram until it is acknowledged, if it asks for an ack.'''
+        (id, offset, _, _, priority) = netpacket.HEADER.unpack_from(datagram)
+        if priority != 1: return
+        entry = [datagram, self.scheduler.timefunc(), 0, None]
+        self.pending[(id, offset)] = entry
+        self.schedule((id, offset), entry)
+
+    def ack(self, id, offset):
+        entry = self.pending.pop((id, offset), None)
+        if entry is None:
+            self.stats['stray_acks'] += 1
+            return
+        (_, sent, retries, event) = entry
+        self.cancel(event)
+        if not retries: self.sample(self.scheduler.timefunc() - sent)
+        self.stats['acked'] += 1
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            (self.srtt, self.rttvar) = (rtt, rtt / 2)
+        else:
+            self.rttvar += BETA * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += ALPHA * (rtt - self.srtt)
+        self.rto = min(max(self.srtt + 4 * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def schedule(self, key, entry):
+        timeout = min(self.rto * 2 ** entry[2], MAX_RTO)
+        entry[3] = self.scheduler.enter(timeout, 1, self.expire, (key,))
+
+    def expire(self, key):
+        entry = self.pending.get(key)
+        if entry is None: return
+        if entry[2] >= MAX_RETRIES:
+            self.logger.error('Packet %s not acknowledged, giving up.', key[0])
+            self.clear()
+            self.give_up('packet {} not acknowledged'.format(key[0]))
+            return
+        entry[1] = self.scheduler.timefunc()
+        entry[2] += 1
+        self.stats['retransmitted'] += 1
+        self.logger.debug('Resend packet %s (offset %s, try %s).', key[0],
+                          key[1], entry[2])
+        self.send(entry[0])
+        self.schedule(key, entry)
+
+    def cancel(self, event):
+        try: self.scheduler.cancel(event)
+        except ValueError: pass  # already run
+
+    def clear(self):
+        for entry in self.pending.values(): self.cancel(entry[3])
+        self.pending.clear()
+
+
+class Window:
+    '''
+    Received packet ids as a bitmap over the size ids up to the highest
+    one, bit n stands for top - n. Older ids can not be told apart any
+    more, they pass and are counted as too_old.
+    '''
+    def __init__(self, size=WINDOW):
+        self.size = size
+        self.mask = (1 << size) - 1
+        self.top = -1
+        self.bits = 0
+        self.stats = collections.Counter()
+
+    def __contains__(self, id):
+        offset = self.top - id
+        return 0 <= offset < self.size and bool(self.bits >> offset & 1)
+
+    def add(self, id):
+        offset = self.top - id
+        if offset < 0:
+            if -offset >= self.size: self.bits = 1
+            else: self.bits = (self.bits << -offset | 1) & self.mask
+            self.top = id
+        elif offset < self.size: self.bits |= 1 << offset
+
+    def check(self, id, add=True):
+        '''
+        True if id was received before, it is counted as duplicate.
+        Otherwise id is added, unless add is false.
+        '''
+        if id in self:
+            self.stats['duplicates'] += 1
+            return True
+        if self.top - id >= self.size: self.stats['too_old'] += 1
+        if add: self.add(id)
+        return False
@@ -0,0 +1,693 @@
+'''Declarative packet layouts.
+
+A packet class lists its body as a tuple of fields in `fields`, build()
+turns that into specialised _unpack/_pack methods. Adjacent fixed size
+fields are merged into one precompiled struct.Struct, so a run like
+entity_id, counter, flags is decoded by a single unpack_from call.
+For lazy decoding an _unpack_lazy generator is built as well, it yields
+the names of the attributes it just set, so leading fields are available
+without decoding the rest of the body.
+Classes created by Slotted get one slot per attribute field, an empty
+slot is filled on access by resolve().
+Fixed size fields that are only present depending on bits of an u8
+flags field in the same run (When(Bits(...)) and Vectors with flags) are
+decoded the same way, with one struct per value of those bits built on
+first use by Masks.
+The generated code objects are cached next to the module's bytecode.
+'''
+import os
+import sys
+import struct
+import operator
+import marshal
+import hashlib
+import importlib.util
+
+
+VERSION = 5
+MISSING = object()
+_caches = dict()
+
+
+class Field:
+    code = ''  # struct code of fixed size fields
+    count = 1  # number of values the code produces
+    hidden = False  # only decoded into a local, not an attribute
+    default = 0  # types are called to get a fresh value
+
+    def __init__(self, name, default=None):
+        self.name = name
+        if default is not None: self.default = default
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+
+class U8(Field): code = 'B'
+class U16(Field): code = 'H'
+class U32(Field): code = 'L'
+class F32(Field): code = 'f'
+
+
+class Vector(Field):
+    '''
+    Three values as a tuple, floats by default.
+    With flags=(name, bit_x, bit_y, bit_z) every component is only present
+    if its bit is set in the named field, missing ones are 0.
+    '''
+    count = 3
+    default = (0, 0, 0)
+
+    def __init__(self, name, code='f', flags=None):
+        super().__init__(name)
+        self.flags = flags
+        self.component = code
+        self.code = '' if flags else code * 3
+
+    def __repr__(self):
+        return 'Vector({!r}, {!r}, {!r})'.format(self.name, self.component,
+                                                  self.flags)
+
+
+class String(Field):
+    '''Null terminated utf-8 string, convert is applied when decoding.'''
+    default = ''
+
+    def __init__(self, name, convert=None):
+        super().__init__(name)
+        self.convert = convert
+
+    def __repr__(self):
+        convert = getattr(self.convert, '__qualname__', None)
+        return 'String({!r}, {!r})'.format(self.name, convert)
+
+
+class SentinelString(Field):
+    '''A u32 that, if equal to sentinel, is followed by a string.'''
+    default = ''
+
+    def __init__(self, name, sentinel=0xffffffff):
+        super().__init__(name)
+        self.sentinel = sentinel
+
+    def __repr__(self):
+        return 'SentinelString({!r}, {!r})'.format(self.name, self.sentinel)
+
+
+class Group(Field):
+    '''Fields decoded into a dict.'''
+    default = dict
+
+    def __init__(self, name, *fields):
+        super().__init__(name)
+        self.fields = fields
+
+    def __repr__(self):
+        return 'Group({!r}, {!r})'.format(self.name, self.fields)
+
+
+class Repeat(Field):
+    '''A list of dicts, the number of entries is given by field count.'''
+    default = list
+
+    def __init__(self, name, count, *fields):
+        super().__init__(name)
+        self.counter = count
+        self.fields = fields
+
+    def __repr__(self):
+        return 'Repeat({!r}, {!r}, {!r})'.format(self.name, self.counter,
+                                                 self.fields)
+
+
+class When(Field):
+    '''Fields only present if test holds, otherwise the alternative ones.'''
+    def __init__(self, test, *fields, otherwise=()):
+        super().__init__(None)
+        self.test = test
+        self.fields = fields
+        self.otherwise = otherwise
+
+    def __repr__(self):
+        return 'When({!r}, {!r}, {!r})'.format(self.test, self.fields,
+                                               self.otherwise)
+
+
+class Bits:
+    def __init__(self, name, mask):
+        self.name = name
+        self.mask = mask
+
+    def __repr__(self): return 'Bits({!r}, {!r})'.format(self.name, self.mask)
+    def expression(self, ref): return '{} & {}'.format(ref(self.name), self.mask)
+
+
+class Equals:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return 'Equals({!r}, {!r})'.format(self.name, self.value)
+
+    def expression(self, ref):
+        return '{} == {!r}'.format(ref(self.name), self.value)
+
+
+class In:
+    def __init__(self, name, values):
+        self.name = name
+        self.values = tuple(values)
+
+    def __repr__(self): return 'In({!r}, {!r})'.format(self.name, self.values)
+    def expression(self, ref):
+        return '{} in {!r}'.format(ref(self.name), self.values)
+
+
+class Remaining:
+    '''Trailing fields older servers leave out, always encoded.'''
+    def __init__(self, size):
+        self.size = size
+
+    def __repr__(self): return 'Remaining({!r})'.format(self.size)
+    def expression(self, ref): return 'end - pos >= {}'.format(self.size)
+
+
+class Masks(dict):
+    '''
+    Layouts of a run of fixed size values, by the flag bits deciding which
+    of them are present. items holds (code, bit, default) for every value,
+    bit 0 marks those always present.
+    A layout is (struct, get, put): get picks every value in order from the
+    unpacked ones followed by the defaults, put picks the present ones from
+    all values in order.
+    '''
+    def __init__(self, items):
+        super().__init__()
+        self.items = items
+        self.defaults = tuple(default for (code, bit, default) in items)
+
+    def __missing__(self, mask):
+        (code, get, put) = ('<', list(), list())
+        for (index, (item, bit, default)) in enumerate(self.items):
+            if bit and not mask & bit: get.append(None)
+            else:
+                get.append(len(put))
+                put.append(index)
+                code += item
+        get = [len(put) + index if position is None else position
+               for (index, position) in enumerate(get)]
+        layout = (struct.Struct(code), operator.itemgetter(*get),
+                  operator.itemgetter(*put))
+        self[mask] = layout
+        return layout
+
+
+def short(data):
+    raise RuntimeError('Unable to unpack {}.'.format(data.debug_copy))
+
+
+class _Scope:
+    '''Maps field names to the expressions holding their values.'''
+    def __init__(self, parent=None, prefix='', holder=None):
+        self.parent = parent
+        self.prefix = prefix
+        self.holder = holder  # None for attributes, else the dict's name
+        self.names = dict()
+        self.order = list()
+
+    def local(self, name):
+        var = '{}_{}'.format(self.prefix, name)
+        if name not in self.names: self.order.append(name)
+        self.names[name] = var
+        return var
+
+    def ref(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.names: return scope.names[name]
+            scope = scope.parent
+        raise KeyError('Field {} used before it is defined.'.format(name))
+
+    def value(self, name):
+        if self.holder is None: return 'self.' + name
+        return '{}[{!r}]'.format(self.holder, name)
+
+    def store(self, name, var):
+        if self.holder is None: return 'self.{} = {}'.format(name, var)
+
+
+class _Builder:
+    def __init__(self):
+        self.lazy = False
+        self.repeated = set()  # attributes set more than once
+        self.lines = list()
+        self.formats = list()
+        self.masks = list()
+        self.converters = list()
+        self.counter = 0
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def struct(self, code):
+        fmt = '<' + code
+        if fmt not in self.formats: self.formats.append(fmt)
+        return 'S{}'.format(self.formats.index(fmt))
+
+    def mask(self, items):
+        if items not in self.masks: self.masks.append(items)
+        return self.masks.index(items)
+
+    @staticmethod
+    def flags(field):
+        '''Name of the flags field deciding if field is present, if any.'''
+        if isinstance(field, Vector) and field.flags: return field.flags[0]
+        if isinstance(field, When) and isinstance(field.test, Bits) and \
+                not field.otherwise and field.fields and \
+                all(inner.code for inner in field.fields):
+            return field.test.name
+
+    def maskable(self, field, run):
+        '''
+        Whether field can join run as values selected by the bits of an u8
+        flags field at a fixed offset in run.
+        '''
+        flags = self.flags(field)
+        if flags is None: return False
+        for previous in run:
+            if previous.code and previous.name == flags:
+                return previous.code == 'B' and all(
+                    self.flags(other) in (None, flags) for other in run)
+            if not previous.code: return False
+        return False
+
+    def masked(self, run):
+        '''Name of the flags field selecting values of run, if any.'''
+        for field in run:
+            flags = self.flags(field)
+            if flags is not None: return flags
+
+    def items(self, run):
+        '''
+        (code, bit, default) of every value of a masked run, the offset of
+        its flags field, the bits used and the first value of every field.
+        '''
+        (items, offset, mask, values) = (list(), None, 0, list())
+        flags = self.masked(run)
+        for field in run:
+            if isinstance(field, SentinelString): parts = [(field, (0,))]
+            elif self.flags(field) is None:
+                if field.name == flags:
+                    offset = struct.calcsize('<' + ''.join(i[0] for i in items))
+                parts = [(field, (0,) * field.count)]
+            elif isinstance(field, Vector): parts = [(field, field.flags[1:])]
+            else:
+                parts = [(inner, (field.test.mask,) * inner.count)
+                         for inner in field.fields]
+            for (inner, bits) in parts:
+                values.append((inner, len(items)))
+                if isinstance(inner, SentinelString): (codes, defaults) = ('L', (0,))
+                else:
+                    codes = inner.component if isinstance(inner, Vector) else \
+                            inner.code[:len(inner.code) // inner.count]
+                    codes *= inner.count
+                    defaults = inner.default
+                    if inner.count == 1: defaults = (defaults,)
+                items.extend(zip(codes, bits, defaults))
+                for bit in bits: mask |= bit
+        return (tuple(items), offset, mask, values)
+
+    def temp(self, name):
+        self.counter += 1
+        return 't{}_{}'.format(self.counter, name)
+
+    def assign(self, scope, indent, name, value, hidden=False, pause=True):
+        var = scope.local(name)
+        store = None if hidden else scope.store(name, var)
+        if self.lazy and name in self.repeated and scope.holder is None:
+            store = None  # set once at the end, see generate()
+        if store is None: self.emit(indent, '{} = {}'.format(var, value))
+        else:
+            self.emit(indent, 'self.{} = {} = {}'.format(name, var, value))
+            if pause: self.pause(indent, (name,))
+        return store is not None
+
+    def pause(self, indent, names):
+        if self.lazy:
+            self.emit(indent, 'data.pos = pos')
+            self.emit(indent, 'yield {!r}'.format(tuple(names)))
+
+    ## decoding
+
+    def decode(self, fields, scope, indent):
+        run = list()
+        for field in fields:
+            if isinstance(field, SentinelString):
+                sentinel = U32(field.name + '_sentinel')
+                sentinel.hidden = True
+                run.append(sentinel)
+                self.decode_run(run, scope, indent)
+                run = list()
+                self.decode_field(field, scope, indent)
+            elif field.code or self.maskable(field, run): run.append(field)
+            else:
+                self.decode_run(run, scope, indent)
+                run = list()
+                self.decode_field(field, scope, indent)
+        self.decode_run(run, scope, indent)
+
+    def decode_run(self, run, scope, indent):
+        if not run: return
+        if self.masked(run): return self.decode_masked(run, scope, indent)
+        code = ''.join(field.code for field in run)
+        size = struct.calcsize('<' + code)
+        self.emit(indent, 'if pos + {} > end: short(data)'.format(size))
+        self.emit(indent, 'v = {}.unpack_from(buf, pos)'.format(self.struct(code)))
+        self.emit(indent, 'pos += {}'.format(size))
+        (index, stored) = (0, list())
+        for field in run:
+            if field.count == 1: value = 'v[{}]'.format(index)
+            else: value = 'v[{}:{}]'.format(index, index + field.count)
+            index += field.count
+            if self.assign(scope, indent, field.name, value, field.hidden,
+                           pause=False): stored.append(field.name)
+        if stored: self.pause(indent, stored)
+
+    def decode_masked(self, run, scope, indent):
+        (items, offset, mask, values) = self.items(run)
+        masks = self.mask(items)
+        self.emit(indent, 'if pos + {} > end: short(data)'.format(offset + 1))
+        self.emit(indent, '(s, get, put) = M{}[buf[pos + {}] & {}]'.format(
+            masks, offset, mask))
+        self.emit(indent, 'if pos + s.size > end: short(data)')
+        self.emit(indent, 'v = get(s.unpack_from(buf, pos) + M{}.defaults)'.format(
+            masks))
+        self.emit(indent, 'pos += s.size')
+        stored = list()
+        for (field, index) in values:
+            if field.count == 1: value = 'v[{}]'.format(index)
+            else: value = 'v[{}:{}]'.format(index, index + field.count)
+            if self.assign(scope, indent, field.name, value, field.hidden,
+                           pause=False): stored.append(field.name)
+        if stored: self.pause(indent, stored)
+
+    def decode_string(self, indent, var):
+        self.emit(indent, 'i = buf.find(0, pos, end)')
+        self.emit(indent, 'if i < 0: short(data)')
+        self.emit(indent, "try: {} = str(buf[pos:i], 'utf-8')".format(var))
+        self.emit(indent, "except UnicodeDecodeError: {} = 'UnicodeDecodeError'".format(var))
+        self.emit(indent, 'pos = i + 1')
+
+    def decode_field(self, field, scope, indent):
+        if isinstance(field, String):
+            var = self.temp(field.name)
+            self.decode_string(indent, var)
+            if field.convert is not None:
+                if field.convert not in self.converters:
+                    self.converters.append(field.convert)
+                converter = self.converters.index(field.convert)
+                var = 'C{}({})'.format(converter, var)
+            self.assign(scope, indent, field.name, var)
+        elif isinstance(field, SentinelString):
+            var = self.temp(field.name)
+            sentinel = scope.ref(field.name + '_sentinel')
+            self.emit(indent, 'if {} == {}:'.format(sentinel, field.sentinel))
+            self.decode_string(indent + 1, var)
+            self.emit(indent, "else: {} = ''".format(var))
+            self.assign(scope, indent, field.name, var)
+        elif isinstance(field, Vector):
+            (flags, bits) = (field.flags[0], field.flags[1:])
+            parts = [self.temp(field.name) for bit in bits]
+            self.emit(indent, '{} = 0'.format(' = '.join(parts)))
+            size = struct.calcsize('<' + field.component)
+            unpacker = self.struct(field.component)
+            for (bit, var) in zip(bits, parts):
+                self.emit(indent, 'if {} & {}:'.format(scope.ref(flags), bit))
+                self.emit(indent + 1, 'if pos + {} > end: short(data)'.format(size))
+                self.emit(indent + 1, '({},) = {}.unpack_from(buf, pos)'.format(var, unpacker))
+                self.emit(indent + 1, 'pos += {}'.format(size))
+            self.assign(scope, indent, field.name, '({})'.format(', '.join(parts)))
+        elif isinstance(field, When):
+            self.emit(indent, 'if {}:'.format(field.test.expression(scope.ref)))
+            self.decode(field.fields, scope, indent + 1)
+            if not field.fields: self.emit(indent + 1, 'pass')
+            if field.otherwise:
+                self.emit(indent, 'else:')
+                self.decode(field.otherwise, scope, indent + 1)
+        elif isinstance(field, Group):
+            inner = _Scope(scope, self.temp(field.name), field.name)
+            self.decode(field.fields, inner, indent)
+            self.assign(scope, indent, field.name, self.dict(inner))
+        elif isinstance(field, Repeat):
+            var = self.temp(field.name)
+            inner = _Scope(scope, self.temp(field.name), field.name)
+            self.emit(indent, '{} = []'.format(var))
+            self.emit(indent, 'for _ in range({}):'.format(scope.ref(field.counter)))
+            self.decode(field.fields, inner, indent + 1)
+            self.emit(indent + 1, '{}.append({})'.format(var, self.dict(inner)))
+            self.assign(scope, indent, field.name, var)
+        else: raise TypeError('Unknown field {!r}'.format(field))
+
+    def dict(self, scope):
+        items = ('{!r}: {}'.format(name, scope.names[name])
+                 for name in scope.order)
+        return '{{{}}}'.format(', '.join(items))
+
+    ## encoding
+
+    def encode(self, fields, scope, indent):
+        run = list()
+        for field in fields:
+            if isinstance(field, SentinelString):
+                run.append(field)
+                self.encode_run(run, scope, indent)
+                run = list()
+                self.encode_string(indent, scope.value(field.name))
+            elif field.code or self.maskable(field, run): run.append(field)
+            else:
+                self.encode_run(run, scope, indent)
+                run = list()
+                self.encode_field(field, scope, indent)
+        self.encode_run(run, scope, indent)
+
+    def encode_run(self, run, scope, indent):
+        if not run: return
+        if self.masked(run): return self.encode_masked(run, scope, indent)
+        (code, values) = ('', list())
+        for field in run:
+            if isinstance(field, SentinelString):
+                code += 'L'
+                values.append(str(field.sentinel))
+            else:
+                code += field.code
+                value = scope.value(field.name)
+                values.append('*' + value if field.count > 1 else value)
+        self.emit(indent, 'buf += {}.pack({})'.format(self.struct(code),
+                                                      ', '.join(values)))
+
+    def encode_masked(self, run, scope, indent):
+        (items, offset, mask, values) = self.items(run)
+        args = list()
+        for (field, index) in values:
+            if isinstance(field, SentinelString): args.append(str(field.sentinel))
+            else:
+                value = scope.value(field.name)
+                args.append('*' + value if field.count > 1 else value)
+        self.emit(indent, '(s, get, put) = M{}[{} & {}]'.format(
+            self.mask(items), scope.value(self.masked(run)), mask))
+        self.emit(indent, 'buf += s.pack(*put(({})))'.format(', '.join(args)))
+
+    def encode_string(self, indent, value):
+        self.emit(indent, "buf += {}.encode('utf-8')".format(value))
+        self.emit(indent, 'buf.append(0)')
+
+    def encode_field(self, field, scope, indent):
+        if isinstance(field, String):
+            self.encode_string(indent, scope.value(field.name))
+        elif isinstance(field, Vector):
+            flags = scope.value(field.flags[0])
+            packer = self.struct(field.component)
+            for (index, bit) in enumerate(field.flags[1:]):
+                self.emit(indent, 'if {} & {}: buf += {}.pack({}[{}])'.format(
+                    flags, bit, packer, scope.value(field.name), index))
+        elif isinstance(field, When) and isinstance(field.test, Remaining):
+            self.encode(field.fields, scope, indent)
+        elif isinstance(field, When):
+            self.emit(indent, 'if {}:'.format(field.test.expression(scope.value)))
+            self.encode(field.fields, scope, indent + 1)
+            if not field.fields: self.emit(indent + 1, 'pass')
+            if field.otherwise:
+                self.emit(indent, 'else:')
+                self.encode(field.otherwise, scope, indent + 1)
+        elif isinstance(field, Group):
+            var = self.temp(field.name)
+            self.emit(indent, '{} = {}'.format(var, scope.value(field.name)))
+            self.encode(field.fields, _Scope(scope, holder=var), indent)
+        elif isinstance(field, Repeat):
+            var = self.temp(field.name)
+            self.emit(indent, 'for {} in {}:'.format(var, scope.value(field.name)))
+            self.encode(field.fields, _Scope(scope, holder=var), indent + 1)
+        else: raise TypeError('Unknown field {!r}'.format(field))
+
+
+def generate(fields):
+    '''
+    Returns the source of _unpack, _unpack_lazy and _pack,
+    the struct formats, masked runs and the converters they use.
+    '''
+    builder = _Builder()
+    names = [field.name for field in attributes(fields)]
+    builder.repeated = set(name for name in names if names.count(name) > 1)
+    for (name, lazy) in (('_unpack', False), ('_unpack_lazy', True)):
+        builder.lazy = lazy
+        builder.emit(0, 'def {}(self):'.format(name))
+        builder.emit(1, 'data = self.data')
+        builder.emit(1, 'buf = data.buffer')
+        builder.emit(1, 'pos = data.pos')
+        builder.emit(1, 'end = data.end')
+        if lazy:
+            for attribute in sorted(builder.repeated):
+                builder.emit(1, '_{} = MISSING'.format(attribute))
+        builder.decode(fields, _Scope(), 1)
+        if lazy:
+            for attribute in sorted(builder.repeated):
+                builder.emit(1, 'if _{0} is not MISSING: self.{0} = _{0}'.format(attribute))
+        builder.emit(1, 'data.pos = pos')
+        builder.emit(0, '')
+    builder.lazy = False
+    builder.emit(0, 'def _pack(self):')
+    builder.emit(1, 'data = self.data')
+    builder.emit(1, 'data.purge()')
+    builder.emit(1, 'buf = data.buffer')
+    builder.encode(fields, _Scope(), 1)
+    builder.emit(1, 'data.end = len(buf)')
+    return ('\n'.join(builder.lines) + '\n', builder.formats, builder.masks,
+            builder.converters)
+
+
+def _cache_path(module):
+    try: path = importlib.util.cache_from_source(module.__file__)
+    except (AttributeError, NotImplementedError, TypeError): return None
+    return os.path.splitext(path)[0] + '.schema'
+
+
+def _load_cache(path):
+    if path not in _caches:
+        try:
+            with open(path, 'rb') as cache_file:
+                cache = marshal.load(cache_file)
+            if not isinstance(cache, dict): raise ValueError
+        except (OSError, EOFError, ValueError, TypeError): cache = dict()
+        _caches[path] = cache
+    return _caches[path]
+
+
+def _write_cache(path, cache):
+    if sys.dont_write_bytecode: return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = '{}.{}'.format(path, os.getpid())
+        with open(temp, 'wb') as cache_file:
+            marshal.dump(cache, cache_file)
+        os.replace(temp, path)
+    except OSError: pass
+
+
+def build(cls):
+    '''
+    Compile cls.fields into cls._unpack and cls._pack, and collect the
+    slot and default of every attribute field in cls.defaults.
+    Methods defined in the class body itself take precedence.
+    '''
+    key = hashlib.sha1('{}:{}:{!r}'.format(VERSION, cls.__qualname__,
+                                            cls.fields).encode()).hexdigest()
+    path = _cache_path(sys.modules[cls.__module__])
+    cache = dict() if path is None else _load_cache(path)
+    entry = cache.get(cls.__qualname__)
+    if entry is not None and entry[0] == key:
+        (key, formats, masks, code) = entry
+        converters = list()
+        _collect(cls.fields, converters)
+    else:
+        (source, formats, masks, converters) = generate(cls.fields)
+        filename = '<schema {}>'.format(cls.__qualname__)
+        code = compile(source, filename, 'exec')
+        if path is not None:
+            cache[cls.__qualname__] = (key, formats, masks, code)
+            _write_cache(path, cache)
+
+    namespace = {'short': short, 'MISSING': MISSING}
+    for (index, fmt) in enumerate(formats):
+        namespace['S{}'.format(index)] = struct.Struct(fmt)
+    for (index, items) in enumerate(masks):
+        namespace['M{}'.format(index)] = Masks(items)
+    for (index, converter) in enumerate(converters):
+        namespace['C{}'.format(index)] = converter
+    exec(code, namespace)
+    for name in ('_unpack', '_unpack_lazy', '_pack'):
+        if name not in cls.__dict__:
+            namespace[name].__qualname__ = '{}.{}'.format(cls.__qualname__, name)
+            setattr(cls, name, namespace[name])
+    cls.defaults = dict((field.name, (getattr(cls, field.name), field.default))
+                        for field in attributes(cls.fields))
+
+
+class Slotted(type):
+    '''
+    Metaclass giving classes without explicit __slots__ one slot for every
+    attribute field they list in `fields`, and none otherwise.
+    '''
+    def __new__(mcls, name, bases, namespace, **kwargs):
+        if '__slots__' not in namespace:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(klass.__dict__.get('__slots__', ()))
+            slots = list()
+            for field in attributes(namespace.get('fields') or ()):
+                if field.name not in inherited and field.name not in slots:
+                    slots.append(field.name)
+            namespace['__slots__'] = tuple(slots)
+        return super().__new__(mcls, name, bases, namespace, **kwargs)
+
+
+def resolve(packet, name):
+    '''
+    Value of a field whose slot is still empty. A pending lazy decode is
+    continued until it sets the field, else the default is used. Defaults
+    are only kept once there is no undecoded body left to shadow them.
+    '''
+    (slot, default) = packet.defaults[name]
+    decoder = packet.decoder
+    if decoder is not None:
+        for names in decoder:
+            if name in names: return slot.__get__(packet)
+        packet.decoder = None
+        try: return slot.__get__(packet)
+        except AttributeError: pass
+    value = default() if isinstance(default, type) else default
+    data = packet.data
+    if data.writable or not data: slot.__set__(packet, value)
+    return value
+
+
+def attributes(fields):
+    '''The fields that are set as attributes when decoding.'''
+    for field in fields:
+        if isinstance(field, When):
+            yield from attributes(field.fields)
+            yield from attributes(field.otherwise)
+        elif not field.hidden: yield field
+
+
+def _collect(fields, converters):
+    '''Converters in the order generate() numbers them.'''
+    for field in fields:
+        if isinstance(field, String) and field.convert is not None:
+            if field.convert not in converters: converters.append(field.convert)
+        elif isinstance(field, When):
+            _collect(field.fields, converters)
+            _collect(field.otherwise, converters)
+        elif isinstance(field, (Group, Repeat)):
+            _collect(field.fields, converters)
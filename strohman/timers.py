@@ -0,0 +1,113 @@
+'''Timers on the monotonic clock, the interface is the one of sched.
+
+Deadlines are rounded up to the next multiple of TICK and all timers of a
+tick share one bucket, the heap only holds the ticks. Timers of the same
+tick fire in one go, ordered by time, priority and the order they were
+entered. Cancelling only marks the timer, it is dropped when its tick
+comes or when the dead timers outnumber the pending ones.
+'''
+import time
+import heapq
+import itertools
+
+
+TICK = 0.002  # seconds
+
+
+class Timer:
+    __slots__ = ('time', 'priority', 'sequence', 'action', 'argument',
+                 'kwargs', 'pending')
+
+    def __init__(self, time, priority, sequence, action, argument, kwargs):
+        self.time = time
+        self.priority = priority
+        self.sequence = sequence
+        self.action = action
+        self.argument = argument
+        self.kwargs = kwargs
+        self.pending = True
+
+    def __lt__(self, timer):
+        return (self.time, self.priority, self.sequence) < \
+            (timer.time, timer.priority, timer.sequence)
+
+
+class Timers:
+    def __init__(self, timefunc=time.monotonic, tick=TICK):
+        self.timefunc = timefunc
+        self.tick = tick
+        self.buckets = dict()  # tick -> timers, pending or not
+        self.ticks = list()  # heap of the ticks in buckets
+        self.pending = self.dead = 0
+        self.sequence = itertools.count()
+
+    def __len__(self): return self.pending
+
+    @property
+    def queue(self):
+        return sorted(timer for bucket in self.buckets.values()
+                      for timer in bucket if timer.pending)
+
+    def empty(self): return not self.pending
+
+    def enterabs(self, time, priority, action, argument=(), kwargs={}):
+        timer = Timer(time, priority, next(self.sequence), action, argument,
+                      kwargs)
+        tick = -int(-time // self.tick)  # rounded up
+        bucket = self.buckets.get(tick)
+        if bucket is None:
+            bucket = self.buckets[tick] = list()
+            heapq.heappush(self.ticks, tick)
+        bucket.append(timer)
+        self.pending += 1
+        return timer
+
+    def enter(self, delay, priority, action, argument=(), kwargs={}):
+        return self.enterabs(self.timefunc() + delay, priority, action,
+                             argument, kwargs)
+
+    def cancel(self, timer):
+        if not timer.pending: raise ValueError('timer not pending')
+        timer.pending = False
+        self.pending -= 1
+        self.dead += 1
+        if self.dead > 64 and self.dead > self.pending: self.compact()
+
+    def compact(self):
+        for (tick, bucket) in list(self.buckets.items()):
+            bucket[:] = [timer for timer in bucket if timer.pending]
+            if not bucket: del self.buckets[tick]
+        self.ticks = list(self.buckets)
+        heapq.heapify(self.ticks)
+        self.dead = 0
+
+    def next_time(self):
+        '''When the next timer is due, None if there is none.'''
+        while self.ticks:
+            bucket = self.buckets[self.ticks[0]]
+            if any(timer.pending for timer in bucket):
+                return self.ticks[0] * self.tick
+            del self.buckets[heapq.heappop(self.ticks)]
+            self.dead = max(self.dead - len(bucket), 0)
+        return None
+
+    def run_due(self, now=None):
+        '''Run the timers due at now, by default at timefunc().'''
+        if now is None: now = self.timefunc()
+        while self.ticks and self.ticks[0] * self.tick <= now:
+            tick = heapq.heappop(self.ticks)
+            bucket = self.buckets.pop(tick)
+            bucket.sort()
+            for (i, timer) in enumerate(bucket):
+                if not timer.pending:
+                    self.dead = max(self.dead - 1, 0)  # compact() may run
+                    continue
+                timer.pending = False
+                self.pending -= 1
+                try: timer.action(*timer.argument, **timer.kwargs)
+                except BaseException:
+                    if tick not in self.buckets:  # keep the rest of the tick
+                        self.buckets[tick] = list()
+                        heapq.heappush(self.ticks, tick)
+                    self.buckets[tick][:0] = bucket[i + 1:]
+                    raise
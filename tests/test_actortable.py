@@ -0,0 +1,197 @@
+import math
+import random
+import struct
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from strohman.net import actortable, drbatch
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def body(entity_id, counter, pos, sector=None):
+    payload = struct.pack('<LBB3fBL', entity_id, counter, 0, *pos, 0,
+                          17 if sector is None else drbatch.SECTOR_NAME)
+    return payload if sector is None else payload + sector.encode() + b'\0'
+
+
+def actor(pos, sector='hydlaa', **actor):
+    return dict({'drcounter': 0, 'name': 'n'}, pos=pos, sector=sector,
+                **actor)
+
+
+def consistent(table):
+    '''The grid holds every row once, in the cell of its position.'''
+    rows = sorted(row for cell in table.cells.values() for row in cell)
+    assert rows == list(range(len(table)))
+    for (key, cell) in table.cells.items():
+        assert cell and all(table.key(row) == key for row in cell)
+    assert {int(table.ids[row]): row for row in rows} == table.rows
+
+
+def test_mapping():
+    table = actortable.ActorTable(size=2)
+    for entity_id in range(5):
+        table[entity_id] = actor((entity_id, 0, 0), name=str(entity_id),
+                                 vel=(1, 2, 3), y_rot=64)
+    assert len(table) == 5 and list(table) == [0, 1, 2, 3, 4]
+    assert table[3] == {'pos': (3, 0, 0), 'drcounter': 0, 'name': '3',
+                        'vel': (1, 2, 3), 'world_vel': (0, 0, 0),
+                        'ang_vel': 0, 'y_rot': 64, 'sector': 'hydlaa'}
+    del table[1]
+    assert 1 not in table and table.pop(4)['name'] == '4'
+    table[0] = actor((100, 0, 0), sector='')  # keeps its sector
+    assert table[0]['sector'] == 'hydlaa' and list(table) == [0, 3, 2]
+    consistent(table)
+
+
+def test_move():
+    table = actortable.ActorTable()
+    table[1] = actor((0, 0, 0))
+    table[2] = actor((0, 0, 0))
+    batch = drbatch.decode([body(1, 3, (50, 0, 0), 'ojaveda'),
+                            body(1, 2, (60, 0, 0)), body(2, 0, (70, 0, 0)),
+                            body(3, 1, (80, 0, 0))])
+    (moved, unknown) = table.move(*batch)
+    assert (sorted(moved), unknown) == ([1, 3], [3])
+    assert table[1]['pos'] == (50, 0, 0) and table[1]['sector'] == 'ojaveda'
+    assert table[2]['pos'] == (0, 0, 0)  # counter not higher
+    consistent(table)
+
+
+def test_move_after_remove():
+    table = actortable.ActorTable()
+    table[1] = actor((0, 0, 0))
+    del table[1]
+    assert table.move(*drbatch.decode([body(1, 1, (5, 0, 0))])) == ([], [])
+    assert 1 not in table
+    assert table.move(*drbatch.decode([body(1, 2, (5, 0, 0))])) == ([1], [1])
+
+
+def brute(actors, sector, pos):
+    return sorted((math.dist(position, pos), entity_id)
+                  for (entity_id, (position, in_sector)) in actors.items()
+                  if in_sector == sector)
+
+
+def test_queries():
+    rnd = random.Random(1)
+    table = actortable.ActorTable(size=4, cell=10)
+    actors = dict()
+    for entity_id in range(300):
+        pos = (rnd.uniform(-100, 100), 0, rnd.uniform(-100, 100))
+        sector = rnd.choice('ab')
+        table[entity_id] = actor(pos, sector)
+        actors[entity_id] = (tuple(table.pos[table.rows[entity_id]]), sector)
+    for entity_id in range(0, 300, 3):
+        del table[entity_id]
+        del actors[entity_id]
+    consistent(table)
+    for _ in range(50):
+        pos = (rnd.uniform(-120, 120), 0, rnd.uniform(-120, 120))
+        (sector, radius, k) = (rnd.choice('ab'), rnd.uniform(0, 50),
+                               rnd.randrange(1, 30))
+        expected = brute(actors, sector, pos)
+        (ids, distances) = table.near(sector, pos, radius)
+        assert ids.tolist() == [entity_id for (distance, entity_id)
+                                in expected if distance <= radius]
+        (ids, distances) = table.nearest(sector, pos, k)
+        assert distances.tolist() == pytest.approx(
+            [distance for (distance, _) in expected[:k]], abs=1e-3)
+    assert sorted(table.in_sector('a').tolist()) == sorted(
+        entity_id for (entity_id, (_, sector)) in actors.items()
+        if sector == 'a')
+    assert len(table.near('c', (0, 0, 0), 1000)[0]) == 0
+
+
+@pytest.mark.parametrize('k', [-1, 0, 1, 3, 4, 100])
+def test_nearest_k(k):
+    table = actortable.ActorTable()
+    for entity_id in range(3): table[entity_id] = actor((entity_id, 0, 0))
+    table[9] = actor((0, 0, 0), sector='elsewhere')
+    (ids, distances) = table.nearest('hydlaa', (0.2, 0, 0), k)
+    assert ids.tolist() == [0, 1, 2][:max(k, 0)]
+    assert len(distances) == len(ids)
+
+
+def integrate(pos, vel, world_vel, heading, ang_vel, dt, steps=1000):
+    '''Reference for extrapolate by small steps in float64.'''
+    (x, y, z) = pos
+    step = dt / steps
+    for i in range(steps):
+        turned = heading + ang_vel * step * (i + 0.5)
+        (sin, cos) = (math.sin(turned), math.cos(turned))
+        x += (world_vel[0] + vel[0] * cos + vel[2] * sin) * step
+        y += (world_vel[1] + vel[1]) * step
+        z += (world_vel[2] + vel[2] * cos - vel[0] * sin) * step
+    return ((x, y, z), (heading + ang_vel * dt) % (2 * math.pi))
+
+
+@pytest.mark.parametrize('ang_vel', [0, 0.5, -2, 1e-4])
+def test_extrapolate(ang_vel):
+    rnd = random.Random(2)
+    states = [((rnd.uniform(-100, 100), 0, rnd.uniform(-100, 100)),
+               (rnd.uniform(-5, 5), rnd.uniform(-1, 1), rnd.uniform(-5, 5)),
+               (rnd.uniform(-2, 2), 0, rnd.uniform(-2, 2)),
+               rnd.uniform(0, 2 * math.pi), ang_vel, rnd.uniform(0, 3))
+              for _ in range(20)]
+    columns = [numpy.array(column, '<f4') for column in zip(*states)]
+    (pos, heading) = actortable.extrapolate(*columns)
+    for (row, state) in enumerate(states):
+        (expected_pos, expected_heading) = integrate(*state)
+        assert pos[row].tolist() == pytest.approx(expected_pos, abs=1e-3)
+        assert heading[row] == pytest.approx(expected_heading, abs=1e-4)
+
+
+def test_predict():
+    clock = Clock()
+    table = actortable.ActorTable(timefunc=clock)
+    table[1] = actor((0, 0, 0), world_vel=(1, 0, 0))
+    clock.now = 1
+    table[2] = actor((0, 0, 0), vel=(0, 0, 2), y_rot=64)  # facing +x
+    clock.now = 2
+    (pos, heading) = table.predict()
+    assert pos == pytest.approx(numpy.array([[2, 0, 0], [2, 0, 0]]), abs=1e-5)
+    assert heading.tolist() == pytest.approx([0, math.pi / 2])
+    (pos, _) = table.predict(at=100)  # not beyond HORIZON
+    assert pos[:, 0].tolist() == pytest.approx(
+        [actortable.HORIZON, 2 * actortable.HORIZON])
+    (pos, _) = table.predict(at=0)  # not backwards
+    assert not pos.any()
+
+
+def test_history():
+    clock = Clock()
+    table = actortable.ActorTable(timefunc=clock,
+                                  history=actortable.History(size=2, depth=4))
+    for step in range(6):
+        clock.now = step
+        table[1] = actor((step, 0, 0), drcounter=step, y_rot=step)
+    trail = table.trail(1)
+    assert trail['time'].tolist() == [2, 3, 4, 5]  # the ring holds 4
+    assert trail['pos'][:, 0].tolist() == [2, 3, 4, 5]
+    assert trail['y_rot'].tolist() == [2, 3, 4, 5]
+    assert table.trail(1, seconds=1.5)['time'].tolist() == [4, 5]
+    assert table.trail(1, seconds=1, at=3.5)['time'].tolist() == [3]
+
+    clock.now = 6
+    table.move(*drbatch.decode([body(1, 6, (6, 0, 0)), body(2, 1, (9, 0, 0)),
+                                body(3, 1, (9, 0, 0))]))
+    assert table.trail(1)['time'].tolist() == [3, 4, 5, 6]
+    assert table.trail(2)['pos'][:, 0].tolist() == [9]
+    assert len(table.trail(3)) == 0  # no slot left
+    del table[1]
+    assert len(table.trail(1)) == 0
+    table[3] = actor((1, 0, 0))  # takes the slot of 1, empty again
+    assert table.trail(3)['pos'][:, 0].tolist() == [1]
+
+
+def test_no_history():
+    table = actortable.ActorTable()
+    table[1] = actor((0, 0, 0))
+    assert len(table.trail(1)) == 0 and len(table.trail(2)) == 0
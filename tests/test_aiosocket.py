@@ -0,0 +1,28 @@
+from strohman import aiosocket
+
+
+def test_run_until_no_events():
+    sched = aiosocket.aioschedcore()
+    calls = list()
+    sched.enter(0.002, 1, calls.append, ('second',))
+    sched.enter(0.001, 1, calls.append, ('first',))
+    cancelled = sched.enter(0.001, 1, calls.append, ('cancelled',))
+    sched.cancel(cancelled)
+    assert len(sched.queue) == 2
+    sched.run()
+    assert calls == ['first', 'second'] and sched.empty()
+    sched.loop.close()
+
+
+def test_run_from_a_callback():
+    sched = aiosocket.aioschedcore()
+    calls = list()
+
+    def callback():
+        sched.enter(0.001, 1, calls.append, ('later',))
+        sched.run()  # like Interface.close() from an event handler
+        calls.append('callback')
+    sched.enter(0, 1, callback)
+    sched.run()
+    assert calls == ['callback', 'later']
+    sched.loop.close()
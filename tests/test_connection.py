@@ -0,0 +1,306 @@
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+from strohman.net import netpacket, handlers, connection, reliable
+from strohman.interface import proto
+
+
+def datagram(msg_type, payload, id=7, priority=1):
+    body = struct.pack('<BH', msg_type, len(payload) + 3) + payload
+    return struct.pack('<LLLHB', id, 0, len(body), len(body), priority) + body
+
+
+def decode(datagram, header):
+    packet = netpacket.by_type(header.msg_type, netpacket.Header.unpack(
+        datagram, header.start, header.end))
+    packet.unpack_body()
+    return packet
+
+
+def dr(entity_id, counter):
+    return struct.pack('<LBB3fBL', entity_id, counter, 0, 1, 2, 3, 0, 3)
+
+
+def remove(entity_id): return struct.pack('<L', entity_id)
+
+
+def actor(actors, entity_id):
+    actors.actors[entity_id] = {'pos': (0, 0, 0), 'drcounter': 0,
+                                'name': 'Bob', 'sector': 'hydlaa'}
+
+
+def receive(interface, *datagrams):
+    transport = interface.connection.asyn
+    transport.handle_datagram(netpacket.join(datagrams))
+    transport.flush_batches()
+
+
+def test_recv_budget():
+    asynsocket = pytest.importorskip('strohman.asynsocket')
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+
+    class AsynInterface(proto.Interface):
+        scheduler = asynsocket.asynschedcore
+    interface = AsynInterface(*server.getsockname())
+    interface.do_start()
+    transport = interface.connection.asyn
+    received = list()
+    transport.handle_datagram = lambda data: received.append(
+        netpacket.Header.unpack(data).id)
+    transport.recv_budget = 3
+    for id in range(5):
+        server.sendto(datagram(130, remove(id), id, priority=0),
+                      transport.socket.getsockname())
+    time.sleep(0.05)
+    transport.handle_read()
+    assert received == [0, 1, 2]
+    transport.handle_read()  # stops when the socket would block
+    assert received == [0, 1, 2, 3, 4]
+    assert transport.stats['datagrams_in'] == 5
+    assert transport.stats['read_events'] == 2
+    interface.connection.close()
+    server.close()
+
+
+class Interface(proto.Interface):
+    def __init__(self, ip, port):
+        super().__init__(ip, port)
+        self.events = list()
+
+    def on_actor_new(self, handler, entity_id):
+        self.events.append(('new', entity_id))
+
+    def on_actor_moved(self, handler, entity_id):
+        self.events.append(('moved', entity_id))
+
+    def on_actor_del(self, handler, entity_id):
+        self.events.append(('del', entity_id))
+
+
+@pytest.fixture
+def interface():
+    interface = Interface('127.0.0.1', 9)
+    interface.do_start()
+    yield interface
+    interface.connection.close()
+    loop = interface.sched.loop
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+def sent(transport):
+    '''Have transport write into a list instead of the socket.'''
+    datagrams = list()
+    transport.send = lambda data: datagrams.append(bytes(data)) or len(data)
+    return datagrams
+
+
+def test_coalesce(interface):
+    transport = interface.connection.asyn
+    datagrams = sent(transport)
+    commands = ['/say {}'.format(i) * 10 for i in range(100)]
+    for command in commands:
+        transport.push(netpacket.UserCmdPacket(command=command))
+    assert transport.handle_write()
+    assert 1 < len(datagrams) < len(commands)
+    assert max(map(len, datagrams)) <= connection.MAX_PACKET_SIZE
+    received = [decode(datagram, header) for datagram in datagrams
+                for header in netpacket.split(datagram)]
+    assert [packet.command for packet in received] == commands
+
+
+def test_fragment_budget(interface):
+    transport = interface.connection.asyn
+    datagrams = sent(transport)
+    transport.fragment_budget = 2
+    transport.push(netpacket.UserCmdPacket(command='x' * 5000))
+    transport.push(netpacket.UserCmdPacket(command='/who'))
+    assert transport.handle_write()
+    assert len(datagrams) == 3 and len(transport.fragments) == 2
+    assert transport.handle_write()
+    assert len(datagrams) == 5 and not transport.fragments
+    assert max(map(len, datagrams)) <= connection.MAX_PACKET_SIZE
+    (first, *parts) = map(netpacket.Header.unpack, datagrams)
+    assert decode(datagrams[0], first).command == '/who'  # not held up
+    reassembler = transport.multi_queue
+    headers = [header for header in map(reassembler.add, parts) if header]
+    assert [decode(header.buffer, header).command for header in headers] == \
+        ['x' * 5000]
+
+
+def test_acks_are_held_back(interface):
+    transport = interface.connection.asyn
+    for id in range(10, 20):
+        transport.handle_datagram(datagram(130, remove(2), id))
+    transport.handle_datagram(datagram(130, remove(2), 20, priority=0))
+    assert transport.ack_event is not None and not transport.out_buffer
+    assert transport.ack_event.time - interface.sched.timefunc() <= \
+        connection.ACK_DELAY
+    transport.ack_event()  # as the loop would after ACK_DELAY
+    assert transport.ack_event is None
+    acks = [netpacket.HEADER.unpack(ack) for ack in transport.out_buffer]
+    assert acks == [(id, 0, 7, 0, 0) for id in range(10, 20)]
+
+    transport.out_buffer.clear()
+    for id in range(connection.ACKS_PER_DATAGRAM):  # a full datagram
+        transport.handle_datagram(datagram(130, remove(2), 100 + id))
+    assert transport.ack_event is None
+    assert len(transport.out_buffer) == connection.ACKS_PER_DATAGRAM
+    assert interface.sched.events == {interface.connection.watchdog_event}
+
+
+def test_close_drops_acks(interface):
+    transport = interface.connection.asyn
+    transport.handle_datagram(datagram(130, remove(2), 10))
+    assert transport.ack_event is not None
+    interface.connection.close()
+    assert transport.ack_event is None and not transport.acks
+    assert not interface.sched.events
+
+
+class Recorder(handlers.BaseHandler):
+    def __init__(self, interface, packet):
+        super().__init__(interface)
+        self.packets = list()
+        self.register(packet, self.record)
+
+    def record(self, packet): self.packets.append(packet.entity_id)
+
+
+def test_duplicates_are_acked_and_dropped(interface):
+    transport = interface.connection.asyn
+    recorder = Recorder(interface, netpacket.RemoveObjectPacket)
+    transport.handle_datagram(datagram(130, remove(1), 10))
+    transport.handle_datagram(datagram(130, remove(2), 10))  # sent again
+    transport.handle_datagram(netpacket.join([datagram(130, remove(3), 10),
+                                              datagram(130, remove(4), 11)]))
+    transport.handle_datagram(datagram(130, remove(5), 3, priority=0))
+    transport.handle_datagram(datagram(130, remove(6), 3, priority=0))
+    assert recorder.packets == [1, 4, 5, 6]  # unreliable ones all pass
+    acks = [ack[0] for ack in netpacket.HEADER.iter_unpack(transport.acks)]
+    assert acks == [10, 10, 0, 10, 11]  # 0 is the multi datagram
+
+    raw = datagram(130, remove(7), 12)
+    parts = list(netpacket.fragment(raw, netpacket.HEADER.size + 4))
+    for part in parts + parts[:1]:  # a part of a completed one comes late
+        transport.handle_datagram(part)
+    assert recorder.packets[4:] == [7]
+    assert not len(transport.multi_queue)
+
+
+def test_packet_handler_dispatch(interface):
+    packet_handler = interface.connection.packet_handler
+    first = Recorder(interface, netpacket.RemoveObjectPacket)
+    second = Recorder(interface, netpacket.RemoveObjectPacket)
+    limited = handlers.BaseHandler(interface)
+    passed = list()
+    limited.register(netpacket.RemoveObjectPacket,
+                     lambda packet: passed.append(packet.entity_id), times=2)
+    assert packet_handler.wants(130) and not packet_handler.wants(1)
+    for entity_id in (1, 2, 3):
+        receive(interface, datagram(130, remove(entity_id), 10 + entity_id))
+    assert first.packets == second.packets == [1, 2, 3]
+    assert passed == [1, 2]
+
+    second.close()
+    second.register(netpacket.PingPacket, second.record)  # only the new one
+    receive(interface, datagram(130, remove(4), 20))
+    assert (first.packets[-1], second.packets[-1]) == (4, 3)
+    first.register(netpacket.RemoveObjectPacket, lambda packet: None)
+    receive(interface, datagram(130, remove(5), 21))
+    assert first.packets[-1] == 4  # the function registered last is used
+    first.close()
+    limited.close()
+    assert not packet_handler.wants(130)
+    assert packet_handler.dispatch == {1: (second.record,)}
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+@pytest.fixture
+def clock(interface):
+    '''Drive the connection's sched.timefunc, idle since 0.'''
+    clock = interface.sched.timefunc = Clock()
+    conn = interface.connection
+    conn.heard = conn.alive = conn.probed = 0
+    return clock
+
+
+def watch(interface, now):
+    '''Run the watchdog at now, as the loop would at its deadline.'''
+    conn = interface.connection
+    interface.sched.timefunc.now = now
+    interface.sched.cancel(conn.watchdog_event)
+    conn.watchdog()
+
+
+def test_heartbeats_of_the_server_are_probed(interface, clock):
+    conn = interface.connection
+    transport = conn.asyn
+    datagrams = sent(transport)
+    for (id, now) in enumerate(range(0, 30, 5)):
+        clock.now = now
+        transport.handle_datagram(datagram(connection.HEARTBEAT, b'', id, 0))
+    assert (conn.heard, conn.alive) == (25, 0)
+    watch(interface, 29)
+    assert not transport.out_buffer
+    watch(interface, 30)
+    transport.handle_write()
+    assert [netpacket.Header.unpack(data).msg_type for data in datagrams] == \
+        [connection.HEARTBEAT]
+    assert conn.probed == 30 and len(conn.reliable) == 1
+    clock.now = 31
+    transport.handle_datagram(datagram(130, remove(2), 10, 0))
+    watch(interface, 60)
+    assert not transport.out_buffer  # not again while there is traffic
+
+
+def test_unacked_probe_gives_up(interface, clock):
+    conn = interface.connection
+    transport = conn.asyn
+    sent(transport)
+    transport.handle_datagram(datagram(connection.HEARTBEAT, b'', 1, 0))
+    watch(interface, 30)
+    transport.handle_write()
+    assert len(conn.reliable) == 1
+    for retry in range(reliable.MAX_RETRIES + 1):  # as the timeouts expire
+        (entry,) = conn.reliable.pending.values()
+        entry[3]()
+    assert conn.reliable.stats['retransmitted'] == reliable.MAX_RETRIES
+    assert not conn.connected
+
+
+def test_silence_times_out(interface, clock):
+    reasons = list()
+    interface.connection.handle_error = reasons.append
+    watch(interface, 30)
+    assert len(interface.connection.asyn.out_buffer) == 1  # the probe
+    watch(interface, 39)
+    assert not reasons
+    watch(interface, connection.TOTAL_TIMEOUT)
+    assert reasons == ['timeout']
+
+
+def test_dr_batch_then_remove(interface):
+    actors = handlers.Actors(interface)
+    actor(actors, 2)
+    receive(interface, datagram(16, dr(2, 1), 10),
+            datagram(130, remove(2), 11))
+    assert interface.events == [('moved', 2), ('del', 2)]
+    assert 2 not in actors.actors
+
+
+def test_remove_then_dr_batch(interface):
+    actors = handlers.Actors(interface)
+    actor(actors, 2)
+    receive(interface, datagram(130, remove(2), 10),
+            datagram(16, dr(2, 1), 11))
+    assert interface.events[0] == ('del', 2)
@@ -0,0 +1,69 @@
+import struct
+
+import pytest
+
+from strohman.net import netpacket, decodecache
+
+
+def packet(cls, payload):
+    body = struct.pack('<BH', netpacket.type_of(cls), len(payload) + 3) + \
+        payload
+    return cls(netpacket.Header.unpack(
+        struct.pack('<LLLHB', 7, 0, len(body), len(body), 1) + body))
+
+
+def weather(sector):
+    payload = struct.pack('<B', 0) + sector.encode() + b'\0'
+    return packet(netpacket.WeatherPacket, payload)
+
+
+def test_hits_and_misses():
+    cache = decodecache.DecodeCache({'WeatherPacket': 2})
+    first = weather('a')
+    view = cache.unpack(first)
+    assert view['sector'] == 'a' == first.sector
+    again = weather('a')
+    assert cache.unpack(again) is view
+    assert str(again) == str(first)
+    assert (cache.hits[32], cache.misses[32], len(cache)) == (1, 1, 1)
+
+
+def test_lru():
+    cache = decodecache.DecodeCache({netpacket.WeatherPacket: 2})
+    for sector in 'abac':  # b is the least recently used when c comes
+        cache.unpack(weather(sector))
+    assert sorted(key[1:-1] for key in cache.entries[32]) == [b'a', b'c']
+    assert cache.misses[32] == 3
+
+
+def test_uncached_types():
+    cache = decodecache.DecodeCache({})
+    packet = weather('a')
+    assert cache.unpack(packet) is None and packet.sector == 'a'
+    assert not len(cache)
+
+
+def test_clear():
+    cache = decodecache.DecodeCache({'WeatherPacket': 2})
+    for sector in 'aab': cache.unpack(weather(sector))
+    cache.clear()
+    assert not len(cache) and not cache.hits and not cache.misses
+    cache.unpack(weather('a'))
+    assert (cache.hits[32], cache.misses[32]) == (0, 1)
+
+
+def test_nested_values_are_read_only():
+    cache = decodecache.DecodeCache({'WeatherPacket': 2, 'BuddyListPacket': 2})
+    date = struct.pack('<BBBBBL', 1, 30, 12, 3, 4, 1234)
+    buddies = struct.pack('<L', 2) + b'Al\0\x01Bob\0\x00'
+    first = packet(netpacket.WeatherPacket, date)
+    cache.unpack(first)
+    first.date['hour'] = 0  # decoded by the packet itself, its own copy
+    again = packet(netpacket.WeatherPacket, date)
+    assert cache.unpack(again)['date']['hour'] == 12 == again.date['hour']
+    with pytest.raises(TypeError): again.date['hour'] = 0
+    cache.unpack(packet(netpacket.BuddyListPacket, buddies))
+    again = packet(netpacket.BuddyListPacket, buddies)
+    cache.unpack(again)
+    assert (again.online, again.offline) == (('Al',), ('Bob',))
+    with pytest.raises(AttributeError): again.online.append('Cy')
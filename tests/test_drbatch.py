@@ -0,0 +1,59 @@
+import struct
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from strohman.net import netpacket, drbatch
+
+
+def body(entity_id, counter, flags, sector=None):
+    '''A DR body with distinct values in every field present.'''
+    payload = struct.pack('<LBB', entity_id, counter, flags)
+    if flags & 1: payload += struct.pack('<B', 3)
+    if flags & 2: payload += struct.pack('<f', 0.5)
+    for bit in (4, 8, 16, 32, 64, 128):
+        if flags & bit: payload += struct.pack('<f', bit)
+    payload += struct.pack('<3fB', entity_id, 2, -3, 9)
+    if sector is None: return payload + struct.pack('<L', 17)
+    return payload + struct.pack('<L', drbatch.SECTOR_NAME) + \
+        sector.encode() + b'\0'
+
+
+def packet(payload):
+    raw = struct.pack('<BH', 16, len(payload) + 3) + payload
+    raw = struct.pack('<LLLHB', 1, 0, len(raw), len(raw), 0) + raw
+    packet = netpacket.DeadReckoningPacket(netpacket.Header.unpack(raw))
+    packet.unpack_body()
+    return packet
+
+
+def test_decode_matches_packet():
+    payloads = [body(flags, flags % 7, flags, None if flags % 3 else 'hydlaa')
+                for flags in range(256)]
+    (batch, sectors) = drbatch.decode(payloads)
+    assert len(batch) == 256
+    for (row, payload) in enumerate(payloads):
+        expected = packet(payload)
+        for name in ('entity_id', 'counter', 'flags', 'mode', 'y_rot'):
+            assert batch[name][row] == getattr(expected, name), name
+        assert batch['ang_vel'][row] == pytest.approx(expected.ang_vel)
+        for name in ('vel', 'world_vel', 'pos'):
+            assert tuple(batch[name][row]) == pytest.approx(
+                getattr(expected, name)), name
+        assert sectors.get(row, '') == expected.sector
+
+
+def test_decode_drops_short_bodies():
+    payloads = [body(1, 1, 0), body(2, 1, 0xff)[:12], b'\x01', body(3, 1, 4)]
+    (batch, sectors) = drbatch.decode(payloads)
+    assert batch['entity_id'].tolist() == [1, 3]
+    assert sectors == dict()
+
+
+def test_latest():
+    (batch, _) = drbatch.decode([body(2, 5, 0), body(1, 1, 0), body(2, 7, 0),
+                                 body(2, 6, 0)])
+    latest = drbatch.latest(batch)
+    assert latest['entity_id'].tolist() == [1, 2]
+    assert latest['counter'].tolist() == [1, 7]
@@ -0,0 +1,102 @@
+import asyncio
+import struct
+
+import pytest
+
+from strohman.net import netpacket, handlers
+from strohman.interface import proto
+
+
+class Interface(proto.Interface):
+    def __init__(self, ip, port):
+        super().__init__(ip, port)
+        self.events = list()
+
+    def on_chat_say(self, handler, recipient, text):
+        self.events.append(('say', recipient, text))
+
+    def on_chat_channel(self, handler, recipient, text, channel):
+        self.events.append(('channel', recipient, text, channel))
+
+
+@pytest.fixture
+def interface():
+    interface = Interface('127.0.0.1', 9)
+    interface.do_start()
+    yield interface
+    interface.connection.close()
+    loop = interface.sched.loop
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+def chat(chat_type, sender, text, channel_id=0):
+    payload = struct.pack('<B', chat_type) + sender.encode() + b'\0' + \
+        text.encode() + b'\0' + struct.pack('<BLH', 0, 1, channel_id)
+    body = struct.pack('<BH', 8, len(payload) + 3) + payload
+    return netpacket.ChatPacket(netpacket.Header.unpack(
+        struct.pack('<LLLHB', 7, 0, len(body), len(body), 0) + body))
+
+
+def receive(interface, *packets):
+    interface.connection.handle_packet(*packets)
+
+
+def test_events(interface):
+    handler = handlers.Chat(interface)
+    handler.handle_joined(netpacket.ChannelJoinedPacket(name='help',
+                                                        channel_id=4))
+    receive(interface, chat(2, 'Bob', 'hi'), chat(9, 'Al', 'yo', 4),
+            chat(8, 'Bob', 'shout'))
+    assert interface.events == [('say', 'Bob', 'hi'),
+                                ('channel', 'Al', 'yo', 'help')]
+
+
+def test_filters(interface):
+    handler = handlers.Chat(interface)
+    for channel_id in (4, 5):
+        handler.handle_joined(netpacket.ChannelJoinedPacket(
+            name=str(channel_id), channel_id=channel_id))
+    got = list()
+    subscriptions = [
+        handler.subscribe(lambda h, packet: got.append(('tell', packet.text)),
+                          (netpacket.ChatPacket.TELL,), senders=('Bob',)),
+        handler.subscribe(lambda h, packet: got.append(('cmd', packet.text)),
+                          prefix='!'),
+        handler.subscribe(lambda h, packet: got.append(('chan', packet.text)),
+                          channels=(4,))]
+    receive(interface, chat(3, 'Bob', 'a'), chat(3, 'Al', 'b'),
+            chat(8, 'Al', '!c'), chat(9, 'Al', 'd', 4), chat(9, 'Al', 'e', 5))
+    assert got == [('tell', 'a'), ('cmd', '!c'), ('chan', 'd')]
+    for subscription in subscriptions: handler.unsubscribe(subscription)
+    receive(interface, chat(3, 'Bob', 'a'))
+    assert len(got) == 3
+
+
+def test_type_without_event(interface):
+    handler = handlers.Chat(interface)
+    got = list()
+    subscription = handler.subscribe(
+        lambda h, packet: got.append(packet.text),
+        (netpacket.ChatPacket.NPCINTERNAL,))
+    receive(interface, chat(netpacket.ChatPacket.NPCINTERNAL, 'Npc', 'psst'))
+    assert got == ['psst']
+    handler.unsubscribe(subscription)
+    assert netpacket.ChatPacket.NPCINTERNAL not in handler.routes
+
+
+def test_unsubscribed_chats_stay_undecoded(interface):
+    handler = handlers.Chat(interface)
+    packet = chat(8, 'Bob', 'shout')
+    receive(interface, packet)
+    assert packet.chat_type == 8
+    with pytest.raises(AttributeError):
+        netpacket.ChatPacket.text.__get__(packet)
+
+
+def test_own_chats_are_dropped(interface):
+    handler = handlers.Chat(interface)
+    interface.actor_handler = handlers.Actors(interface)
+    interface.actor_handler.my_name = 'Bob Smith'
+    receive(interface, chat(2, 'Bob', 'hi'), chat(2, 'Al', 'hi'))
+    assert interface.events == [('say', 'Al', 'hi')]
@@ -0,0 +1,354 @@
+import struct
+
+import pytest
+
+from strohman.net import netpacket, schema
+
+
+def string(text): return text.encode() + b'\0'
+
+
+def datagram(msg_type, payload, id=7, priority=1):
+    body = struct.pack('<BH', msg_type, len(payload) + 3) + payload
+    return struct.pack('<LLLHB', id, 0, len(body), len(body), priority) + body
+
+
+def dr(flags, sector=True):
+    payload = struct.pack('<LBB', 1234, 5, flags)
+    if flags & 1: payload += struct.pack('<B', 2)
+    for bit in (2, 4, 8, 16, 32, 64, 128):
+        if flags & bit: payload += struct.pack('<f', bit / 2)
+    payload += struct.pack('<3fB', 1.5, 2.5, 3.5, 7)
+    if sector: return payload + struct.pack('<L', 0xffffffff) + string('hydlaa')
+    return payload + struct.pack('<L', 3)
+
+
+def actor(trailer=True):
+    body = dr(0b10100011) + struct.pack('<LLB', 1, 2, 3) + string('Bob') + \
+        string('Guild') + struct.pack('<5LH', 1, 2, 3, 4, 5, 6) + \
+        string('h') + string('b') + string('be') + string('c') + \
+        struct.pack('<9f', *range(9)) + string('tex') + string('eq')
+    if not trailer: return body
+    return body + struct.pack('<B4L2fL', 1, 2, 3, 4, 5, 1.0, 2.0, 99)
+
+
+def decode(raw):
+    packet = netpacket.BasePacket(raw)
+    packet = netpacket.by_type(packet.msg_type, packet)
+    packet.unpack_body()
+    return packet
+
+
+# str() of the bodies as the hand-written packet classes decoded them
+DECODED = [
+    (16, dr(0), "DeadReckoningPacket: (1234, 5, 0, 0, 0, (0, 0, 0), "
+     "(0, 0, 0), (1.5, 2.5, 3.5), 7, 'hydlaa') (ID: 7,  Offset: 0, "
+     "Priority 1, Size 33, MinorSize 33)"),
+    (16, dr(0xff), "DeadReckoningPacket: (1234, 5, 255, 2, 1.0, "
+     "(2.0, 4.0, 8.0), (16.0, 32.0, 64.0), (1.5, 2.5, 3.5), 7, 'hydlaa') "
+     "(ID: 7,  Offset: 0, Priority 1, Size 62, MinorSize 62)"),
+    (16, dr(0b00100110, False), "DeadReckoningPacket: (1234, 5, 38, 0, 1.0, "
+     "(2.0, 0, 0), (16.0, 0, 0), (1.5, 2.5, 3.5), 7, '') (ID: 7,  Offset: 0, "
+     "Priority 1, Size 38, MinorSize 38)"),
+    (126, actor(), "PersistActorPacket: (1234, 5, (1.5, 2.5, 3.5), 1, 2, 3, "
+     "'Bob', 'Guild', 1, 2, 3, 4, 5, 6, 'h', 'b', 'be', 'c', (0.0, 1.0, 2.0), "
+     "(3.0, 4.0, 5.0), (6.0, 7.0, 8.0), 'tex', 'eq', 1, 2, 3, 4, 5, 1.0, "
+     "2.0, 99) (ID: 7,  Offset: 0, Priority 1, Size 168, MinorSize 168)"),
+    (8, struct.pack('<B', 2) + string('Bob') + string('hello') +
+     struct.pack('<BL', 1, 42), 'ChatPacket: Say by Bob: hello (translated, '
+     '42) (ID: 7,  Offset: 0, Priority 1, Size 19, MinorSize 19)'),
+    (8, struct.pack('<B', 9) + string('Bob') + string('hi chan') +
+     struct.pack('<BLH', 0, 42, 3), 'ChatPacket: In channel 3 by Bob: hi chan '
+     '(untranslated, 42) (ID: 7,  Offset: 0, Priority 1, Size 23, '
+     'MinorSize 23)'),
+    (32, struct.pack('<BBBBBL', 1, 30, 12, 3, 4, 1234), 'WeatherPacket: '
+     '12:30 - 3.4.1234 (ID: 7,  Offset: 0, Priority 1, Size 12, '
+     'MinorSize 12)'),
+    (32, struct.pack('<B', 4 | 16) + string('sec') +
+     struct.pack('<7L', 1, 2, 3, 4, 5, 6, 7), 'WeatherPacket: At sector sec: '
+     'downfall with 1 drops, fog with 3 density (ID: 7,  Offset: 0, '
+     'Priority 1, Size 36, MinorSize 36)'),
+    (32, struct.pack('<B', 0) + string('sec'), 'WeatherPacket: At sector sec: '
+     'no downfall, no fog. (ID: 7,  Offset: 0, Priority 1, Size 8, '
+     'MinorSize 8)'),
+    (23, struct.pack('<BLfL', 0, 1, 2.5, 3) + string('sword') +
+     struct.pack('<5L2f', 1, 2, 3, 4, 5, 1.0, 2.0) + string('icon') +
+     b'\x01' + string('1,2,3,4'), "GuiInventoryPacket items: 1, weight: 2.5, "
+     "version: 3, money: [1, 2, 3, 4] [{'name': 'sword', 'mesh_name': 1, "
+     "'mat_name': 2, 'container': 3, 'slot': 4, 'stackcount': 5, "
+     "'weight': 1.0, 'size': 2.0, 'icon': 'icon', 'purify_status': 1}] "
+     "(ID: 7,  Offset: 0, Priority 1, Size 64, MinorSize 64)"),
+    (1, struct.pack('<LB', 77, 6), 'PingPacket 77, flags: 6 (ID: 7,  '
+     'Offset: 0, Priority 1, Size 8, MinorSize 8)'),
+    (130, struct.pack('<L', 55), 'RemoveObjectPacket, remove object 55 '
+     '(ID: 7,  Offset: 0, Priority 1, Size 7, MinorSize 7)'),
+]
+
+# datagrams the hand-written packet classes packed, all with id 9
+P = netpacket
+PACKED = [
+    (lambda: P.PingPacket(payload=5),
+     '0900000000000000080000000800000105000500000003'),
+    (lambda: P.AuthenticatePacket(username='u', password='p'),
+     '09000000000000000e0000000e0001020b00b900000075007000000000'),
+    (lambda: P.PreauthenticatePacket(),
+     '090000000000000007000000070001030400b9000000'),
+    (lambda: P.DisconnectPacket(),
+     '0900000000000000080000000800000705000000000000'),
+    (lambda: P.ChatPacket(chat_type=2, text='hi', recipient='bob'),
+     '090000000000000010000000100000080d0002626f62006869000000000000'),
+    (lambda: P.ChatPacket(chat_type=9, text='hi', channel_id=3),
+     '09000000000000000f0000000f0000080c00090068690000000000000300'),
+    (lambda: P.ChannelJoinPacket(name='x'),
+     '0900000000000000050000000500000902007800'),
+    (lambda: P.ChannelLeavePacket(channel_id=2),
+     '0900000000000000050000000500000b02000200'),
+    (lambda: P.UserCmdPacket(command='/who'),
+     '0900000000000000080000000800000d05002f77686f00'),
+    (lambda: P.GuiInventoryPacket(),
+     '09000000000000000400000004000017010001'),
+    (lambda: P.AuthCharacterPacket(char_name='Bob'),
+     '090000000000000007000000070000460400426f6200'),
+    (lambda: P.HeartbeatPacket(), '090000000000000003000000030001970000'),
+    (lambda: P.ClientStatusPacket(),
+     '0900000000000000040000000400006c010001'),
+    (lambda: P.PersistWorldRequestPacket(),
+     '0900000000000000030000000300007b0000'),
+    (lambda: P.PersistActorRequestPacket(),
+     '0900000000000000030000000300007d0000'),
+    (lambda: P.DeadReckoningPacket(entity_id=3, flags=0b10100111,
+                                   vel=(1, 2, 3), world_vel=(0, 0, 4),
+                                   pos=(1, 2, 3), sector='s'),
+     '09000000000000002d0000002d0000102a000300000000a700000000000000803f000000'
+     '00000080400000803f000000400000404000ffffffff7300'),
+    (lambda: P.SlotMovementPacket(),
+     '090000000000000031000000310000592e00000000000000000000000000000000000100'
+     '00000000000000000000000000000000000001010000000000000000'),
+    (lambda: P.MotdrequestPacket(), '090000000000000003000000030000560000'),
+    (lambda: P.RequestMovementsPacket(),
+     '090000000000000003000000030000700000'),
+]
+
+
+@pytest.mark.parametrize('msg_type, payload, expected', DECODED)
+def test_decode_matches_handwritten(msg_type, payload, expected):
+    assert str(decode(datagram(msg_type, payload))) == expected
+
+
+@pytest.mark.parametrize('make, expected', PACKED)
+def test_pack_matches_handwritten(make, expected):
+    packet = make()
+    packet.id = 9
+    assert bytes(packet.pack()).hex() == expected
+
+
+def test_ack_pack_matches_handwritten():
+    ack = netpacket.AckPacket()
+    (ack.packet_ack, ack.sum) = (4, 20)
+    assert bytes(ack.pack()).hex() == '040000000000000014000000000000'
+
+
+def names(fields):
+    for field in fields:
+        if isinstance(field, schema.When):
+            yield from names(field.fields + field.otherwise)
+        else: yield field.name
+
+
+@pytest.mark.parametrize('packet', [
+    P.ChatPacket(chat_type=2, recipient='bob', text='hi', translate=1,
+                 actor=42),
+    P.ChatPacket(chat_type=9, text='hi', channel_id=3),
+    P.DeadReckoningPacket(entity_id=3, counter=4, flags=0b11111111, mode=1,
+                          ang_vel=0.5, vel=(1, 2, 3), world_vel=(4, 5, 6),
+                          pos=(7, 8, 9), y_rot=10, sector='s'),
+    P.DeadReckoningPacket(entity_id=3, flags=0b01001000, vel=(0, 2, 0),
+                          world_vel=(0, 4, 0), pos=(7, 8, 9)),
+])
+def test_schema_round_trip(packet):
+    packet.id = 9
+    decoded = decode(bytes(packet.pack()))
+    assert type(decoded) is type(packet)
+    for name in names(type(packet).fields):
+        assert getattr(decoded, name) == getattr(packet, name), name
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_persist_actor_without_trailer(lazy):
+    packet = netpacket.BasePacket(datagram(126, actor(trailer=False)))
+    packet = netpacket.by_type(packet.msg_type, packet)
+    packet.unpack_body(lazy=lazy)
+    assert (packet.flags, packet.equipment) == (0b10100011, 'eq')
+    assert (packet.server_mode, packet.scale, packet.actor_flags) == (0, 0, 0)
+    packet.id = 9
+    decoded = decode(bytes(packet.pack()))  # the trailer is always packed
+    for name in names(type(packet).fields):
+        assert getattr(decoded, name) == getattr(packet, name), name
+
+
+class Cached(netpacket.BasePacket):
+    fields = (schema.U32('entity_id'), schema.String('name'))
+
+
+def test_schema_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'packets.schema')
+    monkeypatch.setattr(schema, '_cache_path', lambda module: path)
+    monkeypatch.setattr(schema, '_caches', dict())
+    monkeypatch.setattr(schema.sys, 'dont_write_bytecode', False)
+    schema.build(Cached)
+
+    def generate(fields): raise AssertionError('cached code not used')
+    monkeypatch.setattr(schema, '_caches', dict())  # read back from disk
+    monkeypatch.setattr(schema, 'generate', generate)
+    schema.build(Cached)
+    packet = Cached(datagram(200, struct.pack('<L', 5) + string('Bob')))
+    packet.unpack_body()
+    assert (packet.entity_id, packet.name) == (5, 'Bob')
+
+
+def test_lazy_decode():
+    packet = decode(datagram(126, actor()))
+    lazy = netpacket.BasePacket(datagram(126, actor()))
+    lazy = netpacket.by_type(lazy.msg_type, lazy)
+    lazy.unpack_body(lazy=True)
+    assert lazy.entity_id == 1234
+    assert lazy.decoder is not None  # the rest is not decoded yet
+    with pytest.raises(AttributeError):
+        netpacket.PersistActorPacket.name.__get__(lazy)
+    assert str(lazy) == str(packet)
+    netpacket.AckPacket().unpack_body(lazy=True)
+
+
+def test_defaults_before_decoding():
+    packet = netpacket.BasePacket(datagram(16, dr(0)))
+    packet = netpacket.by_type(packet.msg_type, packet)
+    assert packet.entity_id == 0  # as when formatting it before dispatch
+    packet.unpack_body(lazy=True)
+    assert (packet.entity_id, packet.sector) == (1234, 'hydlaa')
+    assert netpacket.DeadReckoningPacket().entity_id == 0
+
+
+def test_split():
+    raw = datagram(130, struct.pack('<L', 55), id=3)
+    (header,) = netpacket.split(raw)
+    assert (header.id, header.msg_type, header.start, header.end) == \
+        (3, 130, 0, len(raw))
+    assert header.payload == struct.pack('<L', 55)
+    assert (header.is_multi, header.is_part, header.needs_ack) == \
+        (False, False, True)
+
+    packets = [datagram(130, struct.pack('<L', 55), id=4),
+               datagram(1, struct.pack('<LB', 77, 6), id=5, priority=0)]
+    multi = struct.pack('<LLLHB', 1, 0, 0, 0, 2) + \
+        b''.join(packets)
+    headers = list(netpacket.split(multi))
+    assert [(header.id, header.msg_type) for header in headers] == \
+        [(4, 130), (5, 1)]
+    assert [multi[header.start:header.end] for header in headers] == packets
+    assert str(decode(bytes(multi[headers[1].start:headers[1].end]))) == \
+        'PingPacket 77, flags: 6 (ID: 5,  Offset: 0, Priority 0, Size 8, ' \
+        'MinorSize 8)'
+
+
+def test_fragment():
+    packet = netpacket.UserCmdPacket(command='/say ' + 'x' * 500)
+    packet.id = 9
+    raw = bytes(packet.pack())
+    parts = list(netpacket.fragment(raw, 100))
+    assert len(parts) == 6 and max(map(len, parts)) <= 100
+    headers = [netpacket.Header.unpack(part) for part in parts]
+    assert all(header.is_part for header in headers[:-1])
+    assert [header[:3] for header in headers] == \
+        [(9, offset, len(raw) - 15) for offset in range(0, 500, 85)]
+    assert b''.join(part[15:] for part in parts) == raw[15:]
+
+
+def test_data_cursor():
+    raw = b'xx' + struct.pack('<BH', 5, 13) + struct.pack('<LHBf', 1, 2, 3, 0.5) \
+        + string('name') + b'rest'
+    data = netpacket.Data(raw, 2)
+    assert (data.type, data.size, data.pos) == (5, 13, 2)
+    data.get_type()
+    assert (data.get_32(), data.get_16(), data.get_8(), data.get_f()) == \
+        (1, 2, 3, 0.5)
+    assert data.get_string() == 'name' and data.buffer is raw
+    assert bytes(data.view()) == b'rest' and data.view().obj is raw
+    with pytest.raises(RuntimeError): data.get_string()
+    with pytest.raises(RuntimeError): data.get_vector()
+    assert data.get_32() == struct.unpack('<L', b'rest')[0] and not data
+
+
+def test_data_writer():
+    data = netpacket.Data()
+    buffer = data.buffer
+    data.put_32(1)
+    data.put_16(2)
+    data.put_8(3)
+    data.put_f(0.5)
+    data.put_vector((1, 2, 3))
+    data.put_string('name')
+    data.type = 13
+    payload = struct.pack('<LHBf3f', 1, 2, 3, 0.5, 1, 2, 3) + string('name')
+    assert bytes(data.view()) == payload and data.buffer is buffer
+    raw = data.frame(9, 0, len(payload) + 3, 1)
+    assert raw == struct.pack('<LLLHBBH', 9, 0, len(payload) + 3,
+                              len(payload) + 3, 1, 13, len(payload)) + payload
+    data.purge()
+    data.put_8(7)
+    assert data.buffer is buffer and bytes(data.view()) == b'\x07'
+
+    data = netpacket.Data(datagram(13, b'ab'), 15)  # received, then written
+    data.get_type()
+    data.put_8(7)
+    assert data.writable and bytes(data.view()) == b'ab\x07'
+
+
+def test_slots_and_pools(monkeypatch):
+    packet = decode(datagram(16, dr(0xff)))
+    assert not hasattr(packet, '__dict__')
+    with pytest.raises(AttributeError): packet.no_such_field = 1
+
+    monkeypatch.setattr(netpacket, 'pools', dict())
+    netpacket.enable_pools(netpacket.DeadReckoningPacket)
+    first = netpacket.DeadReckoningPacket.acquire(
+        netpacket.Header.unpack(datagram(16, dr(0xff))))
+    first.unpack_body()
+    assert first.mode == 2
+    first.release()
+    second = netpacket.DeadReckoningPacket.acquire(
+        netpacket.Header.unpack(datagram(16, dr(0, False))))
+    assert second is first
+    second.unpack_body()
+    assert (second.mode, second.ang_vel, second.vel, second.sector) == \
+        (0, 0, (0, 0, 0), '')  # nothing left over from the first body
+    assert netpacket.PingPacket.acquire() is not netpacket.PingPacket.acquire()
+
+
+@pytest.mark.parametrize('msg_type, tail', [
+    (16, b''), (126, actor()[len(dr(0b10100011)):])])
+def test_dr_prefix_for_every_mask(msg_type, tail):
+    for flags in range(256):
+        packet = decode(datagram(msg_type, dr(flags) + tail))
+        values = iter(bit / 2 for bit in (2, 4, 8, 16, 32, 64, 128)
+                      if flags & bit)
+        assert packet.mode == (2 if flags & 1 else 0)
+        assert packet.ang_vel == (next(values) if flags & 2 else 0)
+        for (name, bits) in (('vel', (4, 8, 16)), ('world_vel', (32, 64, 128))):
+            assert getattr(packet, name) == tuple(
+                next(values) if flags & bit else 0 for bit in bits)
+        assert (packet.pos, packet.y_rot, packet.sector) == \
+            ((1.5, 2.5, 3.5), 7, 'hydlaa')
+        assert packet.flags == flags
+        if tail: assert (packet.name, packet.actor_flags) == ('Bob', 99)
+
+
+def test_type_registry():
+    assert netpacket.packet_class(16) is netpacket.DeadReckoningPacket
+    assert netpacket.type_of(netpacket.DeadReckoningPacket) == 16
+    assert netpacket.packet_class(250) is netpacket.RawPacket
+    heartbeat = netpacket.packet_class(151)  # created on first use
+    assert heartbeat is netpacket.HeartbeatPacket
+    assert heartbeat().msg_type == 151 == netpacket.type_of(heartbeat)
+    assert netpacket.message_type[16] is netpacket.DeadReckoningPacket
+    with pytest.raises(ValueError): netpacket.type_of(Cached)
+    with pytest.raises(AttributeError): netpacket.NoSuchPacket
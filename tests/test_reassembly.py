@@ -0,0 +1,89 @@
+import struct
+
+from strohman.net import netpacket, reassembly
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def message(id, text):
+    body = struct.pack('<BH', 13, len(text) + 4) + text.encode() + b'\0'
+    return netpacket.HEADER.pack(id, 0, len(body), len(body), 1) + body
+
+
+def parts(datagram, size):
+    return [netpacket.Header.unpack(part)
+            for part in netpacket.fragment(datagram, size)]
+
+
+def test_out_of_order_and_duplicates():
+    raw = message(3, 'x' * 100)
+    pieces = parts(raw, 40)
+    queue = reassembly.Reassembler()
+    for piece in [pieces[2], pieces[0], pieces[0]] + pieces[3:]:
+        assert queue.add(piece) is None
+    header = queue.add(pieces[1])
+    assert bytes(header.buffer) == raw
+    assert (header.id, header.msg_type, header.is_part) == (3, 13, False)
+    assert not len(queue) and not queue.bytes
+    assert queue.stats['duplicates'] == 1 and queue.stats['completed'] == 1
+
+
+def test_overlapping_parts():
+    raw = message(3, 'x' * 100)
+    queue = reassembly.Reassembler()
+    for piece in parts(raw, 40)[:-1] + parts(raw, 60):
+        header = queue.add(piece)
+    assert bytes(header.buffer) == raw
+
+
+def test_invalid_parts():
+    queue = reassembly.Reassembler(max_bytes=200)
+    (first, *rest) = parts(message(3, 'x' * 100), 40)
+    too_long = netpacket.HEADER.pack(4, 90, 100, 20, 1) + bytes(20)
+    too_large = netpacket.HEADER.pack(5, 0, 500, 20, 1) + bytes(20)
+    for header in (too_long, too_large):
+        assert queue.add(netpacket.Header.unpack(header)) is None
+    assert queue.add(first) is None
+    beyond = netpacket.HEADER.pack(3, 100, 104, 20, 1) + bytes(20)
+    assert queue.add(netpacket.Header.unpack(beyond)) is None
+    assert queue.stats['invalid'] == 3 and list(queue.messages) == [3]
+
+
+def test_evict_by_age():
+    clock = Clock()
+    queue = reassembly.Reassembler(max_age=10, timefunc=clock)
+    (old, new) = (parts(message(1, 'a' * 50), 30), parts(message(2, 'b' * 50), 30))
+    queue.add(old[0])
+    clock.now = 5
+    queue.add(new[0])
+    clock.now = 11
+    assert queue.add(old[1]) is None  # starts over, the first part is gone
+    assert queue.stats['evicted_age'] == 1 and 2 in queue
+    for piece in new[1:-1]: assert queue.add(piece) is None
+    assert queue.add(new[-1]) is not None
+
+
+def test_evict_for_room():
+    queue = reassembly.Reassembler(max_bytes=150)
+    first = parts(message(1, 'a' * 60), 30)
+    second = parts(message(2, 'b' * 100), 30)
+    queue.add(first[0])
+    assert queue.add(second[0]) is None  # evicts the first, keeps itself
+    assert list(queue.messages) == [2]
+    assert queue.stats['evicted_bytes'] == 1
+    for piece in second[1:-1]: assert queue.add(piece) is None
+    assert queue.add(second[-1]) is not None
+    assert not len(queue) and not queue.bytes
+
+
+def test_message_never_evicts_itself():
+    queue = reassembly.Reassembler(max_bytes=150)
+    pieces = parts(message(1, 'a' * 131), 100)  # 150 bytes with the header
+    assert queue.add(pieces[0]) is None and 1 in queue
+    assert bytes(queue.add(pieces[1]).buffer) == message(1, 'a' * 131)
+    pieces = parts(message(2, 'a' * 132), 100)
+    assert queue.add(pieces[0]) is None and 2 not in queue
+    assert queue.stats['invalid'] == 1
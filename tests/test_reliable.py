@@ -0,0 +1,95 @@
+import sched
+
+from strohman.net import netpacket, reliable
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def datagram(id, offset=0, priority=1):
+    return netpacket.HEADER.pack(id, offset, 3, 3, priority) + b'\x0d\x03\x00'
+
+
+def retransmitter():
+    clock = Clock()
+    scheduler = sched.scheduler(clock, lambda delay: None)
+    (resent, given_up) = (list(), list())
+    queue = reliable.Retransmitter(scheduler, resent.append, given_up.append)
+    return (clock, scheduler, queue, resent, given_up)
+
+
+def advance(clock, scheduler, seconds):
+    clock.now += seconds
+    scheduler.run(blocking=False)
+
+
+def test_rto_follows_samples():
+    (clock, scheduler, queue, resent, _) = retransmitter()
+    assert queue.rto == reliable.INITIAL_RTO
+    queue.track(datagram(1))
+    queue.track(datagram(2, priority=0))  # no ack expected
+    assert len(queue) == 1
+    advance(clock, scheduler, 0.3)
+    queue.ack(1, 0)
+    assert (queue.srtt, queue.rttvar) == (0.3, 0.15)
+    assert queue.rto == 0.3 + 4 * 0.15
+    for id in range(2, 50):
+        queue.track(datagram(id))
+        advance(clock, scheduler, 0.01)
+        queue.ack(id, 0)
+    assert queue.rto == reliable.MIN_RTO
+    assert not resent and not len(queue) and scheduler.empty()
+    queue.ack(1, 0)
+    assert queue.stats['stray_acks'] == 1
+
+
+def test_backoff_and_give_up():
+    (clock, scheduler, queue, resent, given_up) = retransmitter()
+    packet = datagram(1)
+    queue.track(packet)
+    timeouts = [min(reliable.INITIAL_RTO * 2 ** retry, reliable.MAX_RTO)
+                for retry in range(reliable.MAX_RETRIES + 1)]
+    for (retry, timeout) in enumerate(timeouts[:-1]):
+        advance(clock, scheduler, timeout - 0.01)
+        assert len(resent) == retry
+        advance(clock, scheduler, 0.02)
+        assert resent[-1] == packet
+    assert len(resent) == reliable.MAX_RETRIES and not given_up
+    advance(clock, scheduler, timeouts[-1] + 0.01)
+    assert given_up == ['packet 1 not acknowledged'] and not len(queue)
+
+
+def test_ack_after_retransmission_is_not_sampled():
+    (clock, scheduler, queue, resent, _) = retransmitter()
+    queue.track(datagram(1))
+    advance(clock, scheduler, reliable.INITIAL_RTO + 0.01)
+    assert len(resent) == 1
+    queue.ack(1, 0)
+    assert queue.srtt is None and queue.rto == reliable.INITIAL_RTO
+    advance(clock, scheduler, reliable.MAX_RTO)
+    assert len(resent) == 1
+
+
+def test_parts_are_acked_one_by_one():
+    (clock, scheduler, queue, resent, _) = retransmitter()
+    for offset in (0, 100, 200):
+        queue.track(datagram(1, offset))
+    queue.ack(1, 100)
+    advance(clock, scheduler, reliable.INITIAL_RTO + 0.01)
+    assert sorted(netpacket.HEADER.unpack_from(packet)[1]
+                  for packet in resent) == [0, 200]
+
+
+def test_window():
+    window = reliable.Window(size=8)
+    assert not window.check(5) and window.check(5)
+    assert not window.check(3) and window.check(3)
+    assert 4 not in window
+    assert not window.check(12)  # 5 is at the edge now, 3 fell out
+    assert 5 in window and 3 not in window
+    assert not window.check(3) and window.stats['too_old'] == 1
+    assert not window.check(100) and 12 not in window
+    assert not window.check(99, add=False) and 99 not in window
+    assert window.stats['duplicates'] == 2
@@ -0,0 +1,65 @@
+import pytest
+
+from strohman import timers
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def test_order():
+    clock = Clock()
+    queue = timers.Timers(clock)
+    calls = list()
+    queue.enter(0.0015, 1, calls.append, ('late',))
+    queue.enter(0.001, 2, calls.append, ('low',))
+    queue.enter(0.001, 1, calls.append, ('first',))
+    queue.enter(0.001, 1, calls.append, ('second',))
+    queue.enter(0.005, 1, calls.append, ('next tick',))
+    assert len(queue) == 5 and queue.next_time() == pytest.approx(0.002)
+    queue.run_due(0.0019)
+    assert calls == list()
+    queue.run_due(0.002)  # one tick, in order of time, priority, entry
+    assert calls == ['first', 'second', 'low', 'late']
+    assert queue.next_time() == pytest.approx(0.006)
+    clock.now = 1
+    queue.run_due()
+    assert calls[-1] == 'next tick' and queue.empty()
+    assert queue.next_time() is None
+
+
+def test_cancel():
+    queue = timers.Timers(Clock())
+    calls = list()
+    kept = queue.enter(1, 1, calls.append, ('kept',))
+    cancelled = [queue.enter(delay, 1, calls.append, ('cancelled',))
+                 for delay in range(200)]
+    for timer in cancelled: queue.cancel(timer)
+    with pytest.raises(ValueError): queue.cancel(cancelled[0])
+    assert len(queue) == 1 and queue.queue == [kept]
+    assert len(queue.buckets) < 100  # compacted
+    queue.run_due(1000)
+    assert calls == ['kept']
+
+
+def test_exception_keeps_the_rest():
+    queue = timers.Timers(Clock())
+    calls = list()
+
+    def fail(): raise RuntimeError('fail')
+    queue.enter(0, 1, calls.append, ('before',))
+    queue.enter(0, 2, fail)
+    queue.enter(0, 3, calls.append, ('after',))
+    with pytest.raises(RuntimeError): queue.run_due(1)
+    assert calls == ['before'] and len(queue) == 1
+    queue.run_due(1)
+    assert calls == ['before', 'after']
+
+
+def test_enter_while_running():
+    queue = timers.Timers(Clock())
+    calls = list()
+    queue.enter(0, 1, lambda: queue.enterabs(0, 1, calls.append, ('due',)))
+    queue.run_due(1)
+    assert calls == ['due']